@@ -0,0 +1,299 @@
+"""Suorituskykymittaukset ilman graafista käyttöliittymää.
+
+Mittaa generoiduilla, kasvavan kokoisilla topologioilla reitityksen ja
+lähetyksen (laheta_viesti), topologian viennin ja tuonnin, tilastojen haun
+suuresta lokista, asettelun laskennan ja piirron Agg-taustalla. Tulokset
+(läpäisy, viivejakauma ja huippumuisti) kirjoitetaan JSON-tiedostoon ja
+niitä voi verrata tallennettuun perustasoon.
+
+Esimerkkejä:
+
+    python benchmark.py --koot 100 1000 10000 --tulos tulokset.json
+    python benchmark.py --tulos uusi.json --vertaa perustaso.json --toleranssi 0.25
+"""
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+import networkx as nx  # noqa: E402
+import numpy as np  # noqa: E402
+from matplotlib.backends.backend_agg import FigureCanvasAgg  # noqa: E402
+from matplotlib.figure import Figure  # noqa: E402
+
+from network_draw import VerkkoPiirtaja  # noqa: E402
+from network_sim import Verkkosimulaattori  # noqa: E402
+
+
+# Regressioksi tulkitaan vertailussa näiden mittareiden kasvu; p99 on
+# lyhyillä ajoilla liian kohinainen vertailtavaksi
+VERRATTAVAT = ("p50_us", "huippumuisti_kt")
+
+
+def _mittaa(funktio, toistoja, min_aika=0.0):
+    """Ajaa funktion toistoja kertaa (tai kunnes min_aika s täyttyy) ja palauttaa viiveet ns."""
+    viiveet = []
+    alku = time.perf_counter()
+    while len(viiveet) < toistoja or time.perf_counter() - alku < min_aika:
+        t = time.perf_counter_ns()
+        funktio()
+        viiveet.append(time.perf_counter_ns() - t)
+    return np.array(viiveet, dtype=np.float64)
+
+
+def _huippumuisti(funktio):
+    """Yhden kutsun aikana varattu huippumuisti kilotavuina (tracemalloc)."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        funktio()
+        _, huippu = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return huippu / 1024.0
+
+
+def _kooste(viiveet_ns, operaatioita_per_kutsu=1):
+    us = viiveet_ns / 1000.0
+    return {
+        "kutsuja": int(len(us)),
+        "lapaisy_per_s": float(operaatioita_per_kutsu * len(us) / (viiveet_ns.sum() / 1e9)),
+        "keskiarvo_us": float(us.mean()),
+        "p50_us": float(np.percentile(us, 50)),
+        "p90_us": float(np.percentile(us, 90)),
+        "p99_us": float(np.percentile(us, 99)),
+        "max_us": float(us.max()),
+    }
+
+
+def _koon_parametrit(malli, koko):
+    """Generaattorin parametrit, joilla laitteita on lähimpänä kokoa."""
+    if malli in ("waxman", "barabasi_albert"):
+        return {"n": koko}
+    if malli == "isp":
+        sivu = max(1, int(round((koko / 10) ** 0.5)))
+        return {"rivit": sivu, "sarakkeet": sivu, "reitittimia_per_pop": 3, "asiakkaita_per_reititin": 2}
+    if malli == "fat_tree":
+        # (k/2)^2 ydintä + k^2 kokooma- ja reunakytkintä + k^3/4 palvelinta
+        k = min(range(2, 2 * int(koko ** (1 / 3)) + 6, 2), key=lambda k: abs(5 * k * k / 4 + k ** 3 / 4 - koko))
+        return {"k": k}
+    if malli == "leaf_spine":
+        # 4 spineä, jokaisella leafilla 24 palvelinta
+        return {"spinet": 4, "leafit": max(1, int(round((koko - 4) / 25))), "palvelimia_per_leaf": 24}
+    if malli == "rengas":
+        # renkaita * (solmuja_renkaassa + 1) laitetta
+        renkaita = max(1, int(round(koko ** 0.5)))
+        return {"renkaita": renkaita, "solmuja_renkaassa": max(1, int(round(koko / renkaita)) - 1)}
+    return {}
+
+
+def _luo_simu(malli, koko, siemen):
+    simu = Verkkosimulaattori(siemen=siemen)
+    parametrit = _koon_parametrit(malli, koko)
+    simu.luo_synteettinen_verkko(malli, havio=("tasainen", 0.0, 0.01), siemen=siemen, **parametrit)
+    return simu
+
+
+# --- Yksittäiset mittaukset ---
+
+def mittaa_laheta_viesti(simu, rng, toistoja):
+    nimet = list(simu.verkko.nodes)
+    parit = rng.choice(len(nimet), size=(toistoja, 2)).tolist()
+
+    def lahettaja(jono):
+        def laheta():
+            a, b = next(jono)
+            simu.laheta_viesti(nimet[a], nimet[b], "")
+        return laheta
+
+    # Kylmässä ajossa reittipuut lasketaan, lämpimässä ne ovat välimuistissa
+    simu.mitatoi_reitit()
+    kylma = _mittaa(lahettaja(iter(parit)), toistoja)
+    lammin = _mittaa(lahettaja(iter(parit)), toistoja)
+    return {
+        "laheta_viesti_kylma": _kooste(kylma),
+        "laheta_viesti": dict(_kooste(lammin), huippumuisti_kt=_huippumuisti(lahettaja(iter(parit)))),
+    }
+
+
+def mittaa_topologia(simu, toistoja):
+    topo = simu.export_topologia()
+    kohde = Verkkosimulaattori()
+    vienti = _mittaa(simu.export_topologia, toistoja)
+    tuonti = _mittaa(lambda: kohde.import_topologia_dict(topo), toistoja)
+    return {
+        "export_topologia": dict(_kooste(vienti), huippumuisti_kt=_huippumuisti(simu.export_topologia)),
+        "import_topologia_dict": dict(
+            _kooste(tuonti), huippumuisti_kt=_huippumuisti(lambda: kohde.import_topologia_dict(topo))
+        ),
+    }
+
+
+def mittaa_tilastot(simu, rng, lokin_koko, toistoja):
+    simu.pakettiloki.clear()
+    komponentti = list(max(nx.connected_components(simu.verkko), key=len))
+    # Loki täytetään rajatulla parijoukolla, jotta reittien laskenta ei hallitse
+    idx = rng.choice(len(komponentti), size=(min(lokin_koko, 256), 2))
+    parit = [(komponentti[a], komponentti[b]) for a, b in idx[rng.integers(len(idx), size=lokin_koko)].tolist()]
+    t = time.perf_counter_ns()
+    simu.laheta_viestit(parit, siemen=rng)
+    eralahetys = np.array([time.perf_counter_ns() - t], dtype=np.float64)
+    tilastot = _mittaa(simu.hae_tilastot, toistoja)
+    return {
+        "laheta_viestit": dict(_kooste(eralahetys, lokin_koko)),
+        "hae_tilastot": dict(_kooste(tilastot), lokin_koko=lokin_koko,
+                             huippumuisti_kt=_huippumuisti(simu.hae_tilastot)),
+    }
+
+
+def mittaa_asettelu(simu, toistoja):
+    try:
+        viiveet = _mittaa(simu._paivita_pos_cache, toistoja)
+    except ImportError as e:
+        # spring_layout tarvitsee suurilla verkoilla SciPyn
+        return {"_paivita_pos_cache": {"ohitettu": str(e)}}
+    return {"_paivita_pos_cache": dict(_kooste(viiveet), huippumuisti_kt=_huippumuisti(simu._paivita_pos_cache))}
+
+
+def mittaa_piirto(simu, rng, toistoja):
+    figure = Figure(figsize=(8, 6))
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot(111)
+    piirtaja = VerkkoPiirtaja(simu, figure, ax)
+    nimet = list(simu.verkko.nodes)
+
+    def piirra_kokonaan():
+        simu._piirto_versio += 1
+        piirtaja.piirra()
+        figure.canvas.draw()
+
+    reitit = []
+    for a, b in rng.choice(len(nimet), size=(toistoja, 2)).tolist():
+        try:
+            reitit.append(simu._hae_reitti(nimet[a], nimet[b]))
+        except RuntimeError:
+            reitit.append([nimet[a]])
+    kierto = iter(reitit * 3)
+
+    def korosta():
+        piirtaja.piirra(next(kierto), True)
+        piirtaja.nayta()
+
+    kokonaan = _mittaa(piirra_kokonaan, max(1, toistoja // 5))
+    korostus = _mittaa(korosta, toistoja)
+    return {
+        "piirra_verkko": dict(_kooste(kokonaan), huippumuisti_kt=_huippumuisti(piirra_kokonaan)),
+        "piirra_verkko_korostus": dict(_kooste(korostus), huippumuisti_kt=_huippumuisti(korosta)),
+    }
+
+
+# --- Ajo ja vertailu ---
+
+def aja(koot, malli="waxman", siemen=1, toistoja=200, lokin_koko=200000, max_asettelu=2000, tulostus=None):
+    tulokset = {}
+    for koko in koot:
+        rng = np.random.default_rng(siemen)
+        t = time.perf_counter()
+        simu = _luo_simu(malli, koko, siemen)
+        rakennus = time.perf_counter() - t
+        mittaukset = {"luo_synteettinen_verkko": {"kesto_s": rakennus,
+                                                  "laitteita": simu.verkko.number_of_nodes(),
+                                                  "yhteyksia": simu.verkko.number_of_edges()}}
+        mittaukset.update(mittaa_laheta_viesti(simu, rng, toistoja))
+        mittaukset.update(mittaa_topologia(simu, max(3, toistoja // 50)))
+        mittaukset.update(mittaa_tilastot(simu, rng, lokin_koko, toistoja))
+        if koko <= max_asettelu:
+            mittaukset.update(mittaa_asettelu(simu, 3))
+            mittaukset.update(mittaa_piirto(simu, rng, min(toistoja, 50)))
+        for nimi, arvot in mittaukset.items():
+            tulokset[f"{malli}/{koko}/{nimi}"] = arvot
+            if tulostus is not None:
+                print(f"{malli:>16} {koko:>8} {nimi:<24} {_lyhyt(arvot)}", file=tulostus)
+    return {
+        "meta": {
+            "aika": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "alusta": platform.platform(),
+            "numpy": np.__version__,
+            "networkx": nx.__version__,
+            "matplotlib": matplotlib.__version__,
+            "malli": malli,
+            "siemen": siemen,
+        },
+        "tulokset": tulokset,
+    }
+
+
+def _lyhyt(arvot):
+    if "ohitettu" in arvot:
+        return "ohitettu: " + arvot["ohitettu"]
+    if "p50_us" not in arvot:
+        return ", ".join(f"{k}={v:.3g}" if isinstance(v, float) else f"{k}={v}" for k, v in arvot.items())
+    return (
+        f"{arvot['lapaisy_per_s']:>12.1f}/s  p50 {arvot['p50_us']:>10.1f} us  "
+        f"p99 {arvot['p99_us']:>10.1f} us  muisti {arvot.get('huippumuisti_kt', 0.0):>9.1f} kt"
+    )
+
+
+def vertaa(tulos, perustaso, toleranssi=0.2):
+    """Palauttaa listan regressioista: (mittaus, mittari, perustaso, nyt, suhde)."""
+    regressiot = []
+    for nimi, vanha in perustaso.get("tulokset", {}).items():
+        uusi = tulos["tulokset"].get(nimi)
+        if uusi is None:
+            continue
+        for mittari in VERRATTAVAT:
+            if mittari not in vanha or mittari not in uusi or vanha[mittari] <= 0:
+                continue
+            suhde = uusi[mittari] / vanha[mittari]
+            if suhde > 1.0 + toleranssi:
+                regressiot.append((nimi, mittari, vanha[mittari], uusi[mittari], suhde))
+    return regressiot
+
+
+def luo_parser():
+    parser = argparse.ArgumentParser(description="Verkkosimulaattorin suorituskykymittaukset.")
+    parser.add_argument("--koot", type=int, nargs="+", default=[100, 1000, 10000], help="topologioiden koot")
+    parser.add_argument("--malli", default="waxman", help="topologiamalli (ks. topology_generators)")
+    parser.add_argument("--siemen", type=int, default=1)
+    parser.add_argument("--toistoja", type=int, default=200, help="mitattuja kutsuja mittausta kohden")
+    parser.add_argument("--lokin-koko", type=int, default=200000, help="pakettilokin koko hae_tilastot-mittauksessa")
+    parser.add_argument("--max-asettelu", type=int, default=2000,
+                        help="suurin koko, jolle asettelu ja piirto mitataan")
+    parser.add_argument("--tulos", help="kirjoita tulokset JSON-tiedostoon")
+    parser.add_argument("--vertaa", help="perustason JSON-tiedosto, johon tuloksia verrataan")
+    parser.add_argument("--toleranssi", type=float, default=0.2,
+                        help="sallittu suhteellinen hidastuminen ennen regressiota (0.2 = 20 %%)")
+    return parser
+
+
+def main(argv=None):
+    args = luo_parser().parse_args(argv)
+    tulos = aja(args.koot, malli=args.malli, siemen=args.siemen, toistoja=args.toistoja,
+                lokin_koko=args.lokin_koko, max_asettelu=args.max_asettelu, tulostus=sys.stdout)
+    if args.tulos:
+        with open(args.tulos, "w", encoding="utf-8") as f:
+            json.dump(tulos, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+    if args.vertaa:
+        with open(args.vertaa, "r", encoding="utf-8") as f:
+            perustaso = json.load(f)
+        regressiot = vertaa(tulos, perustaso, args.toleranssi)
+        for nimi, mittari, vanha, uusi, suhde in regressiot:
+            print(f"REGRESSIO {nimi} {mittari}: {vanha:.1f} -> {uusi:.1f} ({suhde:.2f}x)", file=sys.stderr)
+        if regressiot:
+            return 1
+        print("Ei regressioita perustasoon verrattuna.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
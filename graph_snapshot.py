@@ -0,0 +1,365 @@
+"""Verkon muuttumaton tilannekuva reititystä ja lähetyksiä varten.
+
+networkx-verkko on edelleen muokattava alkuperäinen. Tilannekuvassa
+laitteiden nimet on korvattu kokonaislukutunnisteilla ja vierekkäisyys,
+viiveet ja häviöt ovat CSR-muotoisissa NumPy-taulukoissa. Simulaattori
+rakentaa uuden tilannekuvan vain, kun topologiaversio on muuttunut.
+
+Tunnisteet säilyvät uudelleenrakennuksissa (poistetun laitteen tunniste
+jää tyhjäksi riviksi), joten aiemmin lasketut reittipuut pysyvät
+käyttökelpoisina. Pelkät viivemuutokset (esim. yhteys alas = ääretön
+viive) johdetaan edellisestä tilannekuvasta ilman uudelleenrakennusta,
+ja reittipuut korjataan inkrementaalisesti (korjaa_pidennys, korjaa_lyhennys).
+"""
+
+import copy
+import heapq
+from array import array
+
+import numpy as np
+
+
+class Tilannekuva:
+    """CSR-muotoinen kopio verkosta.
+
+    Rivin u naapurit ovat naapurit[indptr[u]:indptr[u + 1]] tunnistejärjestyksessä;
+    viiveet ja haviot ovat samoissa indekseissä. Jokainen yhteys on
+    taulukoissa molempiin suuntiin.
+    """
+
+    def __init__(self, verkko, versio, edellinen=None):
+        self.versio = versio
+        if edellinen is not None:
+            self.tunnisteet = dict(edellinen.tunnisteet)
+            self.nimet = list(edellinen.nimet)
+        else:
+            self.tunnisteet = {}
+            self.nimet = []
+        for nimi in verkko:
+            if nimi not in self.tunnisteet:
+                self.tunnisteet[nimi] = len(self.nimet)
+                self.nimet.append(nimi)
+        self.solmuja = n = len(self.nimet)
+
+        m = verkko.number_of_edges()
+        tunnisteet = self.tunnisteet
+        u = np.empty(m, dtype=np.int64)
+        v = np.empty(m, dtype=np.int64)
+        viiveet = np.empty(m)
+        haviot = np.empty(m)
+        for i, (a, b, data) in enumerate(verkko.edges(data=True)):
+            u[i] = tunnisteet[a]
+            v[i] = tunnisteet[b]
+            viiveet[i] = data.get("weight", 0.0)
+            haviot[i] = data.get("loss", 0.0)
+
+        lahdot = np.concatenate([u, v])
+        kohteet = np.concatenate([v, u])
+        jarjestys = np.lexsort((kohteet, lahdot))
+        lahdot = lahdot[jarjestys]
+        kohteet = kohteet[jarjestys]
+
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(lahdot, minlength=n), out=self.indptr[1:])
+        self.naapurit = kohteet.astype(np.int32)
+        self.viiveet = np.concatenate([viiveet, viiveet])[jarjestys]
+        self.haviot = np.concatenate([haviot, haviot])[jarjestys]
+        # Rivit ovat järjestyksessä (lähtö, kohde), joten avaimet ovat kasvavia
+        self._avaimet = lahdot * n + kohteet
+        self._listat = None
+
+    @classmethod
+    def taulukoista(cls, nimet, indptr, naapurit, viiveet, haviot, versio):
+        """Tilannekuva valmiista CSR-taulukoista (esim. muistikuvattu tiedosto) kopioimatta niitä.
+
+        Rivien on oltava järjestyksessä (lähtö, kohde) kuten __init__ ne tekee.
+        """
+        kuva = cls.__new__(cls)
+        kuva.versio = versio
+        kuva.nimet = list(nimet)
+        kuva.tunnisteet = {nimi: i for i, nimi in enumerate(kuva.nimet)}
+        kuva.solmuja = n = len(kuva.nimet)
+        kuva.indptr = indptr
+        kuva.naapurit = naapurit
+        kuva.viiveet = viiveet
+        kuva.haviot = haviot
+        lahdot = np.repeat(np.arange(n, dtype=np.int64), np.diff(indptr))
+        kuva._avaimet = lahdot * n + naapurit
+        kuva._listat = None
+        return kuva
+
+    def reunat(self, lahdot, kohteet):
+        """Palauttaa linkkien lahdot[i] -> kohteet[i] indeksit CSR-taulukoihin."""
+        avaimet = np.asarray(lahdot, dtype=np.int64) * self.solmuja + np.asarray(kohteet, dtype=np.int64)
+        indeksit = np.searchsorted(self._avaimet, avaimet)
+        loytyi = indeksit < len(self._avaimet)
+        loytyi[loytyi] = self._avaimet[indeksit[loytyi]] == avaimet[loytyi]
+        if not loytyi.all():
+            raise RuntimeError("Reitillä on linkki, jota ei ole tilannekuvassa.")
+        return indeksit
+
+    def _hae_listat(self):
+        # Yksittäisten alkioiden luku on Python-listoista nopeampaa kuin NumPysta
+        if self._listat is None:
+            self._listat = (
+                self.indptr.tolist(), self.naapurit.tolist(),
+                self.viiveet.tolist(), self.haviot.tolist(),
+            )
+        return self._listat
+
+    def reuna(self, u, v):
+        """Linkin u -> v indeksi CSR-taulukoihin."""
+        indptr, naapurit, _, _ = self._hae_listat()
+        try:
+            return naapurit.index(v, indptr[u], indptr[u + 1])
+        except ValueError:
+            raise RuntimeError("Reitillä on linkki, jota ei ole tilannekuvassa.") from None
+
+    def johda(self, versio, viiveet):
+        """Uusi tilannekuva, jossa rakenne on sama mutta viiveet muuttuneet.
+
+        viiveet on sanakirja CSR-indeksi -> uusi viive; ääretön viive
+        tarkoittaa, ettei linkkiä käytetä. Rakennetaulukot jaetaan.
+        """
+        uusi = copy.copy(self)
+        uusi.versio = versio
+        indeksit = np.fromiter(viiveet.keys(), dtype=np.int64, count=len(viiveet))
+        arvot = np.fromiter(viiveet.values(), dtype=float, count=len(viiveet))
+        uusi.viiveet = self.viiveet.copy()
+        uusi.viiveet[indeksit] = arvot
+        if self._listat is not None:
+            viivelista = list(self._listat[2])
+            for j, viive in viiveet.items():
+                viivelista[j] = viive
+            uusi._listat = (self._listat[0], self._listat[1], viivelista, self._listat[3])
+        return uusi
+
+    def linkit(self, reitti):
+        """Reitin (tunnisteet) linkkien (viive, häviö) -parit yksittäislähetystä varten."""
+        _, _, viiveet, haviot = self._hae_listat()
+        linkit = []
+        for u, v in zip(reitti, reitti[1:]):
+            j = self.reuna(u, v)
+            linkit.append((viiveet[j], haviot[j]))
+        return linkit
+
+    def _dijkstra(self, lahde, painot, kohde=None, estetyt_solmut=(), estetyt_reunat=()):
+        indptr, naapurit, _, _ = self._hae_listat()
+        inf = float("inf")
+        etaisyydet = [inf] * self.solmuja
+        edeltajat = [-1] * self.solmuja
+        kasitelty = bytearray(self.solmuja)
+        for solmu in estetyt_solmut:
+            kasitelty[solmu] = 1
+        etaisyydet[lahde] = 0.0
+        keko = [(0.0, lahde)]
+        pop, push = heapq.heappop, heapq.heappush
+        while keko:
+            d, u = pop(keko)
+            if kasitelty[u]:
+                continue
+            kasitelty[u] = 1
+            if u == kohde:
+                break
+            for j in range(indptr[u], indptr[u + 1]):
+                if estetyt_reunat and j in estetyt_reunat:
+                    continue
+                v = naapurit[j]
+                uusi = d + painot[j]
+                if uusi < etaisyydet[v]:
+                    etaisyydet[v] = uusi
+                    edeltajat[v] = u
+                    push(keko, (uusi, v))
+        return edeltajat, etaisyydet
+
+    @staticmethod
+    def polku(edeltajat, lahde, kohde):
+        """Polku lahde -> kohde edeltäjätaulukosta."""
+        polku = [kohde]
+        while polku[-1] != lahde:
+            polku.append(edeltajat[polku[-1]])
+        polku.reverse()
+        return polku
+
+    def lyhimmat_polut(self, lahde, painot=None):
+        """Dijkstra tunnisteesta lahde; palauttaa (edeltajat, etaisyydet).
+
+        painot on CSR-järjestyksessä oleva linkkien hintalista (oletus:
+        viiveet). Tulokset ovat tiiviitä array-taulukoita, joiden alkiot
+        luetaan Python-lukuina. Juuren ja saavuttamattomien laitteiden
+        edeltäjä on -1 ja saavuttamattomien etäisyys ääretön.
+        """
+        if painot is None:
+            painot = self._hae_listat()[2]
+        edeltajat, etaisyydet = self._dijkstra(lahde, painot)
+        return array("i", edeltajat), array("d", etaisyydet)
+
+    def tasakustanteiset_polut(self, etaisyydet, lahde, kohde, enintaan):
+        """Kaikki lyhimmät polut lahde -> kohde, enintään enintaan kappaletta.
+
+        etaisyydet ovat viiveetäisyydet lähteestä (lyhimmat_polut). Polut
+        kootaan kohteesta taaksepäin linkeistä, joilla d(u) + w = d(v).
+        Palauttaa tyhjän listan, jos kohdetta ei saavuteta (etaisyydet voivat
+        olla lyhyemmät kuin tunnisteita, jos laitteita on lisätty puun
+        laskemisen jälkeen).
+        """
+        indptr, naapurit, viiveet, _ = self._hae_listat()
+        inf = float("inf")
+        pituus = len(etaisyydet)
+        if kohde >= pituus or etaisyydet[kohde] == inf:
+            return []
+        polut = []
+        pino = [[kohde]]
+        while pino and len(polut) < enintaan:
+            polku = pino.pop()
+            v = polku[-1]
+            if v == lahde:
+                polut.append(polku[::-1])
+                continue
+            dv = etaisyydet[v]
+            toleranssi = 1e-9 * max(1.0, dv)
+            # Käänteinen järjestys, jotta polut tulevat pinosta tunnistejärjestyksessä
+            for j in range(indptr[v + 1] - 1, indptr[v] - 1, -1):
+                u = naapurit[j]
+                du = etaisyydet[u] if u < pituus else inf
+                if abs(du + viiveet[j] - dv) <= toleranssi and u not in polku:
+                    pino.append(polku + [u])
+        return polut
+
+    def k_lyhinta_polkua(self, lahde, kohde, k, painot=None):
+        """Yenin algoritmi: enintään k silmukatonta polkua kasvavassa hintajärjestyksessä.
+
+        Palauttaa listan (hinta, polku) -pareja; tyhjä, jos kohdetta ei saavuteta.
+        """
+        if painot is None:
+            painot = self._hae_listat()[2]
+        edeltajat, etaisyydet = self._dijkstra(lahde, painot, kohde)
+        if etaisyydet[kohde] == float("inf"):
+            return []
+        polut = [(etaisyydet[kohde], self.polku(edeltajat, lahde, kohde))]
+        nahdyt = {tuple(polut[0][1])}
+        ehdokkaat = []
+        while len(polut) < k:
+            edellinen = polut[-1][1]
+            juuren_hinta = 0.0
+            for i in range(len(edellinen) - 1):
+                haara = edellinen[i]
+                juuri = edellinen[: i + 1]
+                # Estetään jo löydettyjen, saman juuren jakavien polkujen seuraava linkki
+                estetyt_reunat = {
+                    self.reuna(haara, p[i + 1])
+                    for _, p in polut
+                    if len(p) > i + 1 and p[: i + 1] == juuri
+                }
+                h_edeltajat, h_etaisyydet = self._dijkstra(
+                    haara, painot, kohde, estetyt_solmut=juuri[:-1], estetyt_reunat=estetyt_reunat
+                )
+                if h_etaisyydet[kohde] != float("inf"):
+                    uusi = juuri[:-1] + self.polku(h_edeltajat, haara, kohde)
+                    avain = tuple(uusi)
+                    if avain not in nahdyt:
+                        nahdyt.add(avain)
+                        heapq.heappush(ehdokkaat, (juuren_hinta + h_etaisyydet[kohde], uusi))
+                juuren_hinta += painot[self.reuna(haara, edellinen[i + 1])]
+            if not ehdokkaat:
+                break
+            polut.append(heapq.heappop(ehdokkaat))
+        return polut
+
+    # --- Reittipuiden inkrementaalinen korjaus ---
+
+    def _laajenna(self, puu):
+        # Puun jälkeen lisätyt laitteet ovat puun kannalta saavuttamattomia
+        edeltajat, etaisyydet = puu
+        puuttuu = self.solmuja - len(edeltajat)
+        if puuttuu > 0:
+            edeltajat.extend([-1] * puuttuu)
+            etaisyydet.extend([float("inf")] * puuttuu)
+
+    def korjaa_pidennys(self, puu, u, v):
+        """Korjaa puun, kun linkki u - v on pidentynyt tai poistunut käytöstä.
+
+        Vain linkin takana oleva alipuu lasketaan uudelleen: sen solmut
+        saavat aloitusetäisyyden alipuun ulkopuolisista naapureistaan ja
+        Dijkstra ajetaan alipuun sisällä. Palauttaa alipuun koon.
+        """
+        self._laajenna(puu)
+        edeltajat, etaisyydet = puu
+        if edeltajat[v] != u:
+            u, v = v, u
+            if edeltajat[v] != u:
+                return 0
+        indptr, naapurit, viiveet, _ = self._hae_listat()
+        inf = float("inf")
+
+        alipuu = [v]
+        joukossa = {v}
+        for x in alipuu:
+            for j in range(indptr[x], indptr[x + 1]):
+                w = naapurit[j]
+                if edeltajat[w] == x and w not in joukossa:
+                    joukossa.add(w)
+                    alipuu.append(w)
+        for x in alipuu:
+            etaisyydet[x] = inf
+            edeltajat[x] = -1
+
+        keko = []
+        for x in alipuu:
+            paras, edeltaja = inf, -1
+            for j in range(indptr[x], indptr[x + 1]):
+                w = naapurit[j]
+                if w not in joukossa and etaisyydet[w] + viiveet[j] < paras:
+                    paras, edeltaja = etaisyydet[w] + viiveet[j], w
+            if edeltaja >= 0:
+                etaisyydet[x] = paras
+                edeltajat[x] = edeltaja
+                keko.append((paras, x))
+        heapq.heapify(keko)
+        pop, push = heapq.heappop, heapq.heappush
+        while keko:
+            d, x = pop(keko)
+            if d > etaisyydet[x]:
+                continue
+            for j in range(indptr[x], indptr[x + 1]):
+                w = naapurit[j]
+                uusi = d + viiveet[j]
+                if w in joukossa and uusi < etaisyydet[w]:
+                    etaisyydet[w] = uusi
+                    edeltajat[w] = x
+                    push(keko, (uusi, w))
+        return len(alipuu)
+
+    def korjaa_lyhennys(self, puu, u, v, viive):
+        """Korjaa puun, kun linkki u - v on lisätty tai sen viive on lyhentynyt.
+
+        Lyhennys etenee vain solmuihin, joiden etäisyys paranee. Palauttaa
+        muuttuneiden solmujen määrän.
+        """
+        self._laajenna(puu)
+        edeltajat, etaisyydet = puu
+        if etaisyydet[u] + viive < etaisyydet[v]:
+            alku, juuri = u, v
+        elif etaisyydet[v] + viive < etaisyydet[u]:
+            alku, juuri = v, u
+        else:
+            return 0
+        indptr, naapurit, viiveet, _ = self._hae_listat()
+        etaisyydet[juuri] = etaisyydet[alku] + viive
+        edeltajat[juuri] = alku
+        muuttuneet = {juuri}
+        keko = [(etaisyydet[juuri], juuri)]
+        pop, push = heapq.heappop, heapq.heappush
+        while keko:
+            d, x = pop(keko)
+            if d > etaisyydet[x]:
+                continue
+            for j in range(indptr[x], indptr[x + 1]):
+                w = naapurit[j]
+                uusi = d + viiveet[j]
+                if uusi < etaisyydet[w]:
+                    etaisyydet[w] = uusi
+                    edeltajat[w] = x
+                    muuttuneet.add(w)
+                    push(keko, (uusi, w))
+        return len(muuttuneet)
@@ -0,0 +1,127 @@
+"""Simulaattorin kuumien polkujen ajanotto ja profilointikoukut.
+
+Instrumentointi on oletuksena pois päältä: simulaattori tarkistaa vain,
+onko sen instrumentointi-attribuutti None. Käyttöönotto:
+
+    mittari = simu.ota_instrumentointi_kayttoon(yhteenvetovali=5.0)
+    ...
+    print(simu.hae_instrumentointi())
+
+Ulkoisen profiloijan voi kytkeä kuorman ympärille:
+
+    with profiloi() as profiili:
+        simu.laheta_viestit(parit)
+    profiili.print_stats("cumulative")
+"""
+
+import cProfile
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Instrumentointi:
+    """Vaihekohtaiset ajat ja laskurit.
+
+    Vaiheet ovat reitti (reitin haku), hopit (hyppysilmukka ilman
+    nukkumista), nukkuminen, loki (pakettilokiin kirjaus), asettelu,
+    piirto (GUI) ja konvergenssi (reittipuiden korjaus vikatapahtumissa).
+    Jos yhteenvetovali (s) on annettu, kuuntelija saa yhteenvedon
+    enintään kerran välissä lähetysten yhteydessä.
+    """
+
+    VAIHEET = ("reitti", "hopit", "nukkuminen", "loki", "asettelu", "piirto", "konvergenssi")
+
+    def __init__(self, yhteenvetovali=None, kuuntelija=None):
+        self.yhteenvetovali = yhteenvetovali
+        self.kuuntelija = kuuntelija if kuuntelija is not None else tulosta_yhteenveto
+        self._lukko = threading.Lock()
+        self.nollaa()
+
+    def nollaa(self):
+        with self._lukko:
+            # vaihe -> [kutsuja, kokonaisaika_s, suurin_s]
+            self._vaiheet = {v: [0, 0.0, 0.0] for v in self.VAIHEET}
+            self.laskurit = {}
+            self._alku = time.perf_counter()
+            self._seuraava_yhteenveto = (
+                self._alku + self.yhteenvetovali if self.yhteenvetovali else None
+            )
+
+    def kirjaa(self, vaihe, kesto_s, kertoja=1):
+        with self._lukko:
+            tiedot = self._vaiheet.get(vaihe)
+            if tiedot is None:
+                tiedot = self._vaiheet[vaihe] = [0, 0.0, 0.0]
+            tiedot[0] += kertoja
+            tiedot[1] += kesto_s
+            if kesto_s > tiedot[2]:
+                tiedot[2] = kesto_s
+
+    def laske(self, laskuri, maara=1):
+        with self._lukko:
+            self.laskurit[laskuri] = self.laskurit.get(laskuri, 0) + maara
+
+    @contextmanager
+    def vaihe(self, nimi):
+        alku = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.kirjaa(nimi, time.perf_counter() - alku)
+
+    def lahetys_valmis(self, maara=1):
+        """Kasvattaa lähetyslaskuria ja antaa tarvittaessa määräaikaisen yhteenvedon."""
+        self.laske("lahetykset", maara)
+        if self._seuraava_yhteenveto is not None and time.perf_counter() >= self._seuraava_yhteenveto:
+            self._seuraava_yhteenveto = time.perf_counter() + self.yhteenvetovali
+            self.kuuntelija(self.yhteenveto())
+
+    def yhteenveto(self):
+        with self._lukko:
+            vaiheet = {}
+            for nimi, (kutsuja, yhteensa, suurin) in self._vaiheet.items():
+                vaiheet[nimi] = {
+                    "kutsuja": kutsuja,
+                    "yhteensa_ms": yhteensa * 1000.0,
+                    "keskiarvo_us": yhteensa / kutsuja * 1e6 if kutsuja else 0.0,
+                    "max_us": suurin * 1e6,
+                }
+            return {
+                "kesto_s": time.perf_counter() - self._alku,
+                "vaiheet": vaiheet,
+                "laskurit": dict(self.laskurit),
+            }
+
+
+def tulosta_yhteenveto(yhteenveto):
+    rivit = [f"--- Instrumentointi ({yhteenveto['kesto_s']:.1f} s) ---"]
+    for nimi, v in yhteenveto["vaiheet"].items():
+        if v["kutsuja"]:
+            rivit.append(
+                f"  {nimi:<11} {v['kutsuja']:>9} kertaa  {v['yhteensa_ms']:>10.1f} ms  "
+                f"ka {v['keskiarvo_us']:>9.1f} us  max {v['max_us']:>9.1f} us"
+            )
+    for nimi, maara in sorted(yhteenveto["laskurit"].items()):
+        rivit.append(f"  {nimi:<11} {maara:>9}")
+    print("\n".join(rivit))
+
+
+@contextmanager
+def profiloi(profiloija=None):
+    """Ajaa with-lohkon profiloijan alla ja palauttaa profiloijan.
+
+    Oletuksena cProfile.Profile. Ulkoiselta profiloijalta kelpaa
+    enable()/disable()- tai start()/stop()-pari (esim. pyinstrument).
+    """
+    if profiloija is None:
+        profiloija = cProfile.Profile()
+    if hasattr(profiloija, "enable"):
+        kaynnista, pysayta = profiloija.enable, profiloija.disable
+    else:
+        kaynnista, pysayta = profiloija.start, profiloija.stop
+    kaynnista()
+    try:
+        yield profiloija
+    finally:
+        pysayta()
@@ -0,0 +1,205 @@
+"""Virtualisoitu lokinäkymä Tkinterille.
+
+Näkymä piirtää Text-widgettiin vain näkyvissä olevat rivit. Rivit tulevat
+lähteestä, jolla on pituus, ensimmäisen säilytetyn rivin numero
+(ensimmainen) ja rivit(alku, loppu). Lähteitä on kaksi: muistissa pidettävä,
+kooltaan rajattu Rivivarasto ja pakettilokin merkinnät, jotka muotoillaan
+riveiksi vasta näytettäessä.
+
+Lähteen muuttuessa kutsutaan paivita(); piirrot yhdistetään niin, että
+raskaidenkin lähetysten aikana näkymä piirretään enintään muutaman kerran
+sekunnissa.
+"""
+
+import tkinter as tk
+import tkinter.font as tkfont
+from tkinter import ttk
+
+
+class Rivivarasto:
+    """Lokirivit muistissa; vanhimmat poistuvat, kun rivejä on yli max_rivit."""
+
+    def __init__(self, max_rivit=50_000):
+        if max_rivit <= 0:
+            raise ValueError("Rivien enimmäismäärän on oltava positiivinen.")
+        self.max_rivit = max_rivit
+        self._rivit = []
+        self._alku = 0
+        self._poistetut = 0
+
+    def lisaa(self, rivi):
+        self._rivit.append(rivi)
+        if len(self._rivit) - self._alku > self.max_rivit:
+            self._alku += 1
+            # Tiivistetään harvoin, jotta poistojen hinta jakautuu monelle lisäykselle
+            if self._alku >= max(1024, self.max_rivit // 2):
+                del self._rivit[:self._alku]
+                self._poistetut += self._alku
+                self._alku = 0
+
+    def tyhjenna(self):
+        self._poistetut += len(self._rivit)
+        self._rivit = []
+        self._alku = 0
+
+    @property
+    def ensimmainen(self):
+        """Vanhimman säilytetyn rivin järjestysnumero."""
+        return self._poistetut + self._alku
+
+    def __len__(self):
+        return len(self._rivit) - self._alku
+
+    def rivit(self, alku, loppu):
+        return self._rivit[self._alku + alku:self._alku + loppu]
+
+
+class Pakettilokilahde:
+    """Pakettilokin merkinnät riveinä; muotoile(merkinta) kutsutaan vain näkyville.
+
+    seqt rajaa lähteen suodatettuihin merkintöihin (esim. Pakettiloki.kysy);
+    None näyttää koko lokin, joka kasvaa lähetysten myötä.
+    """
+
+    POISTUNUT = "(merkintä on jo poistunut pakettilokista)"
+
+    def __init__(self, loki, muotoile, seqt=None):
+        self.loki = loki
+        self.muotoile = muotoile
+        self.seqt = seqt
+
+    @property
+    def ensimmainen(self):
+        return self.loki.ensimmainen if self.seqt is None else 0
+
+    def __len__(self):
+        return len(self.loki) if self.seqt is None else len(self.seqt)
+
+    def rivit(self, alku, loppu):
+        if self.seqt is None:
+            seqt = range(self.loki.ensimmainen + alku, self.loki.ensimmainen + loppu)
+        else:
+            seqt = self.seqt[alku:loppu].tolist()
+        rivit = []
+        for seq in seqt:
+            try:
+                rivit.append(self.muotoile(self.loki.merkinta(seq)))
+            except IndexError:
+                rivit.append(self.POISTUNUT)
+        return rivit
+
+
+class VirtuaalinenLokinakyma(ttk.Frame):
+    """Vieritettävä lokinäkymä, joka piirtää vain näkyvän ikkunan lähteestä.
+
+    Kun näkymä on vieritetty loppuun, se seuraa uusia rivejä. seuraa_lahdetta
+    tarkistaa lähteen muutokset itse PAIVITYSVALI_MS välein (lähteet, joihin
+    kirjoitetaan muualta kuin näkymän kautta, kuten pakettiloki).
+    """
+
+    PAIVITYSVALI_MS = 250
+    RULLAN_RIVIT = 3
+
+    def __init__(self, master, lahde, korkeus=10, seuraa_lahdetta=False, **kwargs):
+        super().__init__(master, **kwargs)
+        self.lahde = lahde
+        self._teksti = tk.Text(self, wrap="none", height=korkeus, state="disabled")
+        self._teksti.grid(row=0, column=0, sticky="nsew")
+        self._pysty = ttk.Scrollbar(self, orient="vertical", command=self._vierita)
+        self._pysty.grid(row=0, column=1, sticky="ns")
+        vaaka = ttk.Scrollbar(self, orient="horizontal", command=self._teksti.xview)
+        vaaka.grid(row=1, column=0, sticky="ew")
+        self._teksti.configure(xscrollcommand=vaaka.set)
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+
+        # Ylimmän näkyvän rivin järjestysnumero; seurataan loppua, kunnes käyttäjä vierittää
+        self._ylin = 0
+        self._seuraa = True
+        self._ajastettu = None
+        self._tarkkailu = None
+        self._piirretty = None
+        self._rivikorkeus = tkfont.Font(root=self, font=self._teksti.cget("font")).metrics("linespace")
+
+        self._teksti.bind("<Configure>", lambda _: self._piirra())
+        for tapahtuma in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self._teksti.bind(tapahtuma, self._rulla)
+        self._teksti.bind("<Prior>", lambda _: self._siirry_sivuja(-1))
+        self._teksti.bind("<Next>", lambda _: self._siirry_sivuja(1))
+        self._teksti.bind("<Control-Home>", lambda _: self._siirry(0))
+        self._teksti.bind("<Control-End>", lambda _: self._siirry(float("inf")))
+        if seuraa_lahdetta:
+            self._tarkkailu = self.after(self.PAIVITYSVALI_MS, self._tarkkaile)
+
+    def destroy(self):
+        for ajastus in (self._ajastettu, self._tarkkailu):
+            if ajastus is not None:
+                self.after_cancel(ajastus)
+        self._ajastettu = self._tarkkailu = None
+        super().destroy()
+
+    def aseta_lahde(self, lahde):
+        self.lahde = lahde
+        self._seuraa = True
+        self._piirra()
+
+    def paivita(self):
+        """Pyytää uudelleenpiirron; pyynnöt yhdistetään PAIVITYSVALI_MS:n jaksoihin."""
+        if self._ajastettu is None:
+            self._ajastettu = self.after(self.PAIVITYSVALI_MS, self._piirra)
+
+    def _tarkkaile(self):
+        if (self.lahde.ensimmainen, len(self.lahde)) != self._piirretty:
+            self._piirra()
+        self._tarkkailu = self.after(self.PAIVITYSVALI_MS, self._tarkkaile)
+
+    def _nakyvia(self):
+        teksti = self._teksti
+        reunat = 2 * (teksti.winfo_pixels(teksti.cget("borderwidth")) + teksti.winfo_pixels(teksti.cget("pady")))
+        return max(1, (teksti.winfo_height() - reunat) // self._rivikorkeus)
+
+    def _piirra(self):
+        if self._ajastettu is not None:
+            self.after_cancel(self._ajastettu)
+            self._ajastettu = None
+        lahde = self.lahde
+        ensimmainen = lahde.ensimmainen
+        n = len(lahde)
+        nakyvia = self._nakyvia()
+        viimeinen_ylin = ensimmainen + max(0, n - nakyvia)
+        self._ylin = viimeinen_ylin if self._seuraa else min(max(self._ylin, ensimmainen), viimeinen_ylin)
+        alku = self._ylin - ensimmainen
+        rivit = lahde.rivit(alku, min(n, alku + nakyvia))
+
+        self._teksti.configure(state="normal")
+        self._teksti.delete("1.0", "end")
+        self._teksti.insert("1.0", "\n".join(rivit))
+        self._teksti.configure(state="disabled")
+        if n:
+            self._pysty.set(alku / n, min(1.0, (alku + nakyvia) / n))
+        else:
+            self._pysty.set(0.0, 1.0)
+        self._piirretty = (ensimmainen, n)
+
+    def _siirry(self, ylin):
+        ensimmainen = self.lahde.ensimmainen
+        viimeinen_ylin = ensimmainen + max(0, len(self.lahde) - self._nakyvia())
+        self._ylin = int(min(max(ylin, ensimmainen), viimeinen_ylin))
+        self._seuraa = self._ylin >= viimeinen_ylin
+        self._piirra()
+        return "break"
+
+    def _siirry_sivuja(self, sivuja):
+        return self._siirry(self._ylin + sivuja * self._nakyvia())
+
+    def _vierita(self, komento, maara, yksikko=None):
+        if komento == "moveto":
+            self._siirry(self.lahde.ensimmainen + int(float(maara) * len(self.lahde)))
+        elif yksikko == "pages":
+            self._siirry_sivuja(int(maara))
+        else:
+            self._siirry(self._ylin + int(maara))
+
+    def _rulla(self, tapahtuma):
+        ylos = tapahtuma.num == 4 or (tapahtuma.num != 5 and tapahtuma.delta > 0)
+        return self._siirry(self._ylin + (-1 if ylos else 1) * self.RULLAN_RIVIT)
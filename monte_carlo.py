@@ -0,0 +1,163 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import networkx as nx
+import numpy as np
+
+from network_sim import Verkkosimulaattori
+from packet_log import Viivetilasto, TILA_OK, TILA_HAVISI
+
+
+# Työprosessin oma simulaattori; rakennetaan kerran prosessia kohden
+_simu = None
+_nimet = None
+_otanta = None
+
+
+class MonteCarloTulos:
+    """Yhdistetyt tulokset: sarakkeet lähetysjärjestyksessä ja koostetilasto."""
+
+    def __init__(self, nimet, lahettajat, vastaanottajat, viiveet, onnistui, havio_hopit, tilasto):
+        self.nimet = nimet
+        self.lahettajat = lahettajat
+        self.vastaanottajat = vastaanottajat
+        self.kokonaisviive_ms = viiveet
+        self.onnistui = onnistui
+        self.havio_hop = havio_hopit
+        self.tilasto = tilasto
+
+    def __len__(self):
+        return len(self.kokonaisviive_ms)
+
+    def hae_tilastot(self):
+        return self.tilasto.koosteet()
+
+    def kirjaa_lokiin(self, simu):
+        """Kirjaa tulokset simulaattorin pakettilokiin (simu:ssa sama topologia)."""
+        nimet = self.nimet
+        lahettajat = [nimet[i] for i in self.lahettajat.tolist()]
+        vastaanottajat = [nimet[i] for i in self.vastaanottajat.tolist()]
+        reitit = {}
+        for pari in zip(lahettajat, vastaanottajat):
+            if pari not in reitit:
+                reitit[pari] = simu.hae_reitti(*pari)
+        reittilista = [reitit[p] for p in zip(lahettajat, vastaanottajat)]
+        pituudet = np.fromiter((len(r) for r in reittilista), dtype=np.int64, count=len(reittilista))
+        simu.pakettiloki.lisaa_monta(
+            lahettajat,
+            vastaanottajat,
+            "",
+            reittilista,
+            np.where(self.onnistui, pituudet, self.havio_hop + 1),
+            self.kokonaisviive_ms,
+            np.where(self.onnistui, TILA_OK, TILA_HAVISI),
+        )
+
+
+def _alusta(topo, parit):
+    global _simu, _nimet, _otanta
+    _simu = Verkkosimulaattori()
+    _simu.import_topologia_dict(topo)
+    _nimet = [nd["name"] for nd in topo.get("nodes", [])]
+    indeksit = {n: i for i, n in enumerate(_nimet)}
+    if parit is not None:
+        try:
+            _otanta = ("parit", np.array([[indeksit[a], indeksit[b]] for a, b in parit], dtype=np.int64))
+        except KeyError as e:
+            raise ValueError(f"Laitetta {e} ei löydy topologiasta.")
+        return
+
+    # Satunnaiset parit arvotaan saman yhtenäisen komponentin sisältä,
+    # jotta jokaiselle parille on olemassa reitti.
+    jarjestys = []
+    alut = []
+    koot = []
+    for komponentti in nx.connected_components(_simu.verkko):
+        if len(komponentti) < 2:
+            continue
+        alut.append(len(jarjestys))
+        koot.append(len(komponentti))
+        jarjestys.extend(sorted(indeksit[n] for n in komponentti))
+    if not jarjestys:
+        raise RuntimeError("Topologiassa ei ole yhtään yhteydellistä laiteparia.")
+    jarjestys = np.array(jarjestys, dtype=np.int64)
+    komponentti_idt = np.repeat(np.arange(len(alut)), koot)
+    _otanta = ("satunnainen", jarjestys, komponentti_idt, np.array(alut), np.array(koot))
+
+
+def _arvo_parit(rng, maara):
+    if _otanta[0] == "parit":
+        parit = _otanta[1]
+        return parit[rng.integers(len(parit), size=maara)]
+    _, jarjestys, komponentti_idt, alut, koot = _otanta
+    paikka = rng.integers(len(jarjestys), size=maara)
+    c = komponentti_idt[paikka]
+    sisainen = paikka - alut[c]
+    vastapaikka = alut[c] + (sisainen + 1 + rng.integers(koot[c] - 1)) % koot[c]
+    return np.stack([jarjestys[paikka], jarjestys[vastapaikka]], axis=1)
+
+
+def _aja_pala(siemen, maara):
+    rng = np.random.default_rng(siemen)
+    parit_idx = _arvo_parit(rng, maara)
+    parit = [(_nimet[a], _nimet[b]) for a, b in parit_idx.tolist()]
+    tulos = _simu.laheta_viestit(parit, siemen=rng, kirjaa=False)
+    tilasto = Viivetilasto()
+    tilasto.lisaa_monta(tulos["kokonaisviive_ms"], np.count_nonzero(tulos["onnistui"]))
+    return (
+        parit_idx[:, 0].astype(np.int32),
+        parit_idx[:, 1].astype(np.int32),
+        tulos["kokonaisviive_ms"],
+        tulos["onnistui"],
+        tulos["havio_hop"].astype(np.int32),
+        tilasto,
+    )
+
+
+def aja_monte_carlo(topo, lahetyksia, siemen=0, prosesseja=None, parit=None, palan_koko=20000):
+    """Ajaa lahetyksia lähetystä topologiassa (export_topologia-muoto) prosessipoolissa.
+
+    Työ jaetaan kiinteän kokoisiin paloihin, ja jokainen pala saa oman
+    pääsiemenestä johdetun satunnaisvirran (SeedSequence.spawn). Tulokset
+    yhdistetään palajärjestyksessä, joten ne ovat samat prosessien määrästä
+    riippumatta. Jos parit on annettu, jokainen lähetys arpoo parin niistä;
+    muuten parit arvotaan tasaisesti yhdistettyjen laitteiden joukosta.
+    """
+    lahetyksia = int(lahetyksia)
+    if lahetyksia < 0:
+        raise ValueError("Lähetysten määrä ei voi olla negatiivinen.")
+    if parit is not None:
+        parit = [(p[0], p[1]) for p in parit]
+        if not parit:
+            raise ValueError("Parilista on tyhjä.")
+    nimet = [nd["name"] for nd in topo.get("nodes", [])]
+
+    koot = [palan_koko] * (lahetyksia // palan_koko)
+    if lahetyksia % palan_koko:
+        koot.append(lahetyksia % palan_koko)
+    siemenet = np.random.SeedSequence(siemen).spawn(len(koot))
+
+    if prosesseja is None:
+        prosesseja = os.cpu_count() or 1
+    prosesseja = max(1, min(int(prosesseja), len(koot) or 1))
+
+    if not koot:
+        palat = []
+    elif prosesseja == 1:
+        _alusta(topo, parit)
+        palat = [_aja_pala(s, k) for s, k in zip(siemenet, koot)]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=prosesseja, initializer=_alusta, initargs=(topo, parit)
+        ) as pool:
+            palat = list(pool.map(_aja_pala, siemenet, koot))
+
+    tilasto = Viivetilasto()
+    for pala in palat:
+        tilasto.yhdista(pala[5])
+    if palat:
+        sarakkeet = [np.concatenate([pala[i] for pala in palat]) for i in range(5)]
+    else:
+        sarakkeet = [np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32), np.empty(0),
+                     np.empty(0, dtype=bool), np.empty(0, dtype=np.int32)]
+    return MonteCarloTulos(nimet, *sarakkeet, tilasto)
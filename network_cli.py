@@ -0,0 +1,129 @@
+"""Verkkosimulaattorin komentorivikäyttö ilman graafista käyttöliittymää.
+
+Esimerkkejä:
+
+    python network_cli.py topologia.json --parit parit.csv --tulos tilastot.json
+    python network_cli.py topologia.json --lahetyksia 1000000 --prosesseja 8 --siemen 1
+    python network_cli.py iso.ntopo --lahetyksia 1000000 --siemen 1
+    python network_cli.py topologia.json --matriisi matriisi.json --kesto 10 --linkkeja 20 --jonomalli md1
+
+Parit-CSV:ssä on rivillä lähettäjä, vastaanottaja ja valinnainen lähetysmäärä.
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+
+from network_sim import Verkkosimulaattori
+import topology_binary
+from queueing import JONOMALLIT
+
+
+def lue_parit(polku):
+    """Lukee lähetysparit CSV-tiedostosta; otsikkorivi ohitetaan."""
+    parit = []
+    with open(polku, "r", encoding="utf-8", newline="") as f:
+        for rivinumero, rivi in enumerate(csv.reader(f), start=1):
+            rivi = [kentta.strip() for kentta in rivi]
+            if not rivi or not any(rivi) or rivi[0].startswith("#"):
+                continue
+            if rivinumero == 1 and rivi[0].lower() in ("lahettaja", "lähettäjä", "sender"):
+                continue
+            if len(rivi) < 2:
+                raise ValueError(f"{polku}:{rivinumero}: rivillä on oltava lähettäjä ja vastaanottaja.")
+            maara = 1
+            if len(rivi) > 2 and rivi[2]:
+                try:
+                    maara = int(rivi[2])
+                except ValueError:
+                    raise ValueError(f"{polku}:{rivinumero}: lähetysmäärän tulee olla kokonaisluku.")
+            parit.extend([(rivi[0], rivi[1])] * maara)
+    return parit
+
+
+def luo_parser():
+    parser = argparse.ArgumentParser(description="Aja lähetyskuorma topologiassa ilman käyttöliittymää.")
+    parser.add_argument("topologia", help="topologia JSON-muodossa (GUI:n tallennusmuoto) tai binäärinä (.ntopo)")
+    parser.add_argument("--parit", help="CSV: lahettaja,vastaanottaja[,maara]")
+    parser.add_argument("--lahetyksia", type=int,
+                        help="aja N Monte Carlo -lähetystä (parit arvotaan --parit-listasta tai kaikista laitteista)")
+    parser.add_argument("--prosesseja", type=int, default=1, help="Monte Carlo -työprosessien määrä")
+    parser.add_argument("--siemen", type=int, help="satunnaislukujen siemen")
+    parser.add_argument("--matriisi", help="liikennematriisi (.json tai .csv lahettaja,vastaanottaja,maara)")
+    parser.add_argument("--kesto", type=float,
+                        help="matriisin arvot ovat nopeuksia (pakettia/s) ja ajo kestää näin monta sekuntia")
+    parser.add_argument("--linkkeja", type=int, default=10,
+                        help="matriisiajon tulokseen otettavien kuormitetuimpien linkkien määrä")
+    parser.add_argument("--jonomalli", choices=JONOMALLIT,
+                        help="linkkien jonomalli kaistallisille yhteyksille (oletus: topologian asetus)")
+    parser.add_argument("--viesti", default="", help="lähetettävien viestien sisältö")
+    parser.add_argument("--reititys", choices=Verkkosimulaattori.REITITYSTILAT,
+                        help="reititystila (oletus: topologian asetus tai lyhin)")
+    parser.add_argument("--loki", help="kirjoita pakettiloki tiedostoon (.jsonl tai .csv)")
+    parser.add_argument("--tulos", help="tilastojen JSON-tiedosto (oletus: vakiotuloste)")
+    return parser
+
+
+def main(argv=None):
+    args = luo_parser().parse_args(argv)
+    alku = time.perf_counter()
+    try:
+        parit = lue_parit(args.parit) if args.parit else None
+
+        simu = Verkkosimulaattori(siemen=args.siemen)
+        if topology_binary.on_binaari(args.topologia):
+            simu.tuo_binaari(args.topologia)
+        else:
+            with open(args.topologia, "r", encoding="utf-8") as f:
+                simu.import_topologia_dict(json.load(f))
+        if args.reititys:
+            simu.aseta_reititys(args.reititys)
+        if args.jonomalli:
+            simu.aseta_jonomalli(args.jonomalli)
+        nielu = simu.vie_pakettiloki(args.loki) if args.loki else None
+
+        try:
+            if args.matriisi:
+                from traffic_matrix import Liikennematriisi
+
+                kuormatulos = simu.laheta_liikennematriisi(
+                    Liikennematriisi.lue(args.matriisi), kesto_s=args.kesto, siemen=args.siemen,
+                )
+                tilastot = kuormatulos.hae_tilastot()
+                tilastot["linkit"] = kuormatulos.hae_linkit(args.linkkeja)
+            elif args.lahetyksia is not None:
+                from monte_carlo import aja_monte_carlo
+
+                tulos = aja_monte_carlo(
+                    simu.export_topologia(), args.lahetyksia, siemen=args.siemen,
+                    prosesseja=args.prosesseja, parit=parit,
+                )
+                if nielu is not None:
+                    tulos.kirjaa_lokiin(simu)
+                tilastot = tulos.hae_tilastot()
+            elif parit is not None:
+                simu.laheta_viestit(parit, viesti=args.viesti)
+                tilastot = simu.hae_tilastot()
+            else:
+                raise ValueError("Anna lähetyskuorma: --parit, --lahetyksia tai --matriisi.")
+        finally:
+            if nielu is not None:
+                nielu.sulje()
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"Virhe: {e}", file=sys.stderr)
+        return 2
+
+    tilastot["kesto_s"] = time.perf_counter() - alku
+    teksti = json.dumps(tilastot, ensure_ascii=False, indent=2)
+    if args.tulos:
+        with open(args.tulos, "w", encoding="utf-8") as f:
+            f.write(teksti + "\n")
+    else:
+        print(teksti)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
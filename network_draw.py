@@ -0,0 +1,160 @@
+import networkx as nx
+import numpy as np
+from matplotlib.collections import LineCollection
+
+
+class VerkkoPiirtaja:
+    """Piirtää verkon matplotlib-akseleille ja päivittää vain muuttuneet osat.
+
+    Solmu-, yhteys- ja nimiöartistit luodaan uudelleen vain, kun topologia
+    tai asettelu muuttuu. Reitin korostus ja otsikko ovat erillisiä
+    animoituja artisteja, jotka piirretään tallennetun taustan päälle
+    blittaamalla, joten korostuksen vaihto ei piirrä koko kuvaa uudelleen.
+    Piirtäjä ei riipu Tkinteristä, joten sitä voi käyttää myös Agg-taustalla.
+    """
+
+    SOLMUN_KOKO = 1200
+    REITIN_SOLMUN_KOKO = 1700
+    # Näitä suuremmissa verkoissa nimiöt jätetään piirtämättä
+    MAX_SOLMUNIMIOT = 500
+    MAX_REUNANIMIOT = 500
+
+    def __init__(self, simu, figure, ax):
+        self.simu = simu
+        self.figure = figure
+        self.ax = ax
+        self._versio = None
+        self._pos = {}
+        self._nimiot_naytetaan = True
+        self._tausta = None
+        self._otsikko = None
+        self._reitti_reunat = None
+        self._reitti_solmut = None
+        self._reitti_nimiot = []
+        self._reunanimiot = {}
+        self._reitti_reunanimiot = []
+        self._kuuntelija = None
+
+    def piirra(self, reitti=None, onnistui=None):
+        """Päivittää kuvan sisällön; palauttaa True, jos artistit luotiin uudelleen."""
+        pos = self.simu.hae_sijainnit()
+        versio = (self.simu._topologia_versio, self.simu._asettelu_versio, self.simu._piirto_versio)
+        rakennettu = versio != self._versio
+        if rakennettu:
+            self._rakenna(pos)
+            self._versio = versio
+        self._korosta(reitti)
+
+        otsikko = "Verkon topologia"
+        if reitti:
+            if onnistui:
+                otsikko += " (viimeisin reitti korostettu)"
+            else:
+                otsikko += " (viimeisin reitti epäonnistui)"
+        self._otsikko.set_text(otsikko)
+        return rakennettu
+
+    def nayta(self):
+        """Vie muutokset kankaalle: blittaus, jos tausta on tallessa, muuten draw_idle."""
+        canvas = self.figure.canvas
+        if self._kuuntelija is None:
+            self._kuuntelija = canvas.mpl_connect("draw_event", self._tallenna_tausta)
+        if self._tausta is None or not getattr(canvas, "supports_blit", False):
+            canvas.draw_idle()
+            return
+        canvas.restore_region(self._tausta)
+        self._piirra_korostus()
+        canvas.blit(self.figure.bbox)
+
+    # --- Sisäiset apurit ---
+
+    def _tallenna_tausta(self, event):
+        canvas = self.figure.canvas
+        if getattr(canvas, "supports_blit", False):
+            self._tausta = canvas.copy_from_bbox(self.figure.bbox)
+        self._piirra_korostus()
+
+    def _piirra_korostus(self):
+        if self._otsikko is None:
+            return
+        self.ax.draw_artist(self._reitti_reunat)
+        # Reitin viivenimiöt piirretään uudelleen, jotta korostus ei peitä niitä
+        for teksti in self._reitti_reunanimiot:
+            self.ax.draw_artist(teksti)
+        self.ax.draw_artist(self._reitti_solmut)
+        for teksti in self._reitti_nimiot:
+            self.ax.draw_artist(teksti)
+        self.ax.draw_artist(self._otsikko)
+
+    def _rakenna(self, pos):
+        ax = self.ax
+        ax.clear()
+        self._tausta = None
+        self._pos = pos
+        verkko = self.simu.verkko
+        self._nimiot_naytetaan = len(verkko) <= self.MAX_SOLMUNIMIOT
+        self._reunanimiot = {}
+
+        if len(verkko) > 0:
+            nx.draw_networkx_nodes(
+                verkko,
+                pos,
+                ax=ax,
+                node_color=[c for _, c in verkko.nodes(data="color", default="lightblue")],
+                node_size=self.SOLMUN_KOKO,
+            )
+            if verkko.number_of_edges() > 0:
+                nx.draw_networkx_edges(
+                    verkko, pos, ax=ax, edge_color="gray", width=1.0, arrows=False,
+                    node_size=self.SOLMUN_KOKO,
+                )
+            if self._nimiot_naytetaan:
+                nx.draw_networkx_labels(verkko, pos, ax=ax, font_weight="bold")
+            labels = nx.get_edge_attributes(verkko, "weight")
+            if labels and len(labels) <= self.MAX_REUNANIMIOT:
+                self._reunanimiot = nx.draw_networkx_edge_labels(verkko, pos, edge_labels=labels, ax=ax)
+
+        # Korostus piirretään taustan päälle erikseen
+        self._reitti_reunat = LineCollection([], colors="red", linewidths=3.0, zorder=2, animated=True)
+        ax.add_collection(self._reitti_reunat, autolim=False)
+        self._reitti_solmut = ax.scatter(
+            [], [], s=self.REITIN_SOLMUN_KOKO, zorder=3, animated=True
+        )
+        self._reitti_nimiot = []
+        self._otsikko = ax.set_title("Verkon topologia")
+        self._otsikko.set_animated(True)
+        ax.axis("off")
+        self.figure.tight_layout()
+
+    def _korosta(self, reitti):
+        ax = self.ax
+        verkko = self.simu.verkko
+        pos = self._pos
+        reitti = [n for n in (reitti or []) if n in pos and n in verkko]
+        segmentit = [
+            (pos[a], pos[b]) for a, b in zip(reitti, reitti[1:]) if verkko.has_edge(a, b)
+        ]
+        self._reitti_reunat.set_segments(segmentit)
+        self._reitti_reunanimiot = [
+            self._reunanimiot.get((a, b)) or self._reunanimiot.get((b, a))
+            for a, b in zip(reitti, reitti[1:])
+            if (a, b) in self._reunanimiot or (b, a) in self._reunanimiot
+        ]
+        if reitti:
+            self._reitti_solmut.set_offsets(np.array([pos[n] for n in reitti]))
+            self._reitti_solmut.set_facecolors(
+                [verkko.nodes[n].get("color", "lightblue") for n in reitti]
+            )
+        else:
+            self._reitti_solmut.set_offsets(np.empty((0, 2)))
+
+        for teksti in self._reitti_nimiot:
+            teksti.remove()
+        self._reitti_nimiot = []
+        if self._nimiot_naytetaan:
+            for n in reitti:
+                x, y = pos[n]
+                self._reitti_nimiot.append(
+                    ax.text(x, y, str(n), ha="center", va="center", fontsize=12,
+                            fontweight="bold", zorder=4, animated=True)
+                )
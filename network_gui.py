@@ -0,0 +1,852 @@
+import bisect
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog
+import json
+import queue
+import threading
+import time
+from collections import deque
+
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+from log_view import Pakettilokilahde, Rivivarasto, VirtuaalinenLokinakyma
+from network_draw import VerkkoPiirtaja
+from network_sim import Verkkosimulaattori
+from search_combobox import HakuCombobox, Nimihakemisto
+import topology_binary
+
+
+class VerkkoGUI(tk.Tk):
+    """Tkinter-pohjainen graafinen käyttöliittymä verkkosimulaattorille."""
+
+    JONON_KYSELYVALI_MS = 50
+    # Tapahtumalokin näkymään säilytettävät rivit
+    MAX_LOKIRIVIT = 50_000
+    KAIKKI = "(kaikki)"
+    TULOKSET = {"kaikki": None, "onnistuneet": True, "epäonnistuneet": False}
+
+    def __init__(self):
+        super().__init__()
+        self.title("Verkkosimulaattori - GUI")
+        self.geometry("1200x700")
+        self.minsize(1000, 600)
+
+        self.simu = Verkkosimulaattori()
+        self.viimeisin_reitti = None
+        self.viimeisin_onnistui = None
+        # Taustasäikeiden lähetysten tapahtumat käsitellään pääsäikeessä
+        self._lahetysjono = queue.Queue()
+        self._lahetys_id = 0
+        self._kaynnissa = {}
+        self._pakettiloki_ikkuna = None
+        # Simulaattorin muutostapahtumat; listoihin päivitetään vain muuttuneet rivit.
+        # Rivien lajitteluavaimet listboxien järjestyksessä; rivi löytyy binäärihaulla.
+        self._muutokset = deque()
+        self.simu.lisaa_muutoskuuntelija(lambda *muutos: self._muutokset.append(muutos))
+        self._laiterivit = []
+        self._yhteysrivit = []
+        self.laitehakemisto = Nimihakemisto()
+
+        self._luo_menu()
+        self._luo_rakenne()
+        self._luo_controlit()
+        self._luo_visualisointi()
+
+        self.paivita_verkko_tiedot()
+        self.piirra_verkko()
+        self.log("Tervetuloa Verkkosimulaattoriin! Lisää laitteita ja yhteyksiä vasemmalta.")
+        self.after(self.JONON_KYSELYVALI_MS, self._kasittele_lahetysjono)
+
+    # --- Rakenne ja valikko ---
+
+    def _luo_menu(self):
+        menubar = tk.Menu(self)
+        self.config(menu=menubar)
+
+        tiedosto_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Tiedosto", menu=tiedosto_menu)
+        tiedosto_menu.add_command(label="Tallenna topologia...", command=self.tallenna_topologia_clicked)
+        tiedosto_menu.add_command(label="Lataa topologia...", command=self.lataa_topologia_clicked)
+        tiedosto_menu.add_separator()
+        tiedosto_menu.add_command(label="Sulje", command=self.quit)
+
+        nakyma_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Näkymä", menu=nakyma_menu)
+        nakyma_menu.add_command(label="Asettele verkko uudelleen", command=self.asettele_uudelleen_clicked)
+
+        tyokalut_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Työkalut", menu=tyokalut_menu)
+        self.instrumentointi_paalla = tk.BooleanVar(value=False)
+        tyokalut_menu.add_checkbutton(
+            label="Instrumentointi", variable=self.instrumentointi_paalla, command=self.instrumentointi_clicked
+        )
+        tyokalut_menu.add_command(label="Näytä instrumentointi", command=self.nayta_instrumentointi_clicked)
+
+        reititys_menu = tk.Menu(tyokalut_menu, tearoff=0)
+        tyokalut_menu.add_cascade(label="Reititys", menu=reititys_menu)
+        self.reititystila = tk.StringVar(value=self.simu.reititystila)
+        for tila, otsikko in (
+            ("lyhin", "Lyhin polku"),
+            ("ecmp", "ECMP (tasakustanteiset polut)"),
+            ("k_lyhimmat", "k lyhintä polkua"),
+            ("haviotietoinen", "Häviötietoinen"),
+        ):
+            reititys_menu.add_radiobutton(
+                label=otsikko, value=tila, variable=self.reititystila, command=self.reititys_clicked
+            )
+
+    def _luo_rakenne(self):
+        self.columnconfigure(0, weight=1)
+        self.columnconfigure(1, weight=2)
+        self.rowconfigure(0, weight=1)
+
+        self.control_frame = ttk.Frame(self, padding=5)
+        self.control_frame.grid(row=0, column=0, sticky="nsew")
+
+        self.right_frame = ttk.Frame(self, padding=5)
+        self.right_frame.grid(row=0, column=1, sticky="nsew")
+
+        self.right_frame.rowconfigure(0, weight=1)
+        self.right_frame.rowconfigure(1, weight=2)
+        self.right_frame.columnconfigure(0, weight=1)
+
+    def _luo_controlit(self):
+        self.notebook = ttk.Notebook(self.control_frame)
+        self.notebook.pack(fill="both", expand=True)
+
+        # --- Laitteet-välilehti ---
+        self.tab_laitteet = ttk.Frame(self.notebook, padding=5)
+        self.notebook.add(self.tab_laitteet, text="Laitteet")
+
+        ttk.Label(self.tab_laitteet, text="Laitteen nimi:").grid(row=0, column=0, sticky="w")
+        self.entry_laite_nimi = ttk.Entry(self.tab_laitteet)
+        self.entry_laite_nimi.grid(row=0, column=1, sticky="ew", pady=2)
+
+        ttk.Label(self.tab_laitteet, text="Tyyppi:").grid(row=1, column=0, sticky="w")
+        self.cmb_laite_tyyppi = ttk.Combobox(
+            self.tab_laitteet,
+            values=["reititin", "tietokone"],
+            state="readonly",
+        )
+        self.cmb_laite_tyyppi.set("reititin")
+        self.cmb_laite_tyyppi.grid(row=1, column=1, sticky="ew", pady=2)
+
+        btn_frame = ttk.Frame(self.tab_laitteet)
+        btn_frame.grid(row=2, column=0, columnspan=2, pady=5, sticky="ew")
+        ttk.Button(btn_frame, text="Lisää laite", command=self.lisaa_laite_clicked).pack(side="left", padx=2)
+        ttk.Button(btn_frame, text="Päivitä tyyppi", command=self.paivita_laite_clicked).pack(side="left", padx=2)
+        ttk.Button(btn_frame, text="Poista laite", command=self.poista_laite_clicked).pack(side="left", padx=2)
+
+        ttk.Label(self.tab_laitteet, text="Laitteet:").grid(row=3, column=0, columnspan=2, sticky="w", pady=(10, 0))
+        self.lb_laitteet = tk.Listbox(self.tab_laitteet, height=8)
+        self.lb_laitteet.grid(row=4, column=0, columnspan=2, sticky="nsew")
+        self.lb_laitteet.bind("<<ListboxSelect>>", self.laitelista_valittu)
+
+        scroll_laitteet = ttk.Scrollbar(self.tab_laitteet, orient="vertical", command=self.lb_laitteet.yview)
+        scroll_laitteet.grid(row=4, column=2, sticky="ns")
+        self.lb_laitteet.configure(yscrollcommand=scroll_laitteet.set)
+
+        self.tab_laitteet.columnconfigure(1, weight=1)
+        self.tab_laitteet.rowconfigure(4, weight=1)
+
+        # --- Yhteydet-välilehti ---
+        self.tab_yhteydet = ttk.Frame(self.notebook, padding=5)
+        self.notebook.add(self.tab_yhteydet, text="Yhteydet")
+
+        ttk.Label(self.tab_yhteydet, text="Laite 1:").grid(row=0, column=0, sticky="w")
+        self.cb_y_l1 = HakuCombobox(self.tab_yhteydet, self.laitehakemisto)
+        self.cb_y_l1.grid(row=0, column=1, sticky="ew", pady=2)
+
+        ttk.Label(self.tab_yhteydet, text="Laite 2:").grid(row=1, column=0, sticky="w")
+        self.cb_y_l2 = HakuCombobox(self.tab_yhteydet, self.laitehakemisto)
+        self.cb_y_l2.grid(row=1, column=1, sticky="ew", pady=2)
+
+        ttk.Label(self.tab_yhteydet, text="Viive (ms):").grid(row=2, column=0, sticky="w")
+        self.entry_y_viive = ttk.Entry(self.tab_yhteydet)
+        self.entry_y_viive.grid(row=2, column=1, sticky="ew", pady=2)
+        self.entry_y_viive.insert(0, "10")
+
+        ttk.Label(self.tab_yhteydet, text="Häviö (%):").grid(row=3, column=0, sticky="w")
+        self.entry_y_loss = ttk.Entry(self.tab_yhteydet)
+        self.entry_y_loss.grid(row=3, column=1, sticky="ew", pady=2)
+        self.entry_y_loss.insert(0, "0")
+
+        btn_frame_y = ttk.Frame(self.tab_yhteydet)
+        btn_frame_y.grid(row=4, column=0, columnspan=2, pady=5, sticky="ew")
+        ttk.Button(btn_frame_y, text="Lisää yhteys", command=self.lisaa_yhteys_clicked).pack(side="left", padx=2)
+        ttk.Button(btn_frame_y, text="Muuta viivettä/häviötä", command=self.muuta_yhteys_clicked).pack(side="left", padx=2)
+        ttk.Button(btn_frame_y, text="Poista yhteys", command=self.poista_yhteys_clicked).pack(side="left", padx=2)
+
+        ttk.Label(self.tab_yhteydet, text="Yhteydet:").grid(row=5, column=0, columnspan=2, sticky="w", pady=(10, 0))
+        self.lb_yhteydet = tk.Listbox(self.tab_yhteydet, height=8)
+        self.lb_yhteydet.grid(row=6, column=0, columnspan=2, sticky="nsew")
+        self.lb_yhteydet.bind("<<ListboxSelect>>", self.yhteyslista_valittu)
+
+        scroll_yhteydet = ttk.Scrollbar(self.tab_yhteydet, orient="vertical", command=self.lb_yhteydet.yview)
+        scroll_yhteydet.grid(row=6, column=2, sticky="ns")
+        self.lb_yhteydet.configure(yscrollcommand=scroll_yhteydet.set)
+
+        self.tab_yhteydet.columnconfigure(1, weight=1)
+        self.tab_yhteydet.rowconfigure(6, weight=1)
+
+        # --- Simulaatio-välilehti ---
+        self.tab_simulaatio = ttk.Frame(self.notebook, padding=5)
+        self.notebook.add(self.tab_simulaatio, text="Simulaatio")
+
+        ttk.Label(self.tab_simulaatio, text="Lähettävä laite:").grid(row=0, column=0, sticky="w")
+        self.cb_s_lahettaja = HakuCombobox(self.tab_simulaatio, self.laitehakemisto)
+        self.cb_s_lahettaja.grid(row=0, column=1, sticky="ew", pady=2)
+
+        ttk.Label(self.tab_simulaatio, text="Vastaanottava laite:").grid(row=1, column=0, sticky="w")
+        self.cb_s_vastaanottaja = HakuCombobox(self.tab_simulaatio, self.laitehakemisto)
+        self.cb_s_vastaanottaja.grid(row=1, column=1, sticky="ew", pady=2)
+
+        ttk.Label(self.tab_simulaatio, text="Viesti:").grid(row=2, column=0, sticky="w")
+        self.entry_s_viesti = ttk.Entry(self.tab_simulaatio)
+        self.entry_s_viesti.grid(row=2, column=1, sticky="ew", pady=2)
+
+        btn_frame_s = ttk.Frame(self.tab_simulaatio)
+        btn_frame_s.grid(row=3, column=0, columnspan=2, pady=5, sticky="ew")
+        ttk.Button(btn_frame_s, text="Lähetä viesti", command=self.laheta_viesti_clicked).pack(side="left", padx=2)
+        ttk.Button(btn_frame_s, text="Näytä pakettiloki", command=self.nayta_pakettiloki_clicked).pack(
+            side="left", padx=2
+        )
+        ttk.Button(btn_frame_s, text="Näytä tilastot", command=self.nayta_tilastot_clicked).pack(
+            side="left", padx=2
+        )
+
+        suodatin = ttk.LabelFrame(self.tab_simulaatio, text="Pakettilokin suodatus", padding=5)
+        suodatin.grid(row=4, column=0, columnspan=2, sticky="ew", pady=5)
+        ttk.Label(suodatin, text="Lähettäjä:").grid(row=0, column=0, sticky="w")
+        self.cb_loki_lahettaja = HakuCombobox(suodatin, self.laitehakemisto, kiinteat=[self.KAIKKI])
+        self.cb_loki_lahettaja.set(self.KAIKKI)
+        self.cb_loki_lahettaja.grid(row=0, column=1, sticky="ew", pady=2)
+        ttk.Label(suodatin, text="Tulos:").grid(row=1, column=0, sticky="w")
+        self.cb_loki_tulos = ttk.Combobox(suodatin, state="readonly", values=list(self.TULOKSET))
+        self.cb_loki_tulos.set("kaikki")
+        self.cb_loki_tulos.grid(row=1, column=1, sticky="ew", pady=2)
+        ttk.Label(suodatin, text="Viimeiset (min):").grid(row=2, column=0, sticky="w")
+        self.entry_loki_minuutit = ttk.Entry(suodatin)
+        self.entry_loki_minuutit.grid(row=2, column=1, sticky="ew", pady=2)
+        suodatin.columnconfigure(1, weight=1)
+
+        self.tab_simulaatio.columnconfigure(1, weight=1)
+
+        # --- Asetukset-välilehti ---
+        self.tab_asetukset = ttk.Frame(self.notebook, padding=5)
+        self.notebook.add(self.tab_asetukset, text="Asetukset")
+
+        ttk.Label(self.tab_asetukset, text="Jitter min:").grid(row=0, column=0, sticky="w")
+        self.entry_jitter_min = ttk.Entry(self.tab_asetukset)
+        self.entry_jitter_min.grid(row=0, column=1, sticky="ew", pady=2)
+
+        ttk.Label(self.tab_asetukset, text="Jitter max:").grid(row=1, column=0, sticky="w")
+        self.entry_jitter_max = ttk.Entry(self.tab_asetukset)
+        self.entry_jitter_max.grid(row=1, column=1, sticky="ew", pady=2)
+
+        ttk.Label(self.tab_asetukset, text="Nukkumisaika (s/linkki):").grid(row=2, column=0, sticky="w")
+        self.entry_nukkumisaika = ttk.Entry(self.tab_asetukset)
+        self.entry_nukkumisaika.grid(row=2, column=1, sticky="ew", pady=2)
+
+        btn_frame_a = ttk.Frame(self.tab_asetukset)
+        btn_frame_a.grid(row=3, column=0, columnspan=2, pady=5, sticky="ew")
+        ttk.Button(btn_frame_a, text="Tallenna asetukset", command=self.tallenna_asetukset_clicked).pack(
+            side="left", padx=2
+        )
+        ttk.Button(btn_frame_a, text="Luo esimerkkiverkko", command=self.luo_esimerkkiverkko_clicked).pack(
+            side="left", padx=2
+        )
+
+        # Aseta oletusarvot kenttiin
+        self.entry_jitter_min.insert(0, str(self.simu.jitter_min))
+        self.entry_jitter_max.insert(0, str(self.simu.jitter_max))
+        self.entry_nukkumisaika.insert(0, str(self.simu.nukkumisaika))
+
+        self.tab_asetukset.columnconfigure(1, weight=1)
+
+    def _luo_visualisointi(self):
+        # Lokiruutu
+        log_frame = ttk.LabelFrame(self.right_frame, text="Tapahtumaloki")
+        log_frame.grid(row=0, column=0, sticky="nsew", pady=(0, 5))
+        log_frame.columnconfigure(0, weight=1)
+        log_frame.rowconfigure(0, weight=1)
+
+        # Näkymä piirtää vain näkyvät rivit; rivit säilytetään rajattuna varastona
+        self.lokirivit = Rivivarasto(self.MAX_LOKIRIVIT)
+        self.loki_nakyma = VirtuaalinenLokinakyma(log_frame, self.lokirivit, korkeus=10)
+        self.loki_nakyma.grid(row=0, column=0, columnspan=2, sticky="nsew")
+
+        btn_frame_log = ttk.Frame(log_frame)
+        btn_frame_log.grid(row=1, column=0, columnspan=2, sticky="e", pady=(2, 0))
+        ttk.Button(btn_frame_log, text="Tyhjennä näkymä", command=self.tyhjenna_loki_nakyma).pack(
+            side="left", padx=2
+        )
+        ttk.Button(btn_frame_log, text="Tyhjennä pakettiloki", command=self.tyhjenna_pakettiloki).pack(
+            side="left", padx=2
+        )
+
+        # Verkon visualisointi
+        graph_frame = ttk.LabelFrame(self.right_frame, text="Verkon topologia")
+        graph_frame.grid(row=1, column=0, sticky="nsew")
+        graph_frame.columnconfigure(0, weight=1)
+        graph_frame.rowconfigure(0, weight=1)
+
+        self.figure = plt.Figure(figsize=(6, 5), dpi=100)
+        self.ax = self.figure.add_subplot(111)
+        self.canvas = FigureCanvasTkAgg(self.figure, master=graph_frame)
+        self.canvas_widget = self.canvas.get_tk_widget()
+        self.canvas_widget.grid(row=0, column=0, sticky="nsew")
+        self.piirtaja = VerkkoPiirtaja(self.simu, self.figure, self.ax)
+        self._piirto_odottaa = False
+
+    # --- Apufunktiot GUI:lle ---
+
+    def log(self, msg: str):
+        for rivi in msg.split("\n"):
+            self.lokirivit.lisaa(rivi)
+        self.loki_nakyma.paivita()
+        print(msg)
+
+    def tyhjenna_loki_nakyma(self):
+        self.lokirivit.tyhjenna()
+        self.loki_nakyma.paivita()
+
+    def tyhjenna_pakettiloki(self):
+        self.simu.pakettiloki.clear()
+        self.log("Pakettiloki tyhjennetty.")
+
+    @staticmethod
+    def _laiterivi(nimi, data):
+        return f"{nimi} ({data.get('tyyppi', '?')})"
+
+    @staticmethod
+    def _yhteysrivi(laite1, laite2, data):
+        viive = data.get("weight", 0.0)
+        loss = data.get("loss", 0.0) * 100.0
+        return f"{laite1} <--> {laite2} (viive: {viive:.1f} ms, häviö: {loss:.1f} %)"
+
+    def paivita_verkko_tiedot(self):
+        """Rakentaa laite- ja yhteyslistat kokonaan uudelleen (esim. topologian latauksen jälkeen)."""
+        # Jonossa olevat muutokset sisältyvät jo haettavaan tilaan; myöhemmin
+        # saapuvien käsittely on idempotenttia.
+        self._muutokset.clear()
+        laitteet = self.simu.hae_laitteet()
+        yhteydet = self.simu.hae_yhteydet()
+
+        laitteet.sort(key=lambda laite: self._laiteavain(laite[0]))
+        yhteydet.sort(key=lambda yhteys: self._yhteysavain(*yhteys[:2]))
+
+        self._laiterivit = [self._laiteavain(nimi) for nimi, _ in laitteet]
+        self.laitehakemisto.aseta(nimi for nimi, _ in laitteet)
+        self.lb_laitteet.delete(0, tk.END)
+        if laitteet:
+            self.lb_laitteet.insert(tk.END, *(self._laiterivi(nimi, data) for nimi, data in laitteet))
+
+        self._yhteysrivit = [self._yhteysavain(laite1, laite2) for laite1, laite2, _ in yhteydet]
+        self.lb_yhteydet.delete(0, tk.END)
+        if yhteydet:
+            self.lb_yhteydet.insert(tk.END, *(self._yhteysrivi(*yhteys) for yhteys in yhteydet))
+
+    def _kasittele_muutokset(self):
+        """Päivittää listoihin vain simulaattorin ilmoittamat muutokset."""
+        while self._muutokset:
+            tapahtuma, kohde, data = self._muutokset.popleft()
+            if tapahtuma == "topologia_vaihtui":
+                self.paivita_verkko_tiedot()
+            elif tapahtuma in ("laite_lisatty", "laite_muuttui"):
+                self.laitehakemisto.lisaa(kohde)
+                self._aseta_rivi(
+                    self.lb_laitteet, self._laiterivit, self._laiteavain(kohde), self._laiterivi(kohde, data)
+                )
+            elif tapahtuma == "laite_poistettu":
+                self.laitehakemisto.poista(kohde)
+                self._poista_rivi(self.lb_laitteet, self._laiterivit, self._laiteavain(kohde))
+            elif tapahtuma in ("yhteys_lisatty", "yhteys_muuttui"):
+                self._aseta_rivi(
+                    self.lb_yhteydet, self._yhteysrivit, self._yhteysavain(*kohde), self._yhteysrivi(*kohde, data)
+                )
+            elif tapahtuma == "yhteys_poistettu":
+                self._poista_rivi(self.lb_yhteydet, self._yhteysrivit, self._yhteysavain(*kohde))
+
+    @staticmethod
+    def _laiteavain(nimi):
+        return (nimi.casefold(), nimi)
+
+    @staticmethod
+    def _yhteysavain(laite1, laite2):
+        return (laite1, laite2) if laite1 <= laite2 else (laite2, laite1)
+
+    @staticmethod
+    def _aseta_rivi(listbox, avaimet, avain, teksti):
+        """Päivittää avaimen rivin tai lisää sen järjestyksen mukaiselle paikalle."""
+        i = bisect.bisect_left(avaimet, avain)
+        if i == len(avaimet) or avaimet[i] != avain:
+            avaimet.insert(i, avain)
+            listbox.insert(i, teksti)
+            return
+        valittu = listbox.selection_includes(i)
+        listbox.delete(i)
+        listbox.insert(i, teksti)
+        if valittu:
+            listbox.selection_set(i)
+
+    @staticmethod
+    def _poista_rivi(listbox, avaimet, avain):
+        i = bisect.bisect_left(avaimet, avain)
+        if i == len(avaimet) or avaimet[i] != avain:
+            return
+        del avaimet[i]
+        listbox.delete(i)
+
+    def piirra_verkko(self):
+        # Useat peräkkäiset pyynnöt yhdistetään yhdeksi piirroksi
+        if not self._piirto_odottaa:
+            self._piirto_odottaa = True
+            self.after_idle(self._piirra_nyt)
+
+    def _piirra_nyt(self):
+        self._piirto_odottaa = False
+        mittari = self.simu.instrumentointi
+        if mittari is None:
+            self.piirtaja.piirra(self.viimeisin_reitti, self.viimeisin_onnistui)
+            self.piirtaja.nayta()
+            return
+        with mittari.vaihe("piirto"):
+            self.piirtaja.piirra(self.viimeisin_reitti, self.viimeisin_onnistui)
+            self.piirtaja.nayta()
+
+    # --- Tapahtumankäsittelijät ---
+
+    def laitelista_valittu(self, event):
+        sel = self.lb_laitteet.curselection()
+        if not sel:
+            return
+        teksti = self.lb_laitteet.get(sel[0])
+        if " (" in teksti:
+            nimi = teksti.split(" (", 1)[0]
+        else:
+            nimi = teksti
+        self.entry_laite_nimi.delete(0, tk.END)
+        self.entry_laite_nimi.insert(0, nimi)
+
+        data = self.simu.verkko.nodes.get(nimi, {})
+        tyyppi = data.get("tyyppi", "reititin")
+        if tyyppi in ["reititin", "tietokone"]:
+            self.cmb_laite_tyyppi.set(tyyppi)
+
+    def yhteyslista_valittu(self, event):
+        sel = self.lb_yhteydet.curselection()
+        if not sel:
+            return
+        line = self.lb_yhteydet.get(sel[0])
+        # odotettu muoto:
+        # "A <--> B (viive: X ms, häviö: Y %)"
+        try:
+            osat = line.split(" <--> ")
+            l1 = osat[0].strip()
+            loppu = osat[1]
+            l2 = loppu.split(" (", 1)[0].strip()
+        except Exception:
+            return
+        self.cb_y_l1.set(l1)
+        self.cb_y_l2.set(l2)
+
+        try:
+            if "viive:" in line:
+                viive_str = line.split("viive:")[1].split("ms")[0].strip()
+                self.entry_y_viive.delete(0, tk.END)
+                self.entry_y_viive.insert(0, viive_str)
+        except Exception:
+            pass
+
+        try:
+            if "häviö:" in line:
+                loss_str = line.split("häviö:")[1].split("%")[0].strip()
+                self.entry_y_loss.delete(0, tk.END)
+                self.entry_y_loss.insert(0, loss_str)
+        except Exception:
+            pass
+
+    def lisaa_laite_clicked(self):
+        nimi = self.entry_laite_nimi.get().strip()
+        tyyppi = self.cmb_laite_tyyppi.get().strip() or "reititin"
+        try:
+            self.simu.lisaa_laite(nimi, tyyppi)
+        except ValueError as e:
+            messagebox.showerror("Virhe", str(e), parent=self)
+            return
+        self.log(f"Laite lisätty: {nimi} ({tyyppi})")
+        self._kasittele_muutokset()
+        self.piirra_verkko()
+
+    def paivita_laite_clicked(self):
+        nimi = self.entry_laite_nimi.get().strip()
+        tyyppi = self.cmb_laite_tyyppi.get().strip() or "reititin"
+        try:
+            self.simu.muokkaa_laitetta(nimi, tyyppi)
+        except ValueError as e:
+            messagebox.showerror("Virhe", str(e), parent=self)
+            return
+        self.log(f"Laitteen '{nimi}' tyyppi päivitetty: {tyyppi}")
+        self._kasittele_muutokset()
+        self.piirra_verkko()
+
+    def poista_laite_clicked(self):
+        nimi = self.entry_laite_nimi.get().strip()
+        if not nimi:
+            sel = self.lb_laitteet.curselection()
+            if sel:
+                teksti = self.lb_laitteet.get(sel[0])
+                if " (" in teksti:
+                    nimi = teksti.split(" (", 1)[0]
+        if not nimi:
+            messagebox.showerror("Virhe", "Valitse tai kirjoita poistettava laite.", parent=self)
+            return
+        try:
+            self.simu.poista_laite(nimi)
+        except ValueError as e:
+            messagebox.showerror("Virhe", str(e), parent=self)
+            return
+        self.log(f"Laite poistettu: {nimi}")
+        self.entry_laite_nimi.delete(0, tk.END)
+        self._kasittele_muutokset()
+        self.piirra_verkko()
+
+    def lisaa_yhteys_clicked(self):
+        l1 = self.cb_y_l1.get().strip()
+        l2 = self.cb_y_l2.get().strip()
+        viive_str = self.entry_y_viive.get().strip() or "10"
+        loss_str = self.entry_y_loss.get().strip() or "0"
+        try:
+            viive = float(viive_str)
+        except ValueError:
+            messagebox.showerror("Virhe", "Viiveen tulee olla numero.", parent=self)
+            return
+        try:
+            loss_percent = float(loss_str)
+        except ValueError:
+            messagebox.showerror("Virhe", "Häviön tulee olla numero.", parent=self)
+            return
+        loss_prob = max(0.0, min(1.0, loss_percent / 100.0))
+        try:
+            self.simu.lisaa_yhteys(l1, l2, viive_ms=viive, loss=loss_prob)
+        except ValueError as e:
+            messagebox.showerror("Virhe", str(e), parent=self)
+            return
+        self.log(f"Yhteys lisätty: {l1} <--> {l2} (viive {viive:.1f} ms, häviö {loss_prob*100:.1f} %)")
+        self._kasittele_muutokset()
+        self.piirra_verkko()
+
+    def muuta_yhteys_clicked(self):
+        l1 = self.cb_y_l1.get().strip()
+        l2 = self.cb_y_l2.get().strip()
+        viive_str = self.entry_y_viive.get().strip()
+        loss_str = self.entry_y_loss.get().strip()
+        if not viive_str:
+            messagebox.showerror("Virhe", "Anna uusi viive.", parent=self)
+            return
+        try:
+            viive = float(viive_str)
+        except ValueError:
+            messagebox.showerror("Virhe", "Viiveen tulee olla numero.", parent=self)
+            return
+        try:
+            loss_percent = float(loss_str)
+        except ValueError:
+            messagebox.showerror("Virhe", "Häviön tulee olla numero.", parent=self)
+            return
+        loss_prob = max(0.0, min(1.0, loss_percent / 100.0))
+        try:
+            self.simu.muuta_yhteyden_viivetta(l1, l2, viive)
+            self.simu.muuta_yhteyden_havio(l1, l2, loss_prob)
+        except ValueError as e:
+            messagebox.showerror("Virhe", str(e), parent=self)
+            return
+        self.log(f"Yhteyden {l1} <--> {l2} viive/häviö päivitetty: {viive:.1f} ms, häviö {loss_prob*100:.1f} %")
+        self._kasittele_muutokset()
+        self.piirra_verkko()
+
+    def poista_yhteys_clicked(self):
+        l1 = self.cb_y_l1.get().strip()
+        l2 = self.cb_y_l2.get().strip()
+        try:
+            self.simu.poista_yhteys(l1, l2)
+        except ValueError as e:
+            messagebox.showerror("Virhe", str(e), parent=self)
+            return
+        self.log(f"Yhteys poistettu: {l1} <--> {l2}")
+        self._kasittele_muutokset()
+        self.piirra_verkko()
+
+    def laheta_viesti_clicked(self):
+        lahettaja = self.cb_s_lahettaja.get().strip()
+        vastaanottaja = self.cb_s_vastaanottaja.get().strip()
+        viesti = self.entry_s_viesti.get().strip() or "(tyhjä viesti)"
+
+        # Lähetys ajetaan taustasäikeessä, jotta nukkumisaika ei jäädytä ikkunaa
+        self._lahetys_id += 1
+        lahetys_id = self._lahetys_id
+        self._kaynnissa[lahetys_id] = [lahettaja]
+        threading.Thread(
+            target=self._laheta_taustalla,
+            args=(lahetys_id, lahettaja, vastaanottaja, viesti),
+            daemon=True,
+        ).start()
+
+    def _laheta_taustalla(self, lahetys_id, lahettaja, vastaanottaja, viesti):
+        # Ei Tk-kutsuja tässä säikeessä: kaikki viedään jonon kautta pääsäikeelle
+        def hop_kuuntelija(hop):
+            self._lahetysjono.put(("hop", lahetys_id, hop))
+
+        try:
+            tulos = self.simu.laheta_viesti(lahettaja, vastaanottaja, viesti, hop_kuuntelija)
+        except (ValueError, RuntimeError) as e:
+            self._lahetysjono.put(("virhe", lahetys_id, str(e)))
+            return
+        except Exception as e:
+            # Odottamatonkin virhe raportoidaan, muuten lähetys jäisi käynnissä olevaksi
+            self._lahetysjono.put(("virhe", lahetys_id, f"{type(e).__name__}: {e}"))
+            return
+        self._lahetysjono.put(("valmis", lahetys_id, (lahettaja, vastaanottaja, viesti, tulos)))
+
+    def _kasittele_lahetysjono(self):
+        piirretaan = False
+        while True:
+            try:
+                laji, lahetys_id, data = self._lahetysjono.get_nowait()
+            except queue.Empty:
+                break
+            if laji == "hop":
+                # Animointi: paketin tähänastinen reitti korostetaan hyppy kerrallaan
+                reitti = self._kaynnissa.get(lahetys_id)
+                if reitti is None:
+                    continue
+                if not data["lost"]:
+                    reitti.append(data["kohde"])
+                self.viimeisin_reitti = list(reitti)
+                self.viimeisin_onnistui = not data["lost"]
+                piirretaan = True
+            elif laji == "valmis":
+                self._kaynnissa.pop(lahetys_id, None)
+                tulos = data[3]
+                self.viimeisin_reitti = tulos["reitti_toteutunut"]
+                self.viimeisin_onnistui = tulos["onnistui"]
+                piirretaan = True
+                self._kirjaa_lahetys(*data)
+            else:
+                self._kaynnissa.pop(lahetys_id, None)
+                messagebox.showerror("Virhe", data, parent=self)
+        if piirretaan:
+            self.piirra_verkko()
+        self._kasittele_muutokset()
+        self.after(self.JONON_KYSELYVALI_MS, self._kasittele_lahetysjono)
+
+    def _kirjaa_lahetys(self, lahettaja, vastaanottaja, viesti, tulos):
+        self.log(f"--- Lähetys {lahettaja} -> {vastaanottaja} ---")
+        self.log("Suunniteltu reitti: " + " -> ".join(tulos["reitti_suunniteltu"]))
+        self.log("Toteutunut reitti: " + " -> ".join(tulos["reitti_toteutunut"]))
+        for hop in tulos["hopit"]:
+            rivi = (
+                f"  {hop['lahto']} -> {hop['kohde']} | nimellinen {hop['nimellinen_viive_ms']} ms, "
+                f"todellinen {hop['todellinen_viive_ms']:.1f} ms (jitter {hop['jitter_kerroin']:.2f}x)"
+            )
+            if hop.get("loss_prob", 0.0) > 0.0:
+                rivi += f" | häviö {hop['loss_prob']*100:.1f} %"
+            if hop.get("lost"):
+                rivi += "  <-- PAKETTI HÄVISI TÄHÄN"
+            self.log(rivi)
+        if tulos["onnistui"]:
+            self.log(f"Kokonaisviive: {tulos['kokonaisviive_ms']:.1f} ms")
+            self.log("Paketti saapui perille.")
+        else:
+            self.log(f"Paketti EI saapunut perille: {tulos['syy']}")
+            self.log(f"Kokonaisviive ennen häviötä: {tulos['kokonaisviive_ms']:.1f} ms")
+        self.log(f"Viestin sisältö: {viesti}")
+        self.log("")
+
+    def nayta_pakettiloki_clicked(self):
+        lahettaja = self.cb_loki_lahettaja.get()
+        minuutit = self.entry_loki_minuutit.get().strip()
+        try:
+            alkaen = time.time() - float(minuutit) * 60.0 if minuutit else None
+        except ValueError:
+            messagebox.showerror("Virhe", "Aikaikkunan tulee olla minuutteja numerona.", parent=self)
+            return
+        ehdot = {
+            "lahettaja": None if lahettaja in ("", self.KAIKKI) else lahettaja,
+            "onnistui": self.TULOKSET.get(self.cb_loki_tulos.get()),
+            "alkaen": alkaen,
+        }
+        if all(arvo is None for arvo in ehdot.values()):
+            # Koko loki: näkymä seuraa uusia merkintöjä
+            seqt = None
+            otsikko = "kaikki merkinnät"
+        else:
+            seqt = self.simu.kysy_paketit(**ehdot)
+            otsikko = ", ".join(f"{avain}={arvo}" for avain, arvo in ehdot.items() if arvo is not None)
+        lahde = Pakettilokilahde(self.simu.pakettiloki, self._pakettirivi, seqt)
+        if not len(lahde):
+            self.log("Pakettilokissa ei ole ehtoja vastaavia merkintöjä.")
+            return
+        self.log(f"Pakettiloki ({otsikko}): {len(lahde)} merkintää.")
+
+        if self._pakettiloki_ikkuna is not None and self._pakettiloki_ikkuna.winfo_exists():
+            self._pakettiloki_nakyma.aseta_lahde(lahde)
+            self._pakettiloki_ikkuna.lift()
+        else:
+            self._pakettiloki_ikkuna = tk.Toplevel(self)
+            self._pakettiloki_ikkuna.geometry("900x400")
+            self._pakettiloki_nakyma = VirtuaalinenLokinakyma(
+                self._pakettiloki_ikkuna, lahde, korkeus=20, seuraa_lahdetta=True,
+            )
+            self._pakettiloki_nakyma.pack(fill="both", expand=True)
+        self._pakettiloki_ikkuna.title(f"Pakettiloki – {otsikko}")
+
+    @staticmethod
+    def _pakettirivi(merkinta):
+        status = "OK" if merkinta.get("onnistui", True) else "EPÄONNISTUI"
+        return (
+            f"[{merkinta['aika']}] {merkinta['lahettaja']} -> {merkinta['vastaanottaja']} | "
+            f"{status} | viive {merkinta['kokonaisviive_ms']:.1f} ms | "
+            f"reitti: {' -> '.join(merkinta['reitti_toteutunut'])}"
+        )
+
+    def nayta_tilastot_clicked(self):
+        til = self.simu.hae_tilastot()
+        if til["maara"] == 0:
+            self.log("Ei vielä lähetettyjä paketteja, ei tilastoja.")
+            return
+        self.log("--- Tilastot ---")
+        self.log(f"Lähetettyjä paketteja: {til['maara']}")
+        self.log(f"Onnistuneet: {til['onnistuneet']}")
+        self.log(f"Epäonnistuneet: {til['epaonnistuneet']}")
+        self.log(f"Keskimääräinen viive: {til['keskiviive']:.1f} ms")
+        self.log(f"Pienin viive: {til['min_viive']:.1f} ms")
+        self.log(f"Suurin viive: {til['max_viive']:.1f} ms")
+        self.log(
+            f"Viiveen prosenttipisteet: p50 {til['p50_viive']:.1f} ms, p90 {til['p90_viive']:.1f} ms, "
+            f"p99 {til['p99_viive']:.1f} ms, p99.9 {til['p999_viive']:.1f} ms"
+        )
+        self.log("--- Tilastot loppu ---")
+        self.log("")
+
+    def instrumentointi_clicked(self):
+        if self.instrumentointi_paalla.get():
+            self.simu.ota_instrumentointi_kayttoon()
+            self.log("Instrumentointi käytössä.")
+        else:
+            self.simu.poista_instrumentointi()
+            self.log("Instrumentointi poistettu käytöstä.")
+
+    def reititys_clicked(self):
+        self.simu.aseta_reititys(self.reititystila.get())
+        self.log(f"Reititystila: {self.simu.reititystila}")
+
+    def nayta_instrumentointi_clicked(self):
+        yhteenveto = self.simu.hae_instrumentointi()
+        if yhteenveto is None:
+            self.log("Instrumentointi ei ole käytössä (Työkalut → Instrumentointi).")
+            return
+        self.log(f"--- Instrumentointi ({yhteenveto['kesto_s']:.1f} s) ---")
+        for nimi, v in yhteenveto["vaiheet"].items():
+            if v["kutsuja"]:
+                self.log(
+                    f"{nimi}: {v['kutsuja']} kertaa, yhteensä {v['yhteensa_ms']:.1f} ms, "
+                    f"keskim. {v['keskiarvo_us']:.1f} us, suurin {v['max_us']:.1f} us"
+                )
+        for nimi, maara in sorted(yhteenveto["laskurit"].items()):
+            self.log(f"{nimi}: {maara}")
+        self.log("--- Instrumentointi loppu ---")
+        self.log("")
+
+    def tallenna_asetukset_clicked(self):
+        jitter_min = self.entry_jitter_min.get().strip()
+        jitter_max = self.entry_jitter_max.get().strip()
+        nukkumisaika = self.entry_nukkumisaika.get().strip()
+        try:
+            self.simu.aseta_jitter(jitter_min, jitter_max)
+            self.simu.aseta_nukkumisaika(nukkumisaika)
+        except ValueError as e:
+            messagebox.showerror("Virhe", str(e), parent=self)
+            return
+        self.log(
+            f"Asetukset päivitetty: jitter {self.simu.jitter_min:.2f} - {self.simu.jitter_max:.2f}, "
+            f"nukkumisaika {self.simu.nukkumisaika:.2f} s/linkki"
+        )
+
+    def luo_esimerkkiverkko_clicked(self):
+        self.simu.luo_esimerkkiverkko()
+        self._kasittele_muutokset()
+        self.piirra_verkko()
+        self.log("Esimerkkiverkko lisätty (Helsinki -> Berlin).")
+
+    def asettele_uudelleen_clicked(self):
+        self.simu.asettele_uudelleen()
+        self.piirra_verkko()
+        self.log("Verkon asettelu laskettu uudelleen.")
+
+    def tallenna_topologia_clicked(self):
+        path = filedialog.asksaveasfilename(
+            parent=self,
+            title="Tallenna topologia",
+            defaultextension=".json",
+            filetypes=[
+                ("JSON-tiedostot", "*.json"),
+                ("Binääritopologiat", "*" + topology_binary.PAATE),
+                ("Kaikki tiedostot", "*.*"),
+            ],
+        )
+        if not path:
+            return
+        try:
+            if path.endswith(topology_binary.PAATE):
+                self.simu.vie_binaari(path)
+            else:
+                topo = self.simu.export_topologia()
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(topo, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            messagebox.showerror("Virhe", f"Tallennus epäonnistui: {e}", parent=self)
+            return
+        self.log(f"Topologia tallennettu: {path}")
+
+    def lataa_topologia_clicked(self):
+        path = filedialog.askopenfilename(
+            parent=self,
+            title="Lataa topologia",
+            filetypes=[
+                ("JSON-tiedostot", "*.json"),
+                ("Binääritopologiat", "*" + topology_binary.PAATE),
+                ("Kaikki tiedostot", "*.*"),
+            ],
+        )
+        if not path:
+            return
+        try:
+            if topology_binary.on_binaari(path):
+                self.simu.tuo_binaari(path)
+            else:
+                with open(path, "r", encoding="utf-8") as f:
+                    topo = json.load(f)
+                self.simu.import_topologia_dict(topo)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Virhe", f"Lataus epäonnistui: {e}", parent=self)
+            return
+        self.entry_jitter_min.delete(0, tk.END)
+        self.entry_jitter_min.insert(0, str(self.simu.jitter_min))
+        self.entry_jitter_max.delete(0, tk.END)
+        self.entry_jitter_max.insert(0, str(self.simu.jitter_max))
+        self.entry_nukkumisaika.delete(0, tk.END)
+        self.entry_nukkumisaika.insert(0, str(self.simu.nukkumisaika))
+        self.reititystila.set(self.simu.reititystila)
+        self.viimeisin_reitti = None
+        self.viimeisin_onnistui = None
+        self._kasittele_muutokset()
+        self.piirra_verkko()
+        self.log(f"Topologia ladattu: {path}")
+
+
+if __name__ == "__main__":
+    app = VerkkoGUI()
+    app.mainloop()
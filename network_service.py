@@ -0,0 +1,573 @@
+"""Paikallinen simulointipalvelu (asyncio).
+
+Palvelu pitää muistissa nimettyjä Verkkosimulaattori-instansseja, jotta
+muut työkalut voivat käyttää samaa topologiaa rakentamatta sitä joka
+prosessissa uudelleen. Yhteys on JSON-rivejä TCP:n (vain localhost) tai
+Unix-socketin yli: jokainen pyyntö on yksi JSON-olio rivillä, ja vastaus
+palaa samalla "id":llä (ei välttämättä pyyntöjen järjestyksessä).
+
+    python network_service.py --portti 8765
+    python network_service.py --socket /tmp/verkko.sock --esilataa a=topologia.ntopo
+
+    {"id": 1, "op": "luo", "simu": "a", "malli": "waxman", "parametrit": {"n": 200}, "siemen": 1}
+    {"id": 2, "op": "laheta", "simu": "a", "parit": [["W0", "W5"], ["W1", "W7", 100]]}
+    {"id": 3, "op": "muokkaa", "simu": "a", "toiminto": "yhteys_alas", "argumentit": ["W0", "W3"]}
+    {"id": 4, "op": "kysy", "simu": "a", "kysely": "hae_tilastot"}
+
+    -> {"id": 2, "ok": true, "tulos": {"onnistui": [...], "kokonaisviive_ms": [...], "havio_hop": [...]}}
+    -> {"id": 9, "ok": false, "virhe": "...", "ylikuormitettu": true}
+
+Saman simulaattorin pyynnöt suoritetaan saapumisjärjestyksessä yhdessä
+taustasäikeessä. Sillä välin jonoon kertyneet lähetyspyynnöt yhdistetään
+yhdeksi laheta_viestit-eräksi, joten läpäisy kasvaa asiakkaiden määrän
+mukana. Kuormaa rajoitetaan yhteyskohtaisella keskeneräisten pyyntöjen
+määrällä (lukeminen pysähtyy), simulaattorikohtaisella jonolla (täysi jono
+hylkää pyynnön "ylikuormitettu"-vastauksella) sekä rivin pituudella ja
+pyynnön pakettimäärällä.
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import itertools
+import json
+import socket
+import sys
+
+import numpy as np
+
+import topology_binary
+from network_sim import Verkkosimulaattori
+
+
+# Topologiaa muokkaavat ja sitä lukevat metodit, joita pyynnöillä saa kutsua
+MUOKKAUKSET = frozenset((
+    "lisaa_laite", "muokkaa_laitetta", "poista_laite",
+    "lisaa_yhteys", "poista_yhteys", "muuta_yhteyden_viivetta", "muuta_yhteyden_havio",
+    "muuta_yhteyden_kapasiteettia", "yhteys_alas", "yhteys_ylos", "laite_alas", "laite_ylos",
+    "aseta_jitter", "aseta_siemen", "aseta_reititys", "aseta_jonomalli",
+    "paivita_jonot", "nollaa_kuorma", "import_topologia_dict",
+))
+KYSELYT = frozenset((
+    "hae_tilastot", "hae_laitteet", "hae_yhteydet", "hae_reitityksen_tilastot",
+    "hae_jonot", "hae_linkkikuorma", "hae_alhaalla", "hae_tapahtumaloki", "export_topologia",
+    "hae_paketit", "laske_paketit",
+))
+
+# Tunnistetaan työjonossa simulaattorin poistoksi
+_LOPETA = object()
+
+
+class PalveluYlikuormitettu(RuntimeError):
+    """Pyyntöä ei otettu vastaan, koska simulaattorin työjono on täynnä."""
+
+
+def _jsoniksi(arvo):
+    """Muuntaa simulaattorin palauttamat arvot JSON-muotoon (tupla-avaimet listoiksi)."""
+    if isinstance(arvo, dict):
+        if all(isinstance(avain, str) for avain in arvo):
+            return {avain: _jsoniksi(a) for avain, a in arvo.items()}
+        return [[_jsoniksi(avain), _jsoniksi(a)] for avain, a in arvo.items()]
+    if isinstance(arvo, (list, tuple)):
+        return [_jsoniksi(a) for a in arvo]
+    if isinstance(arvo, np.ndarray):
+        return arvo.tolist()
+    if isinstance(arvo, np.generic):
+        return arvo.item()
+    return arvo
+
+
+class _Tyo:
+    """Simulaattorin työjonon alkio: lähetys (yhdistettävä) tai muu kutsu."""
+
+    __slots__ = ("funktio", "parit", "paketteja", "avain", "kooste", "tulos")
+
+    def __init__(self, tulos, funktio=None, parit=None, avain=None, kooste=False):
+        self.tulos = tulos
+        self.funktio = funktio
+        self.parit = parit
+        self.paketteja = sum(n for _, _, n in parit) if parit is not None else 0
+        self.avain = avain
+        self.kooste = kooste
+
+
+class _Instanssi:
+    """Nimetty simulaattori, sen työjono ja jonoa käsittelevä tehtävä."""
+
+    def __init__(self, simu, jonon_koko):
+        self.simu = simu
+        self.jono = asyncio.Queue(jonon_koko)
+        self.tehtava = None
+
+
+class Simulointipalvelu:
+    """Nimettyjen simulaattorien asyncio-palvelu.
+
+    kasittele(pyynto) palvelee yhden pyyntösanakirjan ja toimii myös saman
+    prosessin sisältä; kaynnista() avaa TCP- tai Unix-socket-palvelimen.
+    """
+
+    MAX_SIMULAATTORIT = 64
+    MAX_PAKETIT = 1_000_000
+    ERAN_PAKETIT = 262_144
+    MAX_RIVI = 16 * 1024 * 1024
+
+    def __init__(self, jonon_koko=1024, keskeneraiset=64, jonon_odotus_s=1.0):
+        """jonon_koko: simulaattorin odottavat pyynnöt; keskeneraiset: yhden
+        yhteyden yhtäaikaiset pyynnöt; jonon_odotus_s: kauanko täyden jonon
+        vapautumista odotetaan ennen hylkäystä."""
+        if jonon_koko < 1 or keskeneraiset < 1:
+            raise ValueError("Jonon koon ja keskeneräisten pyyntöjen määrän tulee olla positiivisia.")
+        self.jonon_koko = jonon_koko
+        self.keskeneraiset = keskeneraiset
+        self.jonon_odotus_s = jonon_odotus_s
+        self._simut = {}
+        self._palvelimet = []
+        self.tilasto = {
+            "pyynnot": 0,
+            "virheet": 0,
+            "hylatyt": 0,
+            "lahetyspyynnot": 0,
+            "erat": 0,
+            "paketit": 0,
+            "suurin_era": 0,
+        }
+
+    # --- Simulaattorit ---
+
+    def lisaa_simulaattori(self, nimi, simu):
+        """Rekisteröi valmiin simulaattorin nimellä (kutsuttava tapahtumasilmukassa)."""
+        if not isinstance(nimi, str) or not nimi:
+            raise ValueError("Simulaattorin nimen tulee olla merkkijono.")
+        if nimi in self._simut:
+            raise ValueError(f"Simulaattori '{nimi}' on jo olemassa.")
+        if len(self._simut) >= self.MAX_SIMULAATTORIT:
+            raise PalveluYlikuormitettu(f"Simulaattoreita voi olla enintään {self.MAX_SIMULAATTORIT}.")
+        instanssi = _Instanssi(simu, self.jonon_koko)
+        instanssi.tehtava = asyncio.ensure_future(self._tyoskentele(instanssi))
+        self._simut[nimi] = instanssi
+        return simu
+
+    async def poista_simulaattori(self, nimi):
+        """Poistaa simulaattorin; jo jonossa olevat pyynnöt suoritetaan loppuun."""
+        instanssi = self._hae(nimi)
+        del self._simut[nimi]
+        await instanssi.jono.put(_LOPETA)
+        await instanssi.tehtava
+
+    def _hae(self, nimi):
+        instanssi = self._simut.get(nimi)
+        if instanssi is None:
+            raise ValueError(f"Simulaattoria '{nimi}' ei ole.")
+        return instanssi
+
+    @staticmethod
+    def _rakenna(pyynto):
+        """Luo simulaattorin luo-pyynnön mukaan (suoritetaan taustasäikeessä)."""
+        simu = Verkkosimulaattori(siemen=pyynto.get("siemen"))
+        if pyynto.get("topologia") is not None:
+            simu.import_topologia_dict(pyynto["topologia"])
+        elif pyynto.get("tiedosto") is not None:
+            polku = pyynto["tiedosto"]
+            if topology_binary.on_binaari(polku):
+                simu.tuo_binaari(polku)
+            else:
+                with open(polku, "r", encoding="utf-8") as f:
+                    simu.import_topologia_dict(json.load(f))
+        elif pyynto.get("malli") is not None:
+            parametrit = dict(pyynto.get("parametrit") or {})
+            for avain in ("viive", "havio"):
+                if isinstance(parametrit.get(avain), list):
+                    parametrit[avain] = tuple(parametrit[avain])
+            simu.luo_synteettinen_verkko(pyynto["malli"], siemen=pyynto.get("siemen"), **parametrit)
+        elif pyynto.get("esimerkki"):
+            simu.luo_esimerkkiverkko()
+        return simu
+
+    # --- Työjono ja erät ---
+
+    async def _jonota(self, instanssi, tyo):
+        try:
+            instanssi.jono.put_nowait(tyo)
+        except asyncio.QueueFull:
+            try:
+                if self.jonon_odotus_s <= 0:
+                    raise asyncio.TimeoutError
+                await asyncio.wait_for(instanssi.jono.put(tyo), self.jonon_odotus_s)
+            except asyncio.TimeoutError:
+                self.tilasto["hylatyt"] += 1
+                raise PalveluYlikuormitettu("Simulaattorin työjono on täynnä, yritä myöhemmin uudelleen.") from None
+        return await tyo.tulos
+
+    async def _tyoskentele(self, instanssi):
+        """Suorittaa simulaattorin työt järjestyksessä ja yhdistää peräkkäiset lähetykset."""
+        silmukka = asyncio.get_running_loop()
+        jono = instanssi.jono
+        seuraava = None
+        while True:
+            tyo = seuraava if seuraava is not None else await jono.get()
+            seuraava = None
+            if tyo is _LOPETA:
+                return
+            if tyo.funktio is not None:
+                era = None
+                funktio = tyo.funktio
+            else:
+                era = [tyo]
+                paketteja = tyo.paketteja
+                while paketteja < self.ERAN_PAKETIT and not jono.empty():
+                    lisa = jono.get_nowait()
+                    if lisa is _LOPETA or lisa.funktio is not None:
+                        seuraava = lisa
+                        break
+                    era.append(lisa)
+                    paketteja += lisa.paketteja
+                funktio = lambda: self._laheta_era(instanssi.simu, era)
+            try:
+                tulos = await silmukka.run_in_executor(None, funktio)
+            except Exception as e:
+                for t in era or [tyo]:
+                    if not t.tulos.done():
+                        t.tulos.set_exception(e)
+                continue
+            if era is None:
+                if not tyo.tulos.done():
+                    tyo.tulos.set_result(tulos)
+                continue
+            self.tilasto["erat"] += 1
+            self.tilasto["lahetyspyynnot"] += len(era)
+            self.tilasto["paketit"] += paketteja
+            self.tilasto["suurin_era"] = max(self.tilasto["suurin_era"], len(era))
+            for t, arvo in zip(era, tulos):
+                if t.tulos.done():
+                    continue
+                if isinstance(arvo, Exception):
+                    t.tulos.set_exception(arvo)
+                else:
+                    t.tulos.set_result(arvo)
+
+    @staticmethod
+    def _laheta_era(simu, era):
+        """Lähettää erän pyynnöt laheta_viestit-kutsuin ja jakaa tulokset takaisin.
+
+        Pyynnöt ryhmitellään (viesti, reititys, kirjaa) -asetusten mukaan;
+        tuntemattomia laitteita sisältävä pyyntö hylätään yksinään. Jos
+        yhdistetty lähetys epäonnistuu (esim. jonkin parin välillä ei ole
+        reittiä), ryhmän pyynnöt lähetetään uudelleen yksitellen, jotta
+        virheen saa vain virheellinen pyyntö. laheta_viestit tarkistaa
+        reitit ennen kuin mitään kirjataan, joten uusinta ei kahdenna
+        lokia eikä kuormaa.
+        """
+        ryhmat = {}
+        for tyo in era:
+            ryhmat.setdefault(tyo.avain, []).append(tyo)
+        tulokset = {}
+        for (viesti, reititys, kirjaa), tyot in ryhmat.items():
+            kelvolliset = []
+            for tyo in tyot:
+                puuttuva = next((n for a, b, _ in tyo.parit for n in (a, b) if n not in simu.verkko), None)
+                if puuttuva is not None:
+                    tulokset[id(tyo)] = ValueError(f"Laitetta '{puuttuva}' ei löydy.")
+                else:
+                    kelvolliset.append(tyo)
+            try:
+                Simulointipalvelu._laheta_ryhma(simu, kelvolliset, viesti, reititys, kirjaa, tulokset)
+            except (ValueError, RuntimeError) as e:
+                if len(kelvolliset) == 1:
+                    tulokset[id(kelvolliset[0])] = e
+                    continue
+                for tyo in kelvolliset:
+                    try:
+                        Simulointipalvelu._laheta_ryhma(simu, [tyo], viesti, reititys, kirjaa, tulokset)
+                    except (ValueError, RuntimeError) as e:
+                        tulokset[id(tyo)] = e
+        return [tulokset[id(tyo)] for tyo in era]
+
+    @staticmethod
+    def _laheta_ryhma(simu, tyot, viesti, reititys, kirjaa, tulokset):
+        """Lähettää pyyntöjen parit yhdellä laheta_viestit-kutsulla ja jakaa sarakkeet pyynnöille."""
+        parit = []
+        for tyo in tyot:
+            for lahettaja, vastaanottaja, maara in tyo.parit:
+                parit.extend(itertools.repeat((lahettaja, vastaanottaja), maara))
+        if parit:
+            sarakkeet = simu.laheta_viestit(parit, viesti=viesti, reititys=reititys, kirjaa=kirjaa)
+        else:
+            sarakkeet = {
+                "kokonaisviive_ms": np.zeros(0),
+                "onnistui": np.zeros(0, dtype=bool),
+                "havio_hop": np.zeros(0, dtype=np.int64),
+            }
+        alku = 0
+        for tyo in tyot:
+            loppu = alku + tyo.paketteja
+            osa = {avain: sarake[alku:loppu] for avain, sarake in sarakkeet.items()}
+            alku = loppu
+            if tyo.kooste:
+                onnistui = osa["onnistui"]
+                perilla = osa["kokonaisviive_ms"][onnistui]
+                tulokset[id(tyo)] = {
+                    "maara": int(len(onnistui)),
+                    "onnistuneet": int(np.count_nonzero(onnistui)),
+                    "keskiviive_ms": float(perilla.mean()) if len(perilla) else None,
+                }
+            else:
+                tulokset[id(tyo)] = {avain: sarake.tolist() for avain, sarake in osa.items()}
+
+    def _lue_parit(self, pyynto):
+        parit = pyynto.get("parit")
+        if parit is None:
+            parit = [[pyynto.get("lahettaja"), pyynto.get("vastaanottaja"), pyynto.get("maara", 1)]]
+        if not isinstance(parit, list):
+            raise ValueError("parit tulee antaa listana [lahettaja, vastaanottaja(, maara)].")
+        tulos = []
+        yhteensa = 0
+        for pari in parit:
+            if not isinstance(pari, list) or len(pari) not in (2, 3):
+                raise ValueError(f"Virheellinen pari {pari!r}: odotettiin [lahettaja, vastaanottaja(, maara)].")
+            lahettaja, vastaanottaja = pari[0], pari[1]
+            maara = pari[2] if len(pari) == 3 else 1
+            if not isinstance(lahettaja, str) or not isinstance(vastaanottaja, str):
+                raise ValueError(f"Virheellinen pari {pari!r}: laitteiden nimien tulee olla merkkijonoja.")
+            if isinstance(maara, bool) or not isinstance(maara, int) or maara < 0:
+                raise ValueError(f"Virheellinen määrä parissa {pari!r}.")
+            yhteensa += maara
+            tulos.append((lahettaja, vastaanottaja, maara))
+        if yhteensa > self.MAX_PAKETIT:
+            raise ValueError(f"Pyynnössä on {yhteensa} pakettia (enintään {self.MAX_PAKETIT}).")
+        return tulos
+
+    # --- Pyynnöt ---
+
+    async def kasittele(self, pyynto):
+        """Palvelee yhden pyynnön ja palauttaa vastaussanakirjan."""
+        self.tilasto["pyynnot"] += 1
+        tunniste = pyynto.get("id") if isinstance(pyynto, dict) else None
+        try:
+            if not isinstance(pyynto, dict):
+                raise ValueError("Pyynnön tulee olla JSON-olio.")
+            tulos = await self._suorita(pyynto)
+        except PalveluYlikuormitettu as e:
+            self.tilasto["virheet"] += 1
+            return {"id": tunniste, "ok": False, "virhe": str(e), "ylikuormitettu": True}
+        except (ValueError, RuntimeError, KeyError, TypeError, OSError) as e:
+            self.tilasto["virheet"] += 1
+            return {"id": tunniste, "ok": False, "virhe": str(e) or type(e).__name__}
+        except Exception as e:
+            # Palvelu jatkaa, vaikka yksittäinen pyyntö kaatuisi odottamattomasti
+            self.tilasto["virheet"] += 1
+            return {"id": tunniste, "ok": False, "virhe": f"{type(e).__name__}: {e}"}
+        return {"id": tunniste, "ok": True, "tulos": _jsoniksi(tulos)}
+
+    async def _suorita(self, pyynto):
+        op = pyynto.get("op")
+        if op == "lista":
+            return sorted(self._simut)
+        if op == "palvelu":
+            tilasto = dict(self.tilasto)
+            tilasto["jonot"] = {nimi: i.jono.qsize() for nimi, i in self._simut.items()}
+            return tilasto
+        if op == "luo":
+            nimi = pyynto.get("simu")
+            if nimi in self._simut:
+                raise ValueError(f"Simulaattori '{nimi}' on jo olemassa.")
+            simu = await asyncio.get_running_loop().run_in_executor(None, self._rakenna, pyynto)
+            self.lisaa_simulaattori(nimi, simu)
+            return {"laitteita": simu.verkko.number_of_nodes(), "yhteyksia": simu.verkko.number_of_edges()}
+        if op == "poista":
+            await self.poista_simulaattori(pyynto.get("simu"))
+            return None
+
+        instanssi = self._hae(pyynto.get("simu"))
+        tulos = asyncio.get_running_loop().create_future()
+        if op == "laheta":
+            reititys = pyynto.get("reititys")
+            if reititys is not None and reititys not in Verkkosimulaattori.REITITYSTILAT:
+                raise ValueError(f"Tuntematon reititystila '{reititys}'.")
+            avain = (str(pyynto.get("viesti", "")), reititys, bool(pyynto.get("kirjaa", True)))
+            tyo = _Tyo(tulos, parit=self._lue_parit(pyynto), avain=avain, kooste=bool(pyynto.get("kooste")))
+        elif op in ("muokkaa", "kysy"):
+            sallitut, kentta = (MUOKKAUKSET, "toiminto") if op == "muokkaa" else (KYSELYT, "kysely")
+            nimi = pyynto.get(kentta)
+            if nimi not in sallitut:
+                raise ValueError(f"Tuntematon {kentta} '{nimi}' (vaihtoehdot: {', '.join(sorted(sallitut))}).")
+            argumentit = pyynto.get("argumentit") or []
+            metodi = getattr(instanssi.simu, nimi)
+            if isinstance(argumentit, dict):
+                funktio = lambda: metodi(**argumentit)
+            elif isinstance(argumentit, list):
+                funktio = lambda: metodi(*argumentit)
+            else:
+                raise ValueError("argumentit tulee antaa listana tai oliona.")
+            tyo = _Tyo(tulos, funktio=funktio)
+        else:
+            raise ValueError(f"Tuntematon op '{op}'.")
+        return await self._jonota(instanssi, tyo)
+
+    # --- Palvelin ---
+
+    async def kaynnista(self, portti=None, socket_polku=None, isanta="127.0.0.1"):
+        """Avaa palvelimen localhostiin (portti) tai Unix-socketiin (socket_polku)."""
+        if socket_polku is not None:
+            palvelin = await asyncio.start_unix_server(self._palvele, path=socket_polku, limit=self.MAX_RIVI)
+        else:
+            if isanta != "localhost" and not ipaddress.ip_address(isanta).is_loopback:
+                raise ValueError(f"Palvelu kuuntelee vain paikallisia osoitteita, ei '{isanta}'.")
+            palvelin = await asyncio.start_server(
+                self._palvele, host=isanta, port=0 if portti is None else portti, limit=self.MAX_RIVI,
+            )
+        self._palvelimet.append(palvelin)
+        return palvelin
+
+    async def sulje(self):
+        """Sulkee palvelimet ja pysäyttää simulaattorien työjonot."""
+        for palvelin in self._palvelimet:
+            palvelin.close()
+            await palvelin.wait_closed()
+        self._palvelimet = []
+        for nimi in list(self._simut):
+            await self.poista_simulaattori(nimi)
+
+    async def _palvele(self, lukija, kirjoittaja):
+        # Keskeneräisten pyyntöjen raja pysäyttää lukemisen, jolloin
+        # käyttöjärjestelmän puskurit täyttyvät ja asiakas hidastuu
+        rajoitin = asyncio.Semaphore(self.keskeneraiset)
+        kirjoituslukko = asyncio.Lock()
+        tehtavat = set()
+        try:
+            while True:
+                try:
+                    rivi = await lukija.readline()
+                except ValueError:
+                    await self._kirjoita(kirjoittaja, kirjoituslukko, {
+                        "id": None, "ok": False, "virhe": f"Pyyntörivi on yli {self.MAX_RIVI} tavua.",
+                    })
+                    break
+                if not rivi:
+                    break
+                if not rivi.strip():
+                    continue
+                await rajoitin.acquire()
+                tehtava = asyncio.ensure_future(self._vastaa(rivi, rajoitin, kirjoittaja, kirjoituslukko))
+                tehtavat.add(tehtava)
+                tehtava.add_done_callback(tehtavat.discard)
+            if tehtavat:
+                await asyncio.gather(*tehtavat, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            kirjoittaja.close()
+
+    async def _vastaa(self, rivi, rajoitin, kirjoittaja, kirjoituslukko):
+        try:
+            try:
+                pyynto = json.loads(rivi)
+            except ValueError as e:
+                self.tilasto["pyynnot"] += 1
+                self.tilasto["virheet"] += 1
+                vastaus = {"id": None, "ok": False, "virhe": f"Virheellinen JSON: {e}"}
+            else:
+                vastaus = await self.kasittele(pyynto)
+            await self._kirjoita(kirjoittaja, kirjoituslukko, vastaus)
+        finally:
+            rajoitin.release()
+
+    @staticmethod
+    async def _kirjoita(kirjoittaja, kirjoituslukko, vastaus):
+        data = json.dumps(vastaus, ensure_ascii=False).encode("utf-8") + b"\n"
+        async with kirjoituslukko:
+            kirjoittaja.write(data)
+            await kirjoittaja.drain()
+
+
+class Palveluasiakas:
+    """Synkroninen asiakas: yksi pyyntö kerrallaan, virheet poikkeuksina.
+
+    Rinnakkaisuutta varten avataan useita asiakkaita (tai lähetetään
+    pyyntörivejä putkitettuna omalla asiakkaalla).
+    """
+
+    def __init__(self, portti=None, socket_polku=None, isanta="127.0.0.1", aikakatkaisu=None):
+        if socket_polku is not None:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.settimeout(aikakatkaisu)
+            self._socket.connect(socket_polku)
+        else:
+            self._socket = socket.create_connection((isanta, portti), timeout=aikakatkaisu)
+        self._tiedosto = self._socket.makefile("rwb")
+        self._tunnisteet = itertools.count(1)
+
+    def kutsu(self, op, **parametrit):
+        """Lähettää pyynnön ja palauttaa vastauksen tuloksen."""
+        tunniste = next(self._tunnisteet)
+        pyynto = dict(parametrit, id=tunniste, op=op)
+        self._tiedosto.write(json.dumps(pyynto, ensure_ascii=False).encode("utf-8") + b"\n")
+        self._tiedosto.flush()
+        rivi = self._tiedosto.readline()
+        if not rivi:
+            raise RuntimeError("Palvelu sulki yhteyden.")
+        vastaus = json.loads(rivi)
+        if not vastaus.get("ok"):
+            if vastaus.get("ylikuormitettu"):
+                raise PalveluYlikuormitettu(vastaus.get("virhe"))
+            raise RuntimeError(vastaus.get("virhe"))
+        return vastaus.get("tulos")
+
+    def sulje(self):
+        self._tiedosto.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.sulje()
+
+
+def luo_parser():
+    parser = argparse.ArgumentParser(description="Paikallinen simulointipalvelu (JSON-rivit, asyncio).")
+    kohde = parser.add_mutually_exclusive_group()
+    kohde.add_argument("--portti", type=int, default=8765, help="TCP-portti localhostissa (oletus 8765)")
+    kohde.add_argument("--socket", help="kuuntele Unix-socketissa TCP:n sijaan")
+    parser.add_argument("--isanta", default="127.0.0.1", help="paikallinen osoite (oletus 127.0.0.1)")
+    parser.add_argument("--esilataa", action="append", default=[], metavar="NIMI=TIEDOSTO",
+                        help="lataa topologia (.json tai .ntopo) simulaattoriksi käynnistettäessä")
+    parser.add_argument("--jonon-koko", type=int, default=1024, help="simulaattorin odottavat pyynnöt")
+    parser.add_argument("--keskeneraiset", type=int, default=64, help="yhden yhteyden yhtäaikaiset pyynnöt")
+    return parser
+
+
+async def _aja(args):
+    palvelu = Simulointipalvelu(jonon_koko=args.jonon_koko, keskeneraiset=args.keskeneraiset)
+    for maarittely in args.esilataa:
+        nimi, _, polku = maarittely.partition("=")
+        if not polku:
+            raise ValueError(f"--esilataa odottaa muotoa NIMI=TIEDOSTO, ei '{maarittely}'.")
+        vastaus = await palvelu.kasittele({"op": "luo", "simu": nimi, "tiedosto": polku})
+        if not vastaus["ok"]:
+            raise ValueError(vastaus["virhe"])
+    palvelin = await palvelu.kaynnista(
+        portti=None if args.socket else args.portti, socket_polku=args.socket, isanta=args.isanta,
+    )
+    osoite = args.socket or "%s:%d" % palvelin.sockets[0].getsockname()[:2]
+    print(f"Simulointipalvelu kuuntelee: {osoite}", file=sys.stderr)
+    try:
+        await palvelin.serve_forever()
+    finally:
+        await palvelu.sulje()
+
+
+def main(argv=None):
+    args = luo_parser().parse_args(argv)
+    try:
+        asyncio.run(_aja(args))
+    except KeyboardInterrupt:
+        pass
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"Virhe: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,35 +1,398 @@
-import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
 import networkx as nx
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+import numpy as np
 import time
 import random
-from datetime import datetime
-import json
+import heapq
+import itertools
+import bisect
+import zlib
+import functools
+import threading
+from collections import deque
+
+import topology_binary
+import topology_generators
+from graph_snapshot import Tilannekuva
+from instrumentation import Instrumentointi
+from queueing import JONOMALLIT, arvioi_jonot, palveluaika_ms
+from packet_log import Pakettiloki, TiedostoNielu, Viivetilasto, TILA_OK, TILA_HAVISI, TILA_LINKKI_POISSA, TILA_PUDOTETTU
+from traffic_matrix import Kuormatulos
+
+
+# Linkki, jolle ei ole jonoarviota: (jonoviive_ms, pudotustodennäköisyys)
+_EI_JONOA = (0.0, 0.0)
+
+
+def _lukittu(metodi):
+    """Suorittaa metodin simulaattorin lukon alla (GUI:n taustalähetykset)."""
+
+    @functools.wraps(metodi)
+    def kaare(self, *args, **kwargs):
+        with self._lukko:
+            return metodi(self, *args, **kwargs)
+
+    return kaare
+
+
+class TopologiaVirhe(ValueError):
+    """Topologiatiedoston virheet; kaikki löydetyt virheet ovat listassa virheet."""
+
+    NAYTETTAVAT = 20
+
+    def __init__(self, virheet):
+        self.virheet = list(virheet)
+        rivit = self.virheet[: self.NAYTETTAVAT]
+        if len(self.virheet) > self.NAYTETTAVAT:
+            rivit.append(f"... ja {len(self.virheet) - self.NAYTETTAVAT} muuta virhettä")
+        super().__init__(f"Topologiassa on {len(self.virheet)} virhettä:\n" + "\n".join(rivit))
 
 
 class Verkkosimulaattori:
     """Verkon logiikka: laitteet, yhteydet ja viestien reititys."""
 
-    def __init__(self, jitter_min=0.8, jitter_max=1.2, nukkumisaika=0.0):
+    # Erälähetyksen paloittelu, jottei (paketit x hypyt) -matriiseista tule liian suuria
+    ERAN_KOKO = 65536
+    REITITYSTILAT = ("lyhin", "ecmp", "k_lyhimmat", "haviotietoinen")
+    # ECMP-ryhmän enimmäisleveys (vrt. reitittimien maximum-paths)
+    ECMP_LEVEYS = 16
+    TAPAHTUMALOKIN_KOKO = 10000
+    # Liikennematriisiajon käsittelylohkon koko (polkuryhmät x hypyt) ja
+    # viivenäytteiden kokonaismäärä, joka jaetaan ryhmille pakettimäärän mukaan
+    KUORMAN_LOHKO = 1 << 20
+    KUORMAN_NAYTTEET = 1 << 18
+
+    def __init__(self, jitter_min=0.8, jitter_max=1.2, nukkumisaika=0.0, siemen=None,
+                 lokin_kapasiteetti=None, lokin_ylivuototiedosto=None, lokin_indeksit=True):
         self.verkko = nx.Graph()
+        # Topologiaa ja reititystauluja muokataan vain tämän lukon alla, jotta
+        # lähetyksiä voi ajaa taustasäikeissä samalla kun verkkoa muokataan.
+        self._lukko = threading.RLock()
+        # Vaihekohtainen ajanotto; None = pois päältä (ks. instrumentation.py)
+        self.instrumentointi = None
         self.jitter_min = float(jitter_min)
         self.jitter_max = float(jitter_max)
         self.nukkumisaika = float(nukkumisaika)
-        self.pakettiloki = []
+        self.pakettiloki = Pakettiloki(lokin_kapasiteetti, lokin_ylivuototiedosto, indeksoi=lokin_indeksit)
+        self._rng = random.Random(siemen)
+        self._np_rng = np.random.default_rng(siemen)
+        self._asettelu_rng = random.Random(siemen)
+        # Sijainnit lasketaan laiskasti vasta, kun niitä tarvitaan (hae_sijainnit)
         self._pos_cache = None
+        self._asettelemattomat = set()
+        self._asettelu_versio = 0
+        # Vain piirtoon vaikuttavat muutokset (laitteen tyyppi ja väri)
+        self._piirto_versio = 0
+
+        # Reititystaulut: lähteen tunniste -> (edeltäjät, etäisyydet) tilannekuvan
+        # tunnisteilla. Topologiaversio kasvaa jokaisen laitteisiin tai
+        # yhteyksiin kohdistuvan muutoksen yhteydessä, ja tilannekuva
+        # rakennetaan uudelleen vasta seuraavalla reitinhaulla.
+        self._topologia_versio = 0
+        self._tilannekuva = None
+        self._reittipuut = {}
+        self._reitti_osumat = 0
+        # Monipolkureititys: (tila, lähde, kohde) -> (polut, kumulatiiviset painot).
+        # Polkujoukot ja häviötietoiset puut koskevat yhtä tilannekuvaa.
+        self.reititystila = "lyhin"
+        self.k_polkuja = 4
+        self.havion_paino = 100.0
+        self._polkujoukot = {}
+        self._haviopuut = {}
+        self._haviopainot = None
+        self._polkujoukot_versio = None
+
+        # Alhaalla olevat yhteydet ovat poissa verkosta; tallessa niiden tiedot
+        # ja syyt (yhteys itse tai päätelaite alhaalla). Ylösotto palauttaa
+        # yhteyden vasta, kun syitä ei enää ole.
+        self._alhaalla_yhteydet = {}
+        self._alhaalla_laitteet = set()
+        self._tapahtumaloki = deque(maxlen=self.TAPAHTUMALOKIN_KOKO)
+        self._reitti_ohitukset = 0
+
+        # Jonomalli (queueing.py): lähetykset kerryttävät suunnatuille linkeille
+        # tarjottua kuormaa, josta paivita_jonot() laskee linkkien jonoviiveet
+        # ja pudotukset. Lähetykset käyttävät viimeisintä arviota:
+        # (lahto, kohde) -> (jonoviive_ms, pudotus).
+        self.jonomalli = None
+        self.pakettikoko = 1500
+        self._linkkikuorma = {}
+        self._kuorma_kesto_s = 0.0
+        self._jonoarvio = {}
+        self._jonot = {}
+        self._jonojakso_s = None
+        # Arvion kuorma; None = kertynyt kuorma (paivita_jonot(kuorma=...))
+        self._jonokuorma = None
+        self._jonot_versio = 0
+        self._jonotaulukot = None
+
+        # Muutoskuuntelijat: kuuntelija(tapahtuma, kohde, data) kutsutaan
+        # jokaisen laitteeseen tai yhteyteen kohdistuvan muutoksen jälkeen
+        # (ks. lisaa_muutoskuuntelija).
+        self._muutoskuuntelijat = ()
 
     # --- Sisäiset apurit ---
 
     def _paivita_pos_cache(self):
+        self._asettelemattomat.clear()
+        self._asettelu_versio += 1
         if len(self.verkko.nodes) == 0:
             self._pos_cache = {}
+            return
+        alku = None
+        if self._pos_cache:
+            # Lämmin aloitus: vanhat sijainnit pidetään lähtöpisteenä
+            self._asettele_uudet(list(self.verkko.nodes))
+            alku = self._pos_cache
+        self._pos_cache = nx.spring_layout(self.verkko, pos=alku)
+
+    def _asettele_uudet(self, solmut):
+        """Sijoittaa asettelemattomat solmut jo sijoitettujen naapuriensa keskelle."""
+        pos = self._pos_cache
+        jono = deque(n for n in solmut if n in self.verkko and n not in pos)
+        if jono:
+            self._asettelu_versio += 1
+        hajonta = 0.05
+        ilman_edistysta = 0
+        while jono and ilman_edistysta < len(jono):
+            n = jono.popleft()
+            naapurit = [pos[m] for m in self.verkko.adj[n] if m in pos]
+            if naapurit:
+                keskipiste = np.mean(naapurit, axis=0)
+                pos[n] = keskipiste + np.array(
+                    [self._asettelu_rng.uniform(-hajonta, hajonta), self._asettelu_rng.uniform(-hajonta, hajonta)]
+                )
+                ilman_edistysta = 0
+            else:
+                jono.append(n)
+                ilman_edistysta += 1
+        # Erilliset solmut (ei sijoitettuja naapureita) satunnaisesti
+        for n in jono:
+            pos[n] = np.array([self._asettelu_rng.uniform(-1.0, 1.0), self._asettelu_rng.uniform(-1.0, 1.0)])
+
+    def _hae_tilannekuva(self):
+        """Palauttaa topologiaversiota vastaavan tilannekuvan (kutsutaan lukon alla)."""
+        kuva = self._tilannekuva
+        if kuva is None or kuva.versio != self._topologia_versio:
+            if self.instrumentointi is not None:
+                self.instrumentointi.laske("tilannekuvat")
+            kuva = self._tilannekuva = Tilannekuva(self.verkko, self._topologia_versio, kuva)
+        return kuva
+
+    def _laske_reittipuu(self, kuva, lahde):
+        if self.instrumentointi is not None:
+            self.instrumentointi.laske("reittipuut")
+        puu = kuva.lyhimmat_polut(lahde)
+        self._reittipuut[lahde] = puu
+        return puu
+
+    def _hae_reitti_idt(self, kuva, lahettaja, vastaanottaja):
+        """Reitti tilannekuvan tunnisteina."""
+        if lahettaja == vastaanottaja:
+            return [lahettaja]
+
+        puu = self._reittipuut.get(lahettaja)
+        kaanteinen = False
+        if puu is None:
+            # Verkko on suuntaamaton, joten vastaanottajan puu kelpaa sellaisenaan
+            puu = self._reittipuut.get(vastaanottaja)
+            kaanteinen = puu is not None
+        if puu is None:
+            self._reitti_ohitukset += 1
+            puu = self._laske_reittipuu(kuva, lahettaja)
+        else:
+            self._reitti_osumat += 1
+
+        juuri, kohde = (vastaanottaja, lahettaja) if kaanteinen else (lahettaja, vastaanottaja)
+        if self._edeltaja(puu, kohde) < 0:
+            raise RuntimeError(
+                f"Ei yhteyttä laitteiden {kuva.nimet[lahettaja]} ja {kuva.nimet[vastaanottaja]} välillä."
+            )
+        edeltajat = puu[0]
+        reitti = [kohde]
+        seuraava = kohde
+        while seuraava != juuri:
+            seuraava = edeltajat[seuraava]
+            reitti.append(seuraava)
+        if not kaanteinen:
+            reitti.reverse()
+        return reitti
+
+    def _hae_haviopainot(self, kuva):
+        if self._haviopainot is None:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                hinnat = kuva.viiveet - self.havion_paino * np.log1p(-kuva.haviot)
+            hinnat[kuva.haviot >= 1.0] = np.inf
+            self._haviopainot = hinnat.tolist()
+        return self._haviopainot
+
+    def _tarkista_polkujoukot(self, kuva):
+        if self._polkujoukot_versio != kuva.versio:
+            self._polkujoukot.clear()
+            self._haviopuut.clear()
+            self._haviopainot = None
+            self._polkujoukot_versio = kuva.versio
+
+    def _hae_haviopuu(self, kuva, lahde):
+        self._tarkista_polkujoukot(kuva)
+        puu = self._haviopuut.get(lahde)
+        if puu is None:
+            puu = self._haviopuut[lahde] = kuva.lyhimmat_polut(lahde, self._hae_haviopainot(kuva))
+        return puu
+
+    def _hae_polkujoukko(self, kuva, tila, lahettaja, vastaanottaja):
+        """Parin polut (tunnisteina) ja kumulatiiviset valintapainot."""
+        if lahettaja == vastaanottaja:
+            return [[lahettaja]], [1.0]
+        self._tarkista_polkujoukot(kuva)
+        avain = (tila, lahettaja, vastaanottaja)
+        joukko = self._polkujoukot.get(avain)
+        if joukko is not None:
+            return joukko
+        if self.instrumentointi is not None:
+            self.instrumentointi.laske("polkujoukot")
+
+        if tila == "ecmp":
+            # Kummankin päätepisteen viiveetäisyydet kelpaavat (suuntaamaton verkko)
+            puu = self._reittipuut.get(lahettaja)
+            kaanteinen = puu is None and vastaanottaja in self._reittipuut
+            if kaanteinen:
+                puu = self._reittipuut[vastaanottaja]
+                polut = kuva.tasakustanteiset_polut(puu[1], vastaanottaja, lahettaja, self.ECMP_LEVEYS)
+                polut = [p[::-1] for p in polut]
+            else:
+                if puu is None:
+                    puu = self._laske_reittipuu(kuva, lahettaja)
+                polut = kuva.tasakustanteiset_polut(puu[1], lahettaja, vastaanottaja, self.ECMP_LEVEYS)
+            painot = [1.0] * len(polut)
+        elif tila == "k_lyhimmat":
+            hinnat_polut = kuva.k_lyhinta_polkua(lahettaja, vastaanottaja, self.k_polkuja)
+            polut = [p for _, p in hinnat_polut]
+            # Kuorma jakautuu polkujen hintojen käänteislukujen suhteessa
+            painot = [1.0 / max(hinta, 1e-9) for hinta, _ in hinnat_polut]
+        else:
+            puu = self._hae_haviopuu(kuva, lahettaja)
+            polut = [kuva.polku(puu[0], lahettaja, vastaanottaja)] if puu[0][vastaanottaja] >= 0 else []
+            painot = [1.0]
+
+        if not polut:
+            raise RuntimeError(
+                f"Ei yhteyttä laitteiden {kuva.nimet[lahettaja]} ja {kuva.nimet[vastaanottaja]} välillä."
+            )
+        joukko = self._polkujoukot[avain] = (polut, list(itertools.accumulate(painot)))
+        return joukko
+
+    def _tarkista_reititystila(self, reititys):
+        tila = self.reititystila if reititys is None else reititys
+        if tila not in self.REITITYSTILAT:
+            raise ValueError(f"Tuntematon reititystila '{tila}' (vaihtoehdot: {', '.join(self.REITITYSTILAT)}).")
+        return tila
+
+    def _valitse_reitti(self, kuva, lahettaja, vastaanottaja, tila, vuo=None):
+        """Reitti tunnisteina; monipolkutiloissa valinta polkujoukosta.
+
+        Jos vuo on annettu, polku valitaan vakaalla tiivisteellä parista ja
+        vuosta (sama vuo kulkee aina samaa polkua). Muuten valinta arvotaan
+        pakettikohtaisesti.
+        """
+        if tila == "lyhin":
+            return self._hae_reitti_idt(kuva, lahettaja, vastaanottaja)
+        polut, kumulatiiviset = self._hae_polkujoukko(kuva, tila, lahettaja, vastaanottaja)
+        if len(polut) == 1:
+            return polut[0]
+        if vuo is None:
+            arpa = self._rng.random()
         else:
-            self._pos_cache = nx.spring_layout(self.verkko)
+            # hash() vaihtelee prosessista toiseen, crc32 ei
+            tiiviste = zlib.crc32(repr((kuva.nimet[lahettaja], kuva.nimet[vastaanottaja], vuo)).encode("utf-8"))
+            arpa = tiiviste / 2**32
+        return polut[bisect.bisect_right(kumulatiiviset, arpa * kumulatiiviset[-1])]
+
+    def _hae_reitti(self, lahettaja, vastaanottaja, reititys=None, vuo=None):
+        tila = self._tarkista_reititystila(reititys)
+        kuva = self._hae_tilannekuva()
+        reitti = self._valitse_reitti(
+            kuva, kuva.tunnisteet[lahettaja], kuva.tunnisteet[vastaanottaja], tila, vuo
+        )
+        return [kuva.nimet[i] for i in reitti]
+
+    def _mitatoi_puut(self, ehto):
+        self._topologia_versio += 1
+        for lahde in [s for s, puu in self._reittipuut.items() if ehto(s, puu)]:
+            del self._reittipuut[lahde]
+
+    # Puut on laskettu tilannekuvan tunnisteilla; puun jälkeen lisätyt
+    # laitteet jäävät taulukoiden ulkopuolelle, eli saavuttamattomiksi.
+
+    @staticmethod
+    def _edeltaja(puu, tunniste):
+        edeltajat = puu[0]
+        return edeltajat[tunniste] if tunniste < len(edeltajat) else -1
+
+    @staticmethod
+    def _etaisyys(puu, tunniste):
+        etaisyydet = puu[1]
+        return etaisyydet[tunniste] if tunniste < len(etaisyydet) else float("inf")
+
+    def _tunniste(self, nimi):
+        # Puissa olevilla laitteilla on aina tunniste; muut eivät voi olla puissa
+        kuva = self._tilannekuva
+        return kuva.tunnisteet.get(nimi, -1) if kuva is not None else -1
+
+    def _kayttaa_reunaa(self, puu, laite1, laite2):
+        i1, i2 = self._tunniste(laite1), self._tunniste(laite2)
+        if i1 < 0 or i2 < 0:
+            return False
+        return self._edeltaja(puu, i2) == i1 or self._edeltaja(puu, i1) == i2
+
+    def _lyhentaa_reitteja(self, puu, laite1, laite2, viive):
+        # Uusi tai lyhentynyt yhteys muuttaa puuta vain, jos se tarjoaa
+        # lyhyemmän reitin jompaankumpaan päätepisteeseen.
+        i1, i2 = self._tunniste(laite1), self._tunniste(laite2)
+        d1 = self._etaisyys(puu, i1) if i1 >= 0 else float("inf")
+        d2 = self._etaisyys(puu, i2) if i2 >= 0 else float("inf")
+        return d1 + viive < d2 or d2 + viive < d1
+
+    def _ilmoita(self, tapahtuma, kohde, data=None):
+        for kuuntelija in self._muutoskuuntelijat:
+            kuuntelija(tapahtuma, kohde, data)
+
+    def _ilmoita_yhteys(self, tapahtuma, laite1, laite2):
+        self._ilmoita(tapahtuma, (laite1, laite2), dict(self.verkko[laite1][laite2]))
+
+    @_lukittu
+    def mitatoi_reitit(self):
+        """Tyhjentää reititystaulut, esim. jos self.verkkoa on muokattu suoraan."""
+        self._topologia_versio += 1
+        self._reittipuut.clear()
+        # Ilman puita tunnisteita ei tarvitse säilyttää
+        self._tilannekuva = None
+
+    # --- Muutostapahtumat ---
+
+    @_lukittu
+    def lisaa_muutoskuuntelija(self, kuuntelija):
+        """Rekisteröi kuuntelija(tapahtuma, kohde, data) topologian muutoksille.
+
+        Tapahtumat: laite_lisatty, laite_muuttui ja laite_poistettu (kohde on
+        nimi, data laitteen attribuutit) sekä yhteys_lisatty, yhteys_muuttui ja
+        yhteys_poistettu (kohde on (laite1, laite2), data yhteyden
+        attribuutit). Laitteen poistoa edeltää sen yhteyksien poisto, ja
+        alas otettu yhteys näkyy poistona ja ylösotto lisäyksenä.
+        Koko verkon korvaavat toiminnot (tuonti, synteettinen verkko)
+        ilmoittavat vain topologia_vaihtui (kohde ja data None).
+
+        Kuuntelijaa kutsutaan simulaattorin lukon alla siinä säikeessä, joka
+        muutoksen teki, joten sen on oltava nopea eikä se saa muokata verkkoa.
+        """
+        self._muutoskuuntelijat = self._muutoskuuntelijat + (kuuntelija,)
+
+    @_lukittu
+    def poista_muutoskuuntelija(self, kuuntelija):
+        self._muutoskuuntelijat = tuple(k for k in self._muutoskuuntelijat if k is not kuuntelija)
 
     # --- Perusoperaatiot: laitteet ja yhteydet ---
 
+    @_lukittu
     def lisaa_laite(self, nimi, tyyppi="reititin"):
         if not nimi:
             raise ValueError("Laitteen nimi ei voi olla tyhjä.")
@@ -37,22 +400,64 @@ class Verkkosimulaattori:
             raise ValueError(f"Laite '{nimi}' on jo olemassa.")
         vari = "lightgreen" if tyyppi == "tietokone" else "lightblue"
         self.verkko.add_node(nimi, tyyppi=tyyppi, color=vari)
-        self._paivita_pos_cache()
+        # Erillinen uusi laite ei muuta olemassa olevia reittejä
+        self._topologia_versio += 1
+        self._asettelemattomat.add(nimi)
+        self._ilmoita("laite_lisatty", nimi, dict(self.verkko.nodes[nimi]))
 
+    @_lukittu
     def muokkaa_laitetta(self, nimi, uusi_tyyppi):
         if nimi not in self.verkko:
             raise ValueError(f"Laitetta '{nimi}' ei löydy.")
         vari = "lightgreen" if uusi_tyyppi == "tietokone" else "lightblue"
         self.verkko.nodes[nimi]["tyyppi"] = uusi_tyyppi
         self.verkko.nodes[nimi]["color"] = vari
+        # Tyyppi ei vaikuta reitteihin, joten tilannekuvaa ei rakenneta uudelleen
+        self._piirto_versio += 1
+        self._ilmoita("laite_muuttui", nimi, dict(self.verkko.nodes[nimi]))
 
+    @_lukittu
     def poista_laite(self, nimi):
         if nimi not in self.verkko:
             raise ValueError(f"Laitetta '{nimi}' ei löydy.")
+        data = dict(self.verkko.nodes[nimi])
+        yhteydet = [(nimi, naapuri, dict(tiedot)) for naapuri, tiedot in self.verkko.adj[nimi].items()]
         self.verkko.remove_node(nimi)
-        self._paivita_pos_cache()
-
-    def lisaa_yhteys(self, laite1, laite2, viive_ms=10.0, loss=0.0):
+        self._unohda_alhaalla(lambda avain: nimi in avain)
+        self._alhaalla_laitteet.discard(nimi)
+        tunniste = self._tunniste(nimi)
+        self._mitatoi_puut(
+            lambda lahde, puu: tunniste >= 0 and (lahde == tunniste or self._edeltaja(puu, tunniste) >= 0)
+        )
+        if self._pos_cache is not None:
+            self._pos_cache.pop(nimi, None)
+        self._asettelemattomat.discard(nimi)
+        for laite1, laite2, tiedot in yhteydet:
+            self._ilmoita("yhteys_poistettu", (laite1, laite2), tiedot)
+        self._ilmoita("laite_poistettu", nimi, data)
+
+    @staticmethod
+    def _tarkista_kapasiteetti(kaista_mbps, puskuri):
+        """Yhteyden kaista- ja puskuriattribuutit; None = rajaton."""
+        try:
+            kaista_mbps = None if kaista_mbps is None else float(kaista_mbps)
+            puskuri_f = None if puskuri is None else float(puskuri)
+        except (TypeError, ValueError):
+            raise ValueError("Kaistan ja puskurin tulee olla numeroita.")
+        tiedot = {}
+        if kaista_mbps is not None:
+            if not 0 < kaista_mbps < float("inf"):
+                raise ValueError("Kaistan on oltava positiivinen luku.")
+            tiedot["kaista"] = kaista_mbps
+        if puskuri_f is not None:
+            if not 0 <= puskuri_f < float("inf") or puskuri_f != int(puskuri_f):
+                raise ValueError("Puskurin koon on oltava ei-negatiivinen kokonaisluku (paketteja).")
+            tiedot["puskuri"] = int(puskuri_f)
+        return tiedot
+
+    @_lukittu
+    def lisaa_yhteys(self, laite1, laite2, viive_ms=10.0, loss=0.0, kaista_mbps=None, puskuri=None):
+        """Lisää yhteyden; kaista_mbps ja puskuri (paketteja) ovat valinnaisia (ks. jonomalli)."""
         if laite1 == laite2:
             raise ValueError("Laite ei voi olla yhteydessä itseensä.")
         if laite1 not in self.verkko or laite2 not in self.verkko:
@@ -60,20 +465,58 @@ class Verkkosimulaattori:
         loss = float(loss)
         if loss < 0.0 or loss > 1.0:
             raise ValueError("Häviön on oltava välillä 0.0 - 1.0.")
-        self.verkko.add_edge(laite1, laite2, weight=float(viive_ms), loss=loss)
-        self._paivita_pos_cache()
+        viive_ms = float(viive_ms)
+        kapasiteetti = self._tarkista_kapasiteetti(kaista_mbps, puskuri)
+        # Uusi yhteys korvaa samojen laitteiden välisen alhaalla olevan yhteyden
+        self._unohda_alhaalla(lambda avain: avain == frozenset((laite1, laite2)))
+        olemassa = self.verkko.has_edge(laite1, laite2)
+        if olemassa:
+            # Olemassa olevan yhteyden korvaaminen voi myös pidentää viivettä
+            self._mitatoi_puut(lambda lahde, puu: True)
+            self.verkko[laite1][laite2].pop("kaista", None)
+            self.verkko[laite1][laite2].pop("puskuri", None)
+        else:
+            self._mitatoi_puut(lambda lahde, puu: self._lyhentaa_reitteja(puu, laite1, laite2, viive_ms))
+        self.verkko.add_edge(laite1, laite2, weight=viive_ms, loss=loss, **kapasiteetti)
+        self._paivita_jonoarvio()
+        self._ilmoita_yhteys("yhteys_muuttui" if olemassa else "yhteys_lisatty", laite1, laite2)
 
+    @_lukittu
     def poista_yhteys(self, laite1, laite2):
+        """Poistaa yhteyden; myös alhaalla oleva yhteys poistuu pysyvästi.
+
+        Alhaalla oleva yhteys on jo poissa verkosta ja reiteistä, joten sen
+        poisto vain unohtaa tallessa olevat tiedot. Muutostapahtuma
+        yhteys_poistettu ilmoitetaan kummassakin tapauksessa.
+        """
+        tieto = self._alhaalla_yhteydet.pop(frozenset((laite1, laite2)), None)
+        if tieto is not None:
+            self._ilmoita("yhteys_poistettu", (tieto["laite1"], tieto["laite2"]), dict(tieto["data"]))
+            return
         if not self.verkko.has_edge(laite1, laite2):
             raise ValueError(f"Yhteyttä {laite1} <--> {laite2} ei ole.")
+        data = dict(self.verkko[laite1][laite2])
         self.verkko.remove_edge(laite1, laite2)
-        self._paivita_pos_cache()
+        self._mitatoi_puut(lambda lahde, puu: self._kayttaa_reunaa(puu, laite1, laite2))
+        self._ilmoita("yhteys_poistettu", (laite1, laite2), data)
 
+    @_lukittu
     def muuta_yhteyden_viivetta(self, laite1, laite2, uusi_viive_ms):
         if not self.verkko.has_edge(laite1, laite2):
             raise ValueError(f"Yhteyttä {laite1} <--> {laite2} ei ole.")
-        self.verkko[laite1][laite2]["weight"] = float(uusi_viive_ms)
+        uusi_viive_ms = float(uusi_viive_ms)
+        vanha_viive = self.verkko[laite1][laite2].get("weight", 0.0)
+        if uusi_viive_ms > vanha_viive:
+            self._mitatoi_puut(lambda lahde, puu: self._kayttaa_reunaa(puu, laite1, laite2))
+        elif uusi_viive_ms < vanha_viive:
+            self._mitatoi_puut(
+                lambda lahde, puu: self._kayttaa_reunaa(puu, laite1, laite2)
+                or self._lyhentaa_reitteja(puu, laite1, laite2, uusi_viive_ms)
+            )
+        self.verkko[laite1][laite2]["weight"] = uusi_viive_ms
+        self._ilmoita_yhteys("yhteys_muuttui", laite1, laite2)
 
+    @_lukittu
     def muuta_yhteyden_havio(self, laite1, laite2, loss):
         if not self.verkko.has_edge(laite1, laite2):
             raise ValueError(f"Yhteyttä {laite1} <--> {laite2} ei ole.")
@@ -81,6 +524,209 @@ class Verkkosimulaattori:
         if loss < 0.0 or loss > 1.0:
             raise ValueError("Häviön on oltava välillä 0.0 - 1.0.")
         self.verkko[laite1][laite2]["loss"] = loss
+        self._topologia_versio += 1
+        self._ilmoita_yhteys("yhteys_muuttui", laite1, laite2)
+
+    @_lukittu
+    def muuta_yhteyden_kapasiteettia(self, laite1, laite2, kaista_mbps=None, puskuri=None):
+        """Asettaa yhteyden kaistan (Mbit/s) ja puskurin (paketteja); None = rajaton.
+
+        Kapasiteetti ei vaikuta reititykseen, mutta voimassa oleva jonoarvio
+        lasketaan uudelleen.
+        """
+        if not self.verkko.has_edge(laite1, laite2):
+            raise ValueError(f"Yhteyttä {laite1} <--> {laite2} ei ole.")
+        kapasiteetti = self._tarkista_kapasiteetti(kaista_mbps, puskuri)
+        data = self.verkko[laite1][laite2]
+        data.pop("kaista", None)
+        data.pop("puskuri", None)
+        data.update(kapasiteetti)
+        self._paivita_jonoarvio()
+        self._ilmoita_yhteys("yhteys_muuttui", laite1, laite2)
+
+    # --- Vikatilanteet: yhteydet ja laitteet alas ja ylös ---
+
+    def _unohda_alhaalla(self, ehto):
+        for avain in [a for a in self._alhaalla_yhteydet if ehto(a)]:
+            del self._alhaalla_yhteydet[avain]
+
+    def _vie_alas(self, laite1, laite2, syy):
+        """Siirtää yhteyden verkosta talteen; palauttaa (laite1, laite2), jos se oli ylhäällä."""
+        avain = frozenset((laite1, laite2))
+        tieto = self._alhaalla_yhteydet.get(avain)
+        if tieto is not None:
+            tieto["syyt"].add(syy)
+            return None
+        data = dict(self.verkko[laite1][laite2])
+        self.verkko.remove_edge(laite1, laite2)
+        self._alhaalla_yhteydet[avain] = {"laite1": laite1, "laite2": laite2, "data": data, "syyt": {syy}}
+        self._ilmoita("yhteys_poistettu", (laite1, laite2), dict(data))
+        return laite1, laite2
+
+    def _tuo_ylos(self, avain, syy):
+        """Poistaa syyn; palauttaa (laite1, laite2, viive), jos yhteys palasi verkkoon."""
+        tieto = self._alhaalla_yhteydet[avain]
+        tieto["syyt"].discard(syy)
+        if tieto["syyt"]:
+            return None
+        del self._alhaalla_yhteydet[avain]
+        self.verkko.add_edge(tieto["laite1"], tieto["laite2"], **tieto["data"])
+        self._ilmoita("yhteys_lisatty", (tieto["laite1"], tieto["laite2"]), dict(tieto["data"]))
+        return tieto["laite1"], tieto["laite2"], tieto["data"].get("weight", 0.0)
+
+    def _korjaa_reitit(self, alas, ylos):
+        """Päivittää tilannekuvan ja reittipuut yhteyksien tilamuutosten jälkeen.
+
+        Jos tilannekuva on ajan tasalla, siitä johdetaan uusi (alas = ääretön
+        viive) ja jokainen puu korjataan vain muuttuneiden linkkien osalta.
+        Muuten tilannekuva rakennetaan joka tapauksessa uudelleen, joten
+        puut mitätöidään kuten poista_yhteys ja lisaa_yhteys tekevät.
+        Palauttaa (korjatut puut, muuttuneet solmut, mitätöidyt puut).
+        """
+        kuva = self._tilannekuva
+        muutokset = {}
+        idt_alas = []
+        idt_ylos = []
+        if kuva is not None and kuva.versio == self._topologia_versio:
+            try:
+                for laite1, laite2 in alas:
+                    u, v = kuva.tunnisteet[laite1], kuva.tunnisteet[laite2]
+                    muutokset[kuva.reuna(u, v)] = muutokset[kuva.reuna(v, u)] = float("inf")
+                    idt_alas.append((u, v))
+                for laite1, laite2, viive in ylos:
+                    u, v = kuva.tunnisteet[laite1], kuva.tunnisteet[laite2]
+                    muutokset[kuva.reuna(u, v)] = muutokset[kuva.reuna(v, u)] = viive
+                    idt_ylos.append((u, v, viive))
+            except (KeyError, RuntimeError):
+                # Yhteys puuttuu tilannekuvasta (rakennettu sen ollessa alhaalla)
+                kuva = None
+        else:
+            kuva = None
+
+        if kuva is None:
+            ennen = len(self._reittipuut)
+            for laite1, laite2 in alas:
+                self._mitatoi_puut(lambda lahde, puu, a=laite1, b=laite2: self._kayttaa_reunaa(puu, a, b))
+            for laite1, laite2, viive in ylos:
+                self._mitatoi_puut(
+                    lambda lahde, puu, a=laite1, b=laite2, w=viive: self._lyhentaa_reitteja(puu, a, b, w)
+                )
+            return 0, 0, ennen - len(self._reittipuut)
+
+        self._topologia_versio += 1
+        kuva = self._tilannekuva = kuva.johda(self._topologia_versio, muutokset)
+        korjatut = solmuja = 0
+        for puu in self._reittipuut.values():
+            muuttuneet = 0
+            for u, v in idt_alas:
+                muuttuneet += kuva.korjaa_pidennys(puu, u, v)
+            for u, v, viive in idt_ylos:
+                muuttuneet += kuva.korjaa_lyhennys(puu, u, v, viive)
+            if muuttuneet:
+                korjatut += 1
+                solmuja += muuttuneet
+        return korjatut, solmuja, 0
+
+    def _kirjaa_tilamuutos(self, tapahtuma, kohde, aika_ms, alas, ylos, pudotetut=()):
+        alku = time.perf_counter()
+        for lahde in pudotetut:
+            self._reittipuut.pop(lahde, None)
+        korjatut, solmuja, mitatoidyt = self._korjaa_reitit(alas, ylos)
+        kesto = time.perf_counter() - alku
+        if self.instrumentointi is not None:
+            self.instrumentointi.kirjaa("konvergenssi", kesto)
+        merkinta = {
+            "aika": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "aika_ms": aika_ms,
+            "tapahtuma": tapahtuma,
+            "kohde": kohde,
+            "yhteyksia_alas": len(alas),
+            "yhteyksia_ylos": len(ylos),
+            "korjatut_puut": korjatut,
+            "muuttuneet_solmut": solmuja,
+            "mitatoidyt_puut": mitatoidyt + len(pudotetut),
+            "konvergenssi_ms": kesto * 1000.0,
+        }
+        self._tapahtumaloki.append(merkinta)
+        return merkinta
+
+    @_lukittu
+    def yhteys_alas(self, laite1, laite2, aika_ms=None):
+        """Ottaa yhteyden pois käytöstä (vika).
+
+        Yhteys poistuu verkosta, mutta sen tiedot säilyvät ylösottoa varten.
+        Reittipuut korjataan inkrementaalisesti ja tapahtuma kirjataan
+        tapahtumalokiin (aika_ms esim. Tapahtumamoottorin kello). Palauttaa
+        lokimerkinnän tai None, jos yhteys oli jo alhaalla.
+        """
+        tieto = self._alhaalla_yhteydet.get(frozenset((laite1, laite2)))
+        if tieto is None and not self.verkko.has_edge(laite1, laite2):
+            raise ValueError(f"Yhteyttä {laite1} <--> {laite2} ei ole.")
+        if tieto is not None and "yhteys" in tieto["syyt"]:
+            return None
+        alas = [y for y in [self._vie_alas(laite1, laite2, "yhteys")] if y is not None]
+        return self._kirjaa_tilamuutos("yhteys_alas", f"{laite1} <--> {laite2}", aika_ms, alas, [])
+
+    @_lukittu
+    def yhteys_ylos(self, laite1, laite2, aika_ms=None):
+        """Palauttaa alas otetun yhteyden, ellei sen päätelaite ole alhaalla."""
+        avain = frozenset((laite1, laite2))
+        tieto = self._alhaalla_yhteydet.get(avain)
+        if tieto is None:
+            if self.verkko.has_edge(laite1, laite2):
+                return None
+            raise ValueError(f"Yhteyttä {laite1} <--> {laite2} ei ole.")
+        if "yhteys" not in tieto["syyt"]:
+            return None
+        ylos = [y for y in [self._tuo_ylos(avain, "yhteys")] if y is not None]
+        return self._kirjaa_tilamuutos("yhteys_ylos", f"{laite1} <--> {laite2}", aika_ms, [], ylos)
+
+    @_lukittu
+    def laite_alas(self, nimi, aika_ms=None):
+        """Ottaa laitteen kaikki yhteydet pois käytöstä; laite itse jää verkkoon."""
+        if nimi not in self.verkko:
+            raise ValueError(f"Laitetta '{nimi}' ei löydy.")
+        if nimi in self._alhaalla_laitteet:
+            return None
+        self._alhaalla_laitteet.add(nimi)
+        syy = ("laite", nimi)
+        for avain, tieto in self._alhaalla_yhteydet.items():
+            if nimi in avain:
+                tieto["syyt"].add(syy)
+        alas = [self._vie_alas(nimi, naapuri, syy) for naapuri in list(self.verkko.adj[nimi])]
+        # Laitteen omasta puusta ei jäisi mitään jäljelle
+        kuva = self._tilannekuva
+        pudotetut = [kuva.tunnisteet[nimi]] if kuva is not None and nimi in kuva.tunnisteet else []
+        return self._kirjaa_tilamuutos("laite_alas", nimi, aika_ms, alas, [], pudotetut)
+
+    @_lukittu
+    def laite_ylos(self, nimi, aika_ms=None):
+        """Palauttaa laitteen yhteydet, jotka eivät ole alhaalla muusta syystä."""
+        if nimi not in self.verkko:
+            raise ValueError(f"Laitetta '{nimi}' ei löydy.")
+        if nimi not in self._alhaalla_laitteet:
+            return None
+        self._alhaalla_laitteet.discard(nimi)
+        syy = ("laite", nimi)
+        ylos = []
+        for avain in [a for a, t in self._alhaalla_yhteydet.items() if syy in t["syyt"]]:
+            yhteys = self._tuo_ylos(avain, syy)
+            if yhteys is not None:
+                ylos.append(yhteys)
+        return self._kirjaa_tilamuutos("laite_ylos", nimi, aika_ms, [], ylos)
+
+    @_lukittu
+    def hae_alhaalla(self):
+        """Alhaalla olevat laitteet ja yhteydet (laite1, laite2)."""
+        return {
+            "laitteet": sorted(self._alhaalla_laitteet),
+            "yhteydet": [(t["laite1"], t["laite2"]) for t in self._alhaalla_yhteydet.values()],
+        }
+
+    def hae_tapahtumaloki(self):
+        """Vikatapahtumat ja niiden konvergenssi (enintään TAPAHTUMALOKIN_KOKO uusinta)."""
+        with self._lukko:
+            return list(self._tapahtumaloki)
 
     # --- Simulaation asetukset ---
 
@@ -92,6 +738,50 @@ class Verkkosimulaattori:
         self.jitter_min = min_arvo
         self.jitter_max = max_arvo
 
+    def aseta_siemen(self, siemen):
+        self._rng.seed(siemen)
+        self._np_rng = np.random.default_rng(siemen)
+
+    @_lukittu
+    def aseta_reititys(self, tila, k_polkuja=None, havion_paino=None):
+        """Valitsee oletusreitityksen (laheta_viesti/laheta_viestit voivat ohittaa sen).
+
+        lyhin: yksi lyhin polku viiveellä mitattuna. ecmp: kaikki yhtä
+        lyhyet polut (enintään ECMP_LEVEYS), valinta vuokohtaisella
+        tiivisteellä. k_lyhimmat: k_polkuja lyhintä polkua, joille kuorma
+        jaetaan hintojen käänteislukujen suhteessa. haviotietoinen: linkin
+        hinta on viive + havion_paino * -ln(1 - häviö).
+        """
+        tila = self._tarkista_reititystila(tila)
+        k_polkuja = self.k_polkuja if k_polkuja is None else int(k_polkuja)
+        if k_polkuja < 1:
+            raise ValueError("Polkuja on oltava vähintään yksi.")
+        havion_paino = self.havion_paino if havion_paino is None else float(havion_paino)
+        if havion_paino < 0:
+            raise ValueError("Häviön paino ei voi olla negatiivinen.")
+        self.reititystila = tila
+        self.k_polkuja = k_polkuja
+        self.havion_paino = havion_paino
+        self._polkujoukot.clear()
+        self._haviopuut.clear()
+        self._haviopainot = None
+
+    @_lukittu
+    def aseta_jonomalli(self, malli, pakettikoko=None):
+        """Ottaa linkkien jonomallin käyttöön ("mm1" tai "md1") tai pois (None).
+
+        pakettikoko (tavua) määrää lähetysajan kaistalla ja siten
+        palvelunopeuden. Voimassa oleva jonoarvio lasketaan uudelleen.
+        """
+        if malli is not None and malli not in JONOMALLIT:
+            raise ValueError(f"Tuntematon jonomalli '{malli}' (vaihtoehdot: {', '.join(JONOMALLIT)}).")
+        pakettikoko = self.pakettikoko if pakettikoko is None else int(pakettikoko)
+        if pakettikoko <= 0:
+            raise ValueError("Pakettikoon on oltava positiivinen.")
+        self.jonomalli = malli
+        self.pakettikoko = pakettikoko
+        self._paivita_jonoarvio()
+
     def aseta_nukkumisaika(self, sekunnit):
         sekunnit = float(sekunnit)
         if sekunnit < 0:
@@ -100,123 +790,832 @@ class Verkkosimulaattori:
 
     # --- Tiedot ---
 
+    @_lukittu
+    def hae_sijainnit(self):
+        """Palauttaa piirtosijainnit; uudet laitteet sijoitetaan naapuriensa viereen."""
+        if self._pos_cache is not None and not self._asettelemattomat:
+            return self._pos_cache
+        mittari = self.instrumentointi
+        alku = time.perf_counter() if mittari is not None else 0.0
+        if self._pos_cache is None:
+            self._paivita_pos_cache()
+        else:
+            uudet = list(self._asettelemattomat)
+            self._asettelemattomat.clear()
+            self._asettele_uudet(uudet)
+        if mittari is not None:
+            mittari.kirjaa("asettelu", time.perf_counter() - alku)
+        return self._pos_cache
+
+    @_lukittu
+    def asettele_uudelleen(self):
+        """Laskee koko asettelun uudelleen vanhoista sijainneista lähtien."""
+        mittari = self.instrumentointi
+        alku = time.perf_counter() if mittari is not None else 0.0
+        self._paivita_pos_cache()
+        if mittari is not None:
+            mittari.kirjaa("asettelu", time.perf_counter() - alku)
+        return self._pos_cache
+
+    @_lukittu
     def hae_laitteet(self):
         return list(self.verkko.nodes(data=True))
 
+    @_lukittu
     def hae_yhteydet(self):
         return list(self.verkko.edges(data=True))
 
     def hae_pakettiloki(self):
-        return list(self.pakettiloki)
+        return self.pakettiloki.nakyma()
 
-    def hae_tilastot(self):
-        maara = len(self.pakettiloki)
-        if maara == 0:
-            return {
-                "maara": 0,
-                "onnistuneet": 0,
-                "epaonnistuneet": 0,
-                "keskiviive": None,
-                "min_viive": None,
-                "max_viive": None,
-            }
-        onnistuneet = sum(1 for m in self.pakettiloki if m.get("onnistui", True))
-        epaonnistuneet = maara - onnistuneet
-        viiveet = [m["kokonaisviive_ms"] for m in self.pakettiloki]
-        keskiviive = sum(viiveet) / len(viiveet)
-        min_viive = min(viiveet)
-        max_viive = max(viiveet)
+    @staticmethod
+    def _lokiehdot(lahettaja, vastaanottaja, onnistui, linkki, alkaen, asti):
+        if onnistui is None:
+            tilat = None
+        else:
+            tilat = (TILA_OK,) if onnistui else (TILA_HAVISI, TILA_LINKKI_POISSA, TILA_PUDOTETTU)
+        return {
+            "lahettaja": lahettaja,
+            "vastaanottaja": vastaanottaja,
+            "tilat": tilat,
+            "linkki": None if linkki is None else tuple(linkki),
+            "alkaen": alkaen,
+            "asti": asti,
+        }
+
+    def hae_paketit(self, lahettaja=None, vastaanottaja=None, onnistui=None, linkki=None, alkaen=None,
+                    asti=None, maara=100, jatka=None, uusimmat_ensin=False):
+        """Sivu pakettilokin merkintöjä, jotka täyttävät kaikki annetut ehdot.
+
+        onnistui rajaa perille menneisiin (True) tai epäonnistuneisiin (False),
+        linkki on laitepari, jolla paketti hävisi, ja alkaen/asti kirjausajan
+        rajat time.time()-sekunteina (esim. alkaen=time.time() - 600).
+        Merkinnöissä on järjestysnumero seq; seuraava sivu saadaan antamalla
+        viimeisen merkinnän seq jatka-parametrina. Kysely käyttää lokin
+        indeksejä, joten sen hinta riippuu osumista eikä lokin koosta.
+        """
+        return self.pakettiloki.hae(
+            maara=maara, jatka=jatka, uusimmat_ensin=uusimmat_ensin,
+            **self._lokiehdot(lahettaja, vastaanottaja, onnistui, linkki, alkaen, asti),
+        )
+
+    def laske_paketit(self, lahettaja=None, vastaanottaja=None, onnistui=None, linkki=None, alkaen=None,
+                      asti=None):
+        """Ehtoja (kuten hae_paketit) vastaavien lokimerkintöjen määrä."""
+        return self.pakettiloki.laske(**self._lokiehdot(lahettaja, vastaanottaja, onnistui, linkki, alkaen, asti))
+
+    def kysy_paketit(self, lahettaja=None, vastaanottaja=None, onnistui=None, linkki=None, alkaen=None,
+                     asti=None):
+        """Ehtoja (kuten hae_paketit) vastaavien merkintöjen järjestysnumerot nousevasti.
+
+        Sopii laiskoille näkymille, jotka muodostavat merkinnät vasta luettaessa
+        (pakettiloki.merkinta(seq)).
+        """
+        return self.pakettiloki.kysy(**self._lokiehdot(lahettaja, vastaanottaja, onnistui, linkki, alkaen, asti))
+
+    def hae_reitti(self, lahettaja, vastaanottaja, reititys=None, vuo=None):
+        """Reitti laitenimien listana, jota lähetys käyttäisi (kuten laheta_viesti)."""
+        with self._lukko:
+            if lahettaja not in self.verkko:
+                raise ValueError(f"Lähettäjää '{lahettaja}' ei löydy.")
+            if vastaanottaja not in self.verkko:
+                raise ValueError(f"Vastaanottajaa '{vastaanottaja}' ei löydy.")
+            return self._hae_reitti(lahettaja, vastaanottaja, reititys, vuo)
+
+    def hae_reitityksen_tilastot(self):
         return {
-            "maara": maara,
-            "onnistuneet": onnistuneet,
-            "epaonnistuneet": epaonnistuneet,
-            "keskiviive": keskiviive,
-            "min_viive": min_viive,
-            "max_viive": max_viive,
+            "osumat": self._reitti_osumat,
+            "ohitukset": self._reitti_ohitukset,
+            "reittipuut": len(self._reittipuut),
+            "reititystila": self.reititystila,
+            "polkujoukot": len(self._polkujoukot),
+            "topologia_versio": self._topologia_versio,
         }
 
+    def vie_pakettiloki(self, polku, muoto=None, max_koko=None, max_tiedostot=5):
+        """Alkaa kirjoittaa uusia merkintöjä tiedostoon; palauttaa nielun (sulje())."""
+        return TiedostoNielu(
+            polku, muoto=muoto, max_koko=max_koko, max_tiedostot=max_tiedostot, loki=self.pakettiloki
+        )
+
+    def hae_tilastot(self):
+        """Koosteet kaikista lokin tyhjennyksen jälkeen kirjatuista paketeista.
+
+        Tilastot päivitetään kirjauksen yhteydessä, joten kutsu ei käy lokia
+        läpi; ne kattavat myös rengaspuskurista jo poistuneet merkinnät.
+        """
+        return self.pakettiloki.koosteet()
+
+    def ota_instrumentointi_kayttoon(self, yhteenvetovali=None, kuuntelija=None):
+        """Ottaa vaihekohtaisen ajanoton käyttöön ja palauttaa Instrumentointi-olion.
+
+        Jos yhteenvetovali (s) on annettu, kuuntelija(yhteenveto) kutsutaan
+        määräajoin lähetysten yhteydessä (oletuksena tulostus).
+        """
+        self.instrumentointi = Instrumentointi(yhteenvetovali, kuuntelija)
+        return self.instrumentointi
+
+    def poista_instrumentointi(self):
+        self.instrumentointi = None
+
+    def hae_instrumentointi(self):
+        """Vaiheiden ajat ja laskurit; None, jos instrumentointi ei ole käytössä."""
+        if self.instrumentointi is None:
+            return None
+        return self.instrumentointi.yhteenveto()
+
     # --- Simulaatio ---
 
-    def laheta_viesti(self, lahettaja, vastaanottaja, viesti):
-        if lahettaja not in self.verkko:
-            raise ValueError(f"Lähettäjää '{lahettaja}' ei löydy.")
-        if vastaanottaja not in self.verkko:
-            raise ValueError(f"Vastaanottajaa '{vastaanottaja}' ei löydy.")
+    def _kirjaa_paketti(self, lahettaja, vastaanottaja, viesti, suunniteltu, toteutuneita,
+                        kokonaisviive, tila):
+        return self.pakettiloki.lisaa(
+            lahettaja, vastaanottaja, viesti, suunniteltu, toteutuneita, kokonaisviive, tila
+        )
 
-        try:
-            reitti_suunniteltu = nx.shortest_path(
-                self.verkko,
-                source=lahettaja,
-                target=vastaanottaja,
-                weight="weight",
-            )
-        except nx.NetworkXNoPath:
-            raise RuntimeError(f"Ei yhteyttä laitteiden {lahettaja} ja {vastaanottaja} välillä.")
+    def laheta_viesti(self, lahettaja, vastaanottaja, viesti, hop_kuuntelija=None, reititys=None, vuo=None):
+        """Lähettää viestin ja palauttaa reitin, hyppykohtaiset tiedot ja lokimerkinnän.
+
+        hop_kuuntelija(hop) kutsutaan jokaisen linkin jälkeen ennen
+        nukkumisaikaa, esim. animointia varten. Reitti ja linkkien arvot
+        luetaan lähetyksen alussa, joten verkkoa voi muokata lähetyksen aikana.
+        reititys ohittaa oletustilan (aseta_reititys); vuo on monipolkutiloissa
+        vuon tunniste, jonka paketit kulkevat samaa polkua.
+        """
+        mittari = self.instrumentointi
+        if mittari is not None:
+            alku = time.perf_counter()
+        with self._lukko:
+            tila = self._tarkista_reititystila(reititys)
+            if lahettaja not in self.verkko:
+                raise ValueError(f"Lähettäjää '{lahettaja}' ei löydy.")
+            if vastaanottaja not in self.verkko:
+                raise ValueError(f"Vastaanottajaa '{vastaanottaja}' ei löydy.")
+
+            kuva = self._hae_tilannekuva()
+            idt = self._valitse_reitti(kuva, kuva.tunnisteet[lahettaja], kuva.tunnisteet[vastaanottaja], tila, vuo)
+            reitti_suunniteltu = [kuva.nimet[i] for i in idt]
+            linkit = kuva.linkit(idt)
+            jonot = self._jonot
+        if mittari is not None:
+            hopit_alku = time.perf_counter()
+            mittari.kirjaa("reitti", hopit_alku - alku)
+            nukuttu = 0.0
 
         kokonaisviive = 0.0
         hopit = []
         kaytetty_reitti = [reitti_suunniteltu[0]]
         onnistui = True
         syy = ""
+        tila = TILA_OK
 
         for i in range(len(reitti_suunniteltu) - 1):
             nykyinen = reitti_suunniteltu[i]
             seuraava = reitti_suunniteltu[i + 1]
-            edge_data = self.verkko[nykyinen][seuraava]
-            viive = edge_data.get("weight", 0.0)
-            loss_prob = edge_data.get("loss", 0.0)
+            viive, loss_prob = linkit[i]
 
-            jitter = random.uniform(self.jitter_min, self.jitter_max)
+            jitter = self._rng.uniform(self.jitter_min, self.jitter_max)
             todellinen_viive = viive * jitter
-            kokonaisviive += todellinen_viive
 
-            lost = random.random() < loss_prob
+            lost = self._rng.random() < loss_prob
+            jonoviive, pudotus = jonot.get((nykyinen, seuraava), _EI_JONOA) if jonot else _EI_JONOA
+            pudotettu = not lost and pudotus > 0.0 and self._rng.random() < pudotus
+            todellinen_viive += jonoviive
+            kokonaisviive += todellinen_viive
 
-            hopit.append(
-                {
-                    "lahto": nykyinen,
-                    "kohde": seuraava,
-                    "nimellinen_viive_ms": viive,
-                    "jitter_kerroin": jitter,
-                    "todellinen_viive_ms": todellinen_viive,
-                    "loss_prob": loss_prob,
-                    "lost": lost,
-                }
-            )
+            hop = {
+                "lahto": nykyinen,
+                "kohde": seuraava,
+                "nimellinen_viive_ms": viive,
+                "jitter_kerroin": jitter,
+                "jonoviive_ms": jonoviive,
+                "todellinen_viive_ms": todellinen_viive,
+                "loss_prob": loss_prob,
+                "lost": lost or pudotettu,
+            }
+            hopit.append(hop)
+            if hop_kuuntelija is not None:
+                hop_kuuntelija(hop)
 
             if lost:
                 onnistui = False
+                tila = TILA_HAVISI
                 syy = f"Paketti hävisi linkillä {nykyinen} -> {seuraava}"
                 break
+            if pudotettu:
+                onnistui = False
+                tila = TILA_PUDOTETTU
+                syy = f"Paketti pudotettiin linkillä {nykyinen} -> {seuraava} (puskuri täynnä tai linkki ylikuormitettu)"
+                break
 
             kaytetty_reitti.append(seuraava)
 
+            # Nukkumisaika on pelkkä visualisointia varten tehty hidastus;
+            # simuloitu aika etenee Tapahtumamoottorissa virtuaalikellolla.
             if self.nukkumisaika > 0:
-                time.sleep(self.nukkumisaika)
+                if mittari is not None:
+                    nukkuminen_alku = time.perf_counter()
+                    time.sleep(self.nukkumisaika)
+                    nukuttu += time.perf_counter() - nukkuminen_alku
+                else:
+                    time.sleep(self.nukkumisaika)
+
+        kuorma = self._linkkikuorma
+        with self._lukko:
+            for avain in zip(reitti_suunniteltu, reitti_suunniteltu[1:len(hopit) + 1]):
+                kuorma[avain] = kuorma.get(avain, 0) + 1
+        if mittari is not None:
+            loki_alku = time.perf_counter()
+            mittari.kirjaa("hopit", loki_alku - hopit_alku - nukuttu)
+            if nukuttu:
+                mittari.kirjaa("nukkuminen", nukuttu)
+            mittari.laske("hypyt", len(hopit))
+            if not onnistui:
+                mittari.laske("haviot")
+        seq = self._kirjaa_paketti(
+            lahettaja, vastaanottaja, viesti, reitti_suunniteltu, len(kaytetty_reitti), kokonaisviive, tila,
+        )
+        loki = self.pakettiloki.merkinta(seq)
+        if mittari is not None:
+            mittari.kirjaa("loki", time.perf_counter() - loki_alku)
+            mittari.lahetys_valmis()
 
-        loki = {
-            "aika": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "lahettaja": lahettaja,
-            "vastaanottaja": vastaanottaja,
-            "viesti": viesti,
+        return {
             "reitti_suunniteltu": reitti_suunniteltu,
             "reitti_toteutunut": kaytetty_reitti,
             "kokonaisviive_ms": kokonaisviive,
+            "hopit": hopit,
             "onnistui": onnistui,
             "syy": syy,
+            "loki": loki,
         }
-        self.pakettiloki.append(loki)
+
+    @_lukittu
+    def laheta_viestit(self, parit, viesti="", siemen=None, kirjaa=True, reititys=None):
+        """Lähettää joukon viestejä kerralla ja palauttaa tulokset sarakkeina.
+
+        Jitter ja häviöt arvotaan koko erälle NumPyllä, joten tulokset ovat
+        tilastollisesti samat kuin laheta_viesti-kutsuilla. Nukkumisaikaa ei
+        käytetä. Palautettu havio_hop on -1 perille menneille paketeille.
+        Monipolkutiloissa polku arvotaan pakettikohtaisesti.
+        """
+        parit = [(p[0], p[1]) for p in parit]
+        tila = self._tarkista_reititystila(reititys)
+        rng = self._np_rng if siemen is None else np.random.default_rng(siemen)
+        for lahettaja, vastaanottaja in set(parit):
+            if lahettaja not in self.verkko:
+                raise ValueError(f"Lähettäjää '{lahettaja}' ei löydy.")
+            if vastaanottaja not in self.verkko:
+                raise ValueError(f"Vastaanottajaa '{vastaanottaja}' ei löydy.")
+
+        mittari = self.instrumentointi
+        if mittari is not None:
+            alku = time.perf_counter()
+
+        # Sama reitti lasketaan ja sen linkkitiedot haetaan vain kerran
+        kuva = self._hae_tilannekuva()
+        tunnisteet = kuva.tunnisteet
+        reitti_indeksit = {}
+        reitti_idt = []
+        if tila == "lyhin":
+            avaimet = parit
+            for pari in parit:
+                if pari not in reitti_indeksit:
+                    reitti_indeksit[pari] = len(reitti_idt)
+                    reitti_idt.append(self._hae_reitti_idt(kuva, tunnisteet[pari[0]], tunnisteet[pari[1]]))
+        else:
+            # Avaimena (pari, polun indeksi), jolloin sama polku haetaan vain kerran
+            joukot = {}
+            avaimet = []
+            for pari, arpa in zip(parit, rng.random(len(parit)).tolist()):
+                joukko = joukot.get(pari)
+                if joukko is None:
+                    joukko = joukot[pari] = self._hae_polkujoukko(
+                        kuva, tila, tunnisteet[pari[0]], tunnisteet[pari[1]]
+                    )
+                polut, kumulatiiviset = joukko
+                avain = (pari, bisect.bisect_right(kumulatiiviset, arpa * kumulatiiviset[-1]))
+                avaimet.append(avain)
+                if avain not in reitti_indeksit:
+                    reitti_indeksit[avain] = len(reitti_idt)
+                    reitti_idt.append(polut[avain[1]])
+        reitit = [[kuva.nimet[i] for i in r] for r in reitti_idt]
+
+        hyppyja = np.array([len(r) - 1 for r in reitti_idt], dtype=np.int64)
+        max_hypyt = max(1, int(hyppyja.max())) if reitit else 1
+        reitti_viiveet = np.zeros((len(reitit), max_hypyt))
+        reitti_haviot = np.zeros((len(reitit), max_hypyt))
+        jonot = self._hae_jonotaulukot(kuva)
+        reitti_jonoviiveet = None if jonot is None else np.zeros((len(reitit), max_hypyt))
+        reitti_linkkihaviot = reitti_haviot
+        reunat = None
+        if reitit and hyppyja.any():
+            # Kaikkien reittien linkit haetaan tilannekuvasta yhdellä kertaa
+            lahdot = itertools.chain.from_iterable(r[:-1] for r in reitti_idt)
+            kohteet = itertools.chain.from_iterable(r[1:] for r in reitti_idt)
+            reunat = kuva.reunat(np.fromiter(lahdot, dtype=np.int64), np.fromiter(kohteet, dtype=np.int64))
+            reunarivit = np.repeat(np.arange(len(reitit)), hyppyja)
+            reunasarakkeet = np.arange(len(reunarivit)) - np.repeat(np.cumsum(hyppyja) - hyppyja, hyppyja)
+            reitti_viiveet[reunarivit, reunasarakkeet] = kuva.viiveet[reunat]
+            reitti_haviot[reunarivit, reunasarakkeet] = kuva.haviot[reunat]
+            if jonot is not None:
+                # Täyden puskurin pudotus yhdistetään linkin häviöön: arpa < häviö on
+                # linkin häviö, häviö <= arpa < yhdistetty todennäköisyys pudotus
+                reitti_jonoviiveet[reunarivit, reunasarakkeet] = jonot[0][reunat]
+                reitti_linkkihaviot = reitti_haviot.copy()
+                reitti_haviot[reunarivit, reunasarakkeet] = 1.0 - (1.0 - kuva.haviot[reunat]) * (1.0 - jonot[1][reunat])
+
+        ri = np.fromiter((reitti_indeksit[a] for a in avaimet), dtype=np.int64, count=len(parit))
+        if mittari is not None:
+            hopit_alku = time.perf_counter()
+            mittari.kirjaa("reitti", hopit_alku - alku, len(reitit))
+        kokonaisviiveet = np.empty(len(parit))
+        havio_hopit = np.empty(len(parit), dtype=np.int64)
+        pudotetut = np.zeros(len(parit), dtype=bool)
+        kuljetut_hypyt = np.empty(len(parit), dtype=np.int64)
+        sarakkeet = np.arange(max_hypyt)
+
+        for alku in range(0, len(parit), self.ERAN_KOKO):
+            era = ri[alku:alku + self.ERAN_KOKO]
+            jitter = rng.uniform(self.jitter_min, self.jitter_max, size=(len(era), max_hypyt))
+            arpa = rng.random((len(era), max_hypyt))
+            kelvolliset = sarakkeet < hyppyja[era][:, None]
+            havinneet = (arpa < reitti_haviot[era]) & kelvolliset
+            havisi = havinneet.any(axis=1)
+            havio_hop = np.where(havisi, havinneet.argmax(axis=1), -1)
+            if reitti_jonoviiveet is not None and havisi.any():
+                rivit = np.flatnonzero(havisi)
+                pudotetut[alku + rivit] = (
+                    arpa[rivit, havio_hop[rivit]] >= reitti_linkkihaviot[era[rivit], havio_hop[rivit]]
+                )
+            # Häviölinkin viive lasketaan mukaan kuten skalaaripolussa
+            kuljetut = np.where(havisi, havio_hop + 1, hyppyja[era])
+            kuljettu = sarakkeet < kuljetut[:, None]
+            viiveet = reitti_viiveet[era] * jitter * kuljettu
+            if reitti_jonoviiveet is not None:
+                viiveet += reitti_jonoviiveet[era] * kuljettu
+            kokonaisviiveet[alku:alku + len(era)] = viiveet.sum(axis=1)
+            havio_hopit[alku:alku + len(era)] = havio_hop
+            kuljetut_hypyt[alku:alku + len(era)] = kuljetut
+
+        onnistui = havio_hopit < 0
+        if reunat is not None:
+            # Linkin h tarjottu kuorma: reitin paketit, jotka kulkivat vähintään h + 1 hyppyä
+            leveys = max_hypyt + 1
+            maarat = np.bincount(ri * leveys + kuljetut_hypyt, minlength=len(reitit) * leveys)
+            ohittaneet = maarat.reshape(len(reitit), leveys)[:, ::-1].cumsum(axis=1)[:, ::-1]
+            tarjottu = np.bincount(reunat, weights=ohittaneet[reunarivit, reunasarakkeet + 1], minlength=len(kuva.naapurit))
+            self._kirjaa_linkkikuorma(self._csr_kuorma(kuva, tarjottu.astype(np.int64)))
+        if mittari is not None:
+            loki_alku = time.perf_counter()
+            mittari.kirjaa("hopit", loki_alku - hopit_alku, len(parit))
+            mittari.laske("hypyt", int(hyppyja[ri].sum()))
+            mittari.laske("haviot", int(len(parit) - np.count_nonzero(onnistui)))
+
+        if kirjaa:
+            self.pakettiloki.lisaa_monta(
+                [p[0] for p in parit],
+                [p[1] for p in parit],
+                viesti,
+                [reitit[r] for r in ri.tolist()],
+                np.where(onnistui, hyppyja[ri] + 1, havio_hopit + 1),
+                kokonaisviiveet,
+                np.where(onnistui, TILA_OK, np.where(pudotetut, TILA_PUDOTETTU, TILA_HAVISI)),
+            )
+        if mittari is not None:
+            if kirjaa:
+                mittari.kirjaa("loki", time.perf_counter() - loki_alku, len(parit))
+            mittari.lahetys_valmis(len(parit))
 
         return {
-            "reitti_suunniteltu": reitti_suunniteltu,
-            "reitti_toteutunut": kaytetty_reitti,
-            "kokonaisviive_ms": kokonaisviive,
-            "hopit": hopit,
+            "kokonaisviive_ms": kokonaisviiveet,
             "onnistui": onnistui,
-            "syy": syy,
-            "loki": loki,
+            "havio_hop": havio_hopit,
         }
 
+    # --- Jonomalli: kertynyt kuorma, jonoviiveet ja pudotukset ---
+
+    @staticmethod
+    def _csr_kuorma(kuva, tarjottu):
+        """Tilannekuvan linkeille kohdistuneet paketit [((lahto, kohde), maara), ...]."""
+        kaytetyt = np.flatnonzero(tarjottu)
+        lahdot = np.searchsorted(kuva.indptr, kaytetyt, side="right") - 1
+        nimet = kuva.nimet
+        return [
+            ((nimet[u], nimet[v]), n)
+            for u, v, n in zip(lahdot.tolist(), kuva.naapurit[kaytetyt].tolist(), tarjottu[kaytetyt].tolist())
+        ]
+
+    def _kirjaa_linkkikuorma(self, kuormat):
+        kuorma = self._linkkikuorma
+        for avain, n in kuormat:
+            kuorma[avain] = kuorma.get(avain, 0) + n
+
+    def _laske_jonot(self, jakso_s, lisakuorma=(), kuorma=None):
+        """Laskee jonoarvion kuormasta (oletus: kertynyt) ja ajon omasta kuormasta jakson aikana."""
+        self._jonokuorma = kuorma
+        if kuorma is None:
+            kuorma = self._linkkikuorma
+        if lisakuorma:
+            kuorma = dict(kuorma)
+            for avain, n in lisakuorma:
+                kuorma[avain] = kuorma.get(avain, 0) + n
+        avaimet = []
+        kaistat = []
+        puskurit = []
+        for u, v, data in self.verkko.edges(data=True):
+            kaista = data.get("kaista")
+            if kaista is None:
+                continue
+            for avain in ((u, v), (v, u)):
+                avaimet.append(avain)
+                kaistat.append(kaista)
+                puskurit.append(data.get("puskuri", np.inf))
+        palveluajat = palveluaika_ms(kaistat, self.pakettikoko)
+        nopeudet = np.array([kuorma.get(a, 0) for a in avaimet], dtype=np.float64) / jakso_s
+        kuormitus = nopeudet * palveluajat / 1000.0
+        jonotus, pudotus = arvioi_jonot(kuormitus, np.array(puskurit, dtype=np.float64), self.jonomalli)
+        jonoviiveet = jonotus * palveluajat
+
+        self._jonoarvio = {}
+        self._jonot = {}
+        for avain, kaista, puskuri, nopeus, rho, viive, p in zip(
+            avaimet, kaistat, puskurit, nopeudet.tolist(), kuormitus.tolist(), jonoviiveet.tolist(), pudotus.tolist()
+        ):
+            self._jonoarvio[avain] = {
+                "kaista_mbps": kaista,
+                "puskuri": None if puskuri == np.inf else puskuri,
+                "tarjottu_pps": nopeus,
+                "kayttoaste": rho,
+                "jonoviive_ms": viive,
+                "pudotus": p,
+            }
+            if rho > 0:
+                # Rajattoman puskurin ylikuormitettu jono ei vakiotilassa toimita
+                # mitään, joten lähetyksissä sen paketit eivät pääse perille
+                self._jonot[avain] = (viive, p) if viive != float("inf") else (0.0, 1.0)
+        self._jonojakso_s = jakso_s
+        self._jonot_versio += 1
+
+    def _paivita_jonoarvio(self):
+        """Laskee voimassa olevan arvion uudelleen esim. kapasiteetin muuttuessa."""
+        if self.jonomalli is None:
+            self._jonoarvio = {}
+            self._jonot = {}
+            self._jonojakso_s = None
+            self._jonot_versio += 1
+        elif self._jonojakso_s is not None:
+            self._laske_jonot(self._jonojakso_s, kuorma=self._jonokuorma)
+
+    def _hae_jonotaulukot(self, kuva):
+        """Jonoarvio tilannekuvan linkeille: (jonoviiveet, pudotukset) tai None."""
+        if not self._jonot:
+            return None
+        avain = (kuva.versio, self._jonot_versio)
+        if self._jonotaulukot is not None and self._jonotaulukot[0] == avain:
+            return self._jonotaulukot[1]
+        tunnisteet = kuva.tunnisteet
+        kelvolliset = [
+            (tunnisteet[u], tunnisteet[v], arvo) for (u, v), arvo in self._jonot.items()
+            if self.verkko.has_edge(u, v) and u in tunnisteet and v in tunnisteet
+        ]
+        jonoviiveet = np.zeros(len(kuva.naapurit))
+        pudotukset = np.zeros(len(kuva.naapurit))
+        if kelvolliset:
+            lahdot, kohteet, arvot = zip(*kelvolliset)
+            reunat = kuva.reunat(np.array(lahdot, dtype=np.int64), np.array(kohteet, dtype=np.int64))
+            jonoviiveet[reunat], pudotukset[reunat] = np.array(arvot).T
+        self._jonotaulukot = (avain, (jonoviiveet, pudotukset))
+        return self._jonotaulukot[1]
+
+    @_lukittu
+    def paivita_jonot(self, jakso_s=None, kuorma=None):
+        """Arvioi linkkien jonot lähetysten kerryttämästä kuormasta ja palauttaa hae_jonot().
+
+        Tarjottu nopeus on kertyneet paketit / jakso_s; oletuksena jakso on
+        liikennematriisiajojen yhteenlaskettu kesto. laheta_viesti- ja
+        laheta_viestit-lähetyksillä ei ole kestoa, joten niiden paketit
+        lasketaan samaan jaksoon; jos ne kuvaavat muuta aikaväliä, anna
+        jakso_s ja nollaa kuorma välillä (nollaa_kuorma). kuorma
+        ({(lahto, kohde): paketteja}) korvaa kertyneen kuorman, esim.
+        Tapahtumamoottorin oma kuorma sen kellon jaksolla. Arvio jää
+        voimaan: lähetykset lisäävät linkeille jonoviiveen ja pudottavat
+        paketteja todennäköisyydellä, jolla puskuri on täynnä.
+        """
+        if self.jonomalli is None:
+            raise ValueError("Jonomalli ei ole käytössä (aseta_jonomalli).")
+        jakso_s = self._kuorma_kesto_s if jakso_s is None else float(jakso_s)
+        if not jakso_s > 0:
+            raise ValueError("Kuorman jakso puuttuu: anna jakso_s tai aja liikennematriisi kestolla.")
+        self._laske_jonot(jakso_s, kuorma=None if kuorma is None else dict(kuorma))
+        return self.hae_jonot()
+
+    @_lukittu
+    def hae_jonot(self):
+        """Voimassa oleva jonoarvio kapasiteetillisille linkeille kuormitetuimmasta alkaen."""
+        linkit = [{"lahto": u, "kohde": v, **tiedot} for (u, v), tiedot in self._jonoarvio.items()]
+        linkit.sort(key=lambda linkki: -linkki["kayttoaste"])
+        return linkit
+
+    @_lukittu
+    def hae_linkkikuorma(self):
+        """Kertynyt tarjottu kuorma: {(lahto, kohde): paketteja} ja jakson kesto."""
+        return {"linkit": dict(self._linkkikuorma), "kesto_s": self._kuorma_kesto_s}
+
+    @_lukittu
+    def nollaa_kuorma(self):
+        """Tyhjentää kertyneen kuorman ja jonoarvion."""
+        self._linkkikuorma = {}
+        self._kuorma_kesto_s = 0.0
+        self._jonojakso_s = None
+        self._jonokuorma = None
+        self._jonoarvio = {}
+        self._jonot = {}
+        self._jonot_versio += 1
+
+    # --- Liikennematriisit ---
+
+    def _linkkiarvot(self, kuva):
+        """Linkkien viiveet, häviöt (täyden puskurin pudotukset mukaan lukien) ja jonoviiveet."""
+        jonot = self._hae_jonotaulukot(kuva)
+        if jonot is None:
+            return kuva.viiveet, kuva.haviot, None
+        return kuva.viiveet, 1.0 - (1.0 - kuva.haviot) * (1.0 - jonot[1]), jonot[0]
+
+    @staticmethod
+    def _puun_polut(kuva, puu, lahde, kohteet):
+        """Polut lähteen puusta kaikkiin kohteisiin kerralla (CSR-linkkien indekseinä).
+
+        Palauttaa (linkit, hyppyja, saavutettavat): linkit[r, h] on
+        saavutettavan kohteen r polun h:s linkki lähteestä lukien.
+        """
+        edeltajat = np.frombuffer(puu[0], dtype=np.int32).astype(np.int64)
+        saavutettavat = kohteet < len(edeltajat)
+        saavutettavat[saavutettavat] = edeltajat[kohteet[saavutettavat]] >= 0
+        # Jokaisen puun solmun saapuva linkki haetaan kerralla
+        solmut = np.flatnonzero(edeltajat >= 0)
+        saapuvat = np.zeros(len(edeltajat), dtype=np.int64)
+        saapuvat[solmut] = kuva.reunat(edeltajat[solmut], solmut)
+        nykyiset = kohteet[saavutettavat]
+        rivit = np.arange(len(nykyiset))
+        # Kuljetaan kaikkia polkuja yhtä aikaa kohteesta kohti lähdettä
+        tasot = []
+        while len(nykyiset):
+            seuraavat = edeltajat[nykyiset]
+            tasot.append((rivit, saapuvat[nykyiset]))
+            jatkuu = seuraavat != lahde
+            rivit = rivit[jatkuu]
+            nykyiset = seuraavat[jatkuu]
+        hyppyja = np.zeros(np.count_nonzero(saavutettavat), dtype=np.int64)
+        for rivit, _ in tasot:
+            hyppyja[rivit] += 1
+        linkit = np.zeros((len(hyppyja), len(tasot)), dtype=np.int64)
+        for k, (rivit, reunat) in enumerate(tasot):
+            linkit[rivit, hyppyja[rivit] - 1 - k] = reunat
+        return linkit, hyppyja, saavutettavat
+
+    def _kuormita(self, linkkiarvot, lohkot, rng, naytteita, tiheys, tarjottu, haviot, tilasto):
+        """Ajaa polkuryhmät: häviöt binomijakaumasta hyppy kerrallaan, viiveet näytteistäen.
+
+        linkkiarvot on (viiveet, häviöt, jonoviiveet tai None) linkeittäin.
+        """
+        linkkiviiveet, linkkihaviot, jonoviiveet = linkkiarvot
+        leveys = max(l.shape[1] for l, _, _ in lohkot)
+        linkit = np.zeros((sum(len(h) for _, h, _ in lohkot), leveys), dtype=np.int64)
+        alku = 0
+        for l, _, _ in lohkot:
+            linkit[alku:alku + len(l), :l.shape[1]] = l
+            alku += len(l)
+        hyppyja = np.concatenate([h for _, h, _ in lohkot])
+        elossa = np.concatenate([m for _, _, m in lohkot])
+        sarakkeet = np.arange(leveys)
+        kelvolliset = sarakkeet < hyppyja[:, None]
+        havinneet = np.zeros(linkit.shape, dtype=np.int64)
+        for h in range(leveys):
+            k = kelvolliset[:, h]
+            reunat = linkit[k, h]
+            tarjottu += np.bincount(reunat, weights=elossa[k], minlength=len(tarjottu)).astype(np.int64)
+            menetetyt = rng.binomial(elossa[k], linkkihaviot[reunat])
+            haviot += np.bincount(reunat, weights=menetetyt, minlength=len(haviot)).astype(np.int64)
+            havinneet[k, h] = menetetyt
+            elossa[k] -= menetetyt
+
+        # Lopputulosluokat: perillä (kaikki hypyt) tai hävisi hypyllä h (h + 1 hyppyä).
+        # Luokka saa pakettimääräänsä verrannollisen määrän viivenäytteitä
+        # (vähintään yksi, enintään naytteita), ja näytteet edustavat luokan
+        # paketteja tasan jaettuina painoina.
+        perilla = np.flatnonzero(elossa)
+        havio_rivit, havio_hopit = np.nonzero(havinneet)
+        rivit = np.concatenate([perilla, havio_rivit])
+        kulkee = np.concatenate([hyppyja[perilla], havio_hopit + 1])
+        maarat = np.concatenate([elossa[perilla], havinneet[havio_rivit, havio_hopit]])
+        k = np.minimum(maarat, np.clip(np.ceil(maarat * tiheys), 1, naytteita).astype(np.int64))
+        sija = np.arange(k.sum()) - np.repeat(np.cumsum(k) - k, k)
+        maarat_n = np.repeat(maarat, k)
+        k_n = np.repeat(k, k)
+        painot = maarat_n // k_n + (sija < maarat_n % k_n)
+        # Järjestys hyppymäärän mukaan, jotta palat ovat vain tarvittavan levyisiä
+        jarjestys = np.argsort(np.repeat(kulkee, k), kind="stable")
+        rivit = np.repeat(rivit, k)[jarjestys]
+        kulkee = np.repeat(kulkee, k)[jarjestys]
+        painot = painot[jarjestys]
+        viiveet = np.where(kelvolliset, linkkiviiveet[linkit], 0.0)
+        if jonoviiveet is not None:
+            jonot = np.where(kelvolliset, jonoviiveet[linkit], 0.0)
+        kokonaisviiveet = np.empty(len(rivit))
+        pala = max(1, self.KUORMAN_LOHKO // leveys)
+        for a in range(0, len(rivit), pala):
+            b = min(a + pala, len(rivit))
+            w = int(kulkee[b - 1])
+            jitter = rng.uniform(self.jitter_min, self.jitter_max, size=(b - a, w))
+            kuljetut = sarakkeet[:w] < kulkee[a:b, None]
+            kokonaisviiveet[a:b] = (viiveet[rivit[a:b], :w] * jitter * kuljetut).sum(axis=1)
+            if jonoviiveet is not None:
+                kokonaisviiveet[a:b] += (jonot[rivit[a:b], :w] * kuljetut).sum(axis=1)
+        tilasto.lisaa_painotettu(kokonaisviiveet, painot, int(elossa.sum()))
+
+    @_lukittu
+    def laheta_liikennematriisi(self, matriisi, kesto_s=None, siemen=None, reititys=None, naytteita=64):
+        """Ajaa liikennematriisin (traffic_matrix.Liikennematriisi) yhtenä kuormana.
+
+        Arvot ovat pakettimääriä; murto-osat pyöristetään satunnaisesti ylös
+        tai alas niin, että odotusarvo säilyy (pieniäkään soluja ei pudoteta
+        pois). Jos kesto_s on annettu, arvot ovat nopeuksia (pakettia/s) ja
+        määrät arvotaan Poisson-jakaumasta.
+        Saman polun paketit käsitellään yhtenä ryhmänä, joten ajoaika ei
+        riipu pakettien määrästä. Viivejakauma näytteistetään: jokainen
+        lopputulos (perillä / hävisi hypyllä h) saa pakettimääräänsä
+        suhteutettuna 1..naytteita näytettä. Tulokset eivät mene pakettilokiin.
+
+        Ajon tarjottu kuorma lisätään kertyneeseen kuormaan. Jos jonomalli on
+        käytössä ja kesto_s annettu, jonoarvio lasketaan ennen häviöiden
+        arvontaa ajon omalla kuormalla mukaan lukien, joten viiveet kasvavat
+        kuorman myötä. Palauttaa Kuormatulos-olion.
+        """
+        tila = self._tarkista_reititystila(reititys)
+        naytteita = int(naytteita)
+        if naytteita < 1:
+            raise ValueError("Näytteitä on oltava vähintään yksi.")
+        for nimi in matriisi.nimet:
+            if nimi not in self.verkko:
+                raise ValueError(f"Laitetta '{nimi}' ei löydy.")
+        rng = self._np_rng if siemen is None else np.random.default_rng(siemen)
+        maarat = matriisi.maarat.copy()
+        np.fill_diagonal(maarat, 0.0)
+        if kesto_s is not None:
+            kesto_s = float(kesto_s)
+            if kesto_s <= 0:
+                raise ValueError("Keston on oltava positiivinen.")
+            maarat = rng.poisson(maarat * kesto_s)
+        else:
+            kokonaiset = np.floor(maarat)
+            murto = maarat - kokonaiset
+            if murto.any():
+                maarat = kokonaiset + (rng.random(murto.shape) < murto)
+        maarat = maarat.astype(np.int64)
+        tiheys = self.KUORMAN_NAYTTEET / max(int(maarat.sum()), 1)
+
+        mittari = self.instrumentointi
+        if mittari is not None:
+            alku = time.perf_counter()
+            reitti_aika = 0.0
+        kuva = self._hae_tilannekuva()
+        idt = np.array([kuva.tunnisteet[n] for n in matriisi.nimet], dtype=np.int64)
+        tarjottu = np.zeros(len(kuva.naapurit), dtype=np.int64)
+        haviot = np.zeros(len(kuva.naapurit), dtype=np.int64)
+        tilasto = Viivetilasto()
+        reitittomat = 0
+        lohkot = []
+        solut = 0
+        # Ajon oma jonoarvio vaatii koko kuorman ennen ensimmäistä lohkoa
+        jonottaa = self.jonomalli is not None and kesto_s is not None
+        if not jonottaa:
+            linkkiarvot = self._linkkiarvot(kuva)
+
+        for i in np.flatnonzero(maarat.any(axis=1)).tolist():
+            if mittari is not None:
+                reitti_alku = time.perf_counter()
+            lahde = int(idt[i])
+            sarakkeet = np.flatnonzero(maarat[i])
+            kohteet = idt[sarakkeet]
+            maara = maarat[i, sarakkeet]
+            if tila in ("lyhin", "haviotietoinen"):
+                if tila == "lyhin":
+                    puu = self._reittipuut.get(lahde)
+                    if puu is None:
+                        self._reitti_ohitukset += 1
+                        puu = self._laske_reittipuu(kuva, lahde)
+                    else:
+                        self._reitti_osumat += 1
+                else:
+                    puu = self._hae_haviopuu(kuva, lahde)
+                linkit, hyppyja, saavutettavat = self._puun_polut(kuva, puu, lahde, kohteet)
+                reitittomat += int(maara[~saavutettavat].sum())
+                maara = maara[saavutettavat]
+            else:
+                # Monipolkutiloissa parin paketit jaetaan poluille multinomijakaumalla,
+                # joka arvotaan kaikille pareille kerralla ehdollisina binomeina
+                polut = []
+                kumulatiiviset = []
+                parit = []
+                for j, (kohde, c) in enumerate(zip(kohteet.tolist(), maara.tolist())):
+                    try:
+                        joukko, kumul = self._hae_polkujoukko(kuva, tila, lahde, kohde)
+                    except RuntimeError:
+                        reitittomat += c
+                        continue
+                    polut.extend(joukko)
+                    kumulatiiviset.extend(kumul)
+                    parit.extend([j] * len(joukko))
+                if not polut:
+                    # Rivin yhdellekään kohteelle ei ole reittiä
+                    if mittari is not None:
+                        reitti_aika += time.perf_counter() - reitti_alku
+                    continue
+                parit = np.array(parit, dtype=np.int64)
+                kumulatiiviset = np.array(kumulatiiviset)
+                alut = np.flatnonzero(np.diff(parit, prepend=-1))
+                loput = np.append(alut[1:], len(parit)) - 1
+                # Polun osuus parin painoista ja sitä seuraavien polkujen osuus
+                kokonais = np.repeat(kumulatiiviset[loput], np.diff(np.append(alut, len(parit))))
+                edelliset = np.where(np.diff(parit, prepend=-1) != 0, 0.0, np.append(0.0, kumulatiiviset[:-1]))
+                ehdollinen = (kumulatiiviset - edelliset) / np.maximum(kokonais - edelliset, 1e-300)
+                jaetut = np.zeros(len(parit), dtype=np.int64)
+                jaljella = maara[parit[alut]].copy()
+                for sija in range(int(np.diff(np.append(alut, len(parit))).max()) if len(alut) else 0):
+                    kohta = alut + sija
+                    mukana = kohta <= loput
+                    kohta = kohta[mukana]
+                    osa = rng.binomial(jaljella[mukana], np.minimum(ehdollinen[kohta], 1.0))
+                    jaetut[kohta] = osa
+                    jaljella[mukana] -= osa
+                kaytossa = np.flatnonzero(jaetut)
+                polut = [polut[i] for i in kaytossa.tolist()]
+                jaetut = jaetut[kaytossa]
+                hyppyja = np.array([len(p) - 1 for p in polut], dtype=np.int64)
+                linkit = np.zeros((len(polut), int(hyppyja.max()) if polut else 0), dtype=np.int64)
+                if polut:
+                    reunat = kuva.reunat(
+                        np.fromiter(itertools.chain.from_iterable(p[:-1] for p in polut), dtype=np.int64),
+                        np.fromiter(itertools.chain.from_iterable(p[1:] for p in polut), dtype=np.int64),
+                    )
+                    rivit = np.repeat(np.arange(len(polut)), hyppyja)
+                    linkit[rivit, np.arange(len(rivit)) - np.repeat(np.cumsum(hyppyja) - hyppyja, hyppyja)] = reunat
+                maara = jaetut
+            if mittari is not None:
+                reitti_aika += time.perf_counter() - reitti_alku
+
+            if len(maara):
+                lohkot.append((linkit, hyppyja, maara))
+                solut += linkit.size
+            if not jonottaa and solut >= self.KUORMAN_LOHKO:
+                self._kuormita(linkkiarvot, lohkot, rng, naytteita, tiheys, tarjottu, haviot, tilasto)
+                lohkot = []
+                solut = 0
+        if jonottaa:
+            # Häviöitä edeltävä kuorma: jokaisen polun paketit kaikilla sen linkeillä
+            oma = np.zeros(len(kuva.naapurit))
+            for linkit, hyppyja, maara in lohkot:
+                kelvolliset = np.arange(linkit.shape[1]) < hyppyja[:, None]
+                oma += np.bincount(
+                    linkit[kelvolliset], weights=np.broadcast_to(maara[:, None], linkit.shape)[kelvolliset],
+                    minlength=len(oma),
+                )
+            self._laske_jonot(
+                self._kuorma_kesto_s + kesto_s, self._csr_kuorma(kuva, np.rint(oma).astype(np.int64))
+            )
+            linkkiarvot = self._linkkiarvot(kuva)
+            while lohkot:
+                solut = 0
+                for n, (linkit, _, _) in enumerate(lohkot):
+                    solut += linkit.size
+                    if solut >= self.KUORMAN_LOHKO:
+                        break
+                self._kuormita(linkkiarvot, lohkot[:n + 1], rng, naytteita, tiheys, tarjottu, haviot, tilasto)
+                lohkot = lohkot[n + 1:]
+        elif lohkot:
+            self._kuormita(linkkiarvot, lohkot, rng, naytteita, tiheys, tarjottu, haviot, tilasto)
+
+        kuormat = self._csr_kuorma(kuva, tarjottu)
+        self._kirjaa_linkkikuorma(kuormat)
+        if kesto_s is not None:
+            self._kuorma_kesto_s += kesto_s
+        tulos = Kuormatulos(
+            [u for (u, _), _ in kuormat],
+            [v for (_, v), _ in kuormat],
+            tarjottu[tarjottu > 0],
+            haviot[tarjottu > 0],
+            tilasto,
+            reitittomat,
+            kesto_s,
+            {avain: dict(self._jonoarvio[avain]) for avain, _ in kuormat if avain in self._jonoarvio},
+        )
+        if mittari is not None:
+            mittari.kirjaa("reitti", reitti_aika)
+            mittari.kirjaa("hopit", time.perf_counter() - alku - reitti_aika)
+            mittari.laske("haviot", tilasto.maara - tilasto.onnistuneet)
+            mittari.lahetys_valmis(tilasto.maara)
+        return tulos
+
     # --- Esimerkkiverkko ---
 
     def luo_esimerkkiverkko(self):
@@ -242,691 +1641,472 @@ class Verkkosimulaattori:
             if not self.verkko.has_edge(l1, l2):
                 self.lisaa_yhteys(l1, l2, viive_ms=viive, loss=loss)
 
+    @_lukittu
+    def luo_synteettinen_verkko(self, malli, viive=("tasainen", 1.0, 20.0), havio=0.0, siemen=None,
+                                **parametrit):
+        """Korvaa verkon generoidulla topologialla ja palauttaa (laitteita, yhteyksiä).
+
+        malli on jokin topology_generators.GENERAATTORIT-avaimista (waxman,
+        barabasi_albert, fat_tree, leaf_spine, rengas, isp) ja parametrit
+        välitetään generaattorille. viive (ms) ja havio ovat
+        topology_generators.arvo_arvot-muotoisia jakaumia. Verkko rakennetaan
+        massana; mallin omat sijainnit otetaan suoraan asetteluksi.
+        """
+        rng = self._np_rng if siemen is None else np.random.default_rng(siemen)
+        nimet, tyypit, reunat, sijainnit = topology_generators.generoi(malli, rng, **parametrit)
+        etaisyydet = None
+        if sijainnit is not None:
+            etaisyydet = np.hypot(*(sijainnit[reunat[:, 0]] - sijainnit[reunat[:, 1]]).T)
+        viiveet = topology_generators.arvo_arvot(viive, rng, len(reunat), etaisyydet)
+        haviot = np.minimum(topology_generators.arvo_arvot(havio, rng, len(reunat), etaisyydet), 1.0)
+
+        varit = {"tietokone": "lightgreen"}
+        laitteet = {
+            nimi: {"tyyppi": tyyppi, "color": varit.get(tyyppi, "lightblue")}
+            for nimi, tyyppi in zip(nimet, tyypit)
+        }
+        yhteydet = {
+            (nimet[u], nimet[v]): {"weight": w, "loss": p}
+            for (u, v), w, p in zip(reunat.tolist(), viiveet.tolist(), haviot.tolist())
+        }
+
+        self._tyhjenna_verkko()
+        self._rakenna_massana(laitteet, yhteydet)
+        if sijainnit is not None and len(sijainnit):
+            # Skaalataan samalle välille [-1, 1] kuin spring_layout
+            keskus = (sijainnit.max(axis=0) + sijainnit.min(axis=0)) / 2.0
+            skaala = max(float((sijainnit.max(axis=0) - sijainnit.min(axis=0)).max()) / 2.0, 1e-9)
+            self._pos_cache = dict(zip(nimet, (sijainnit - keskus) / skaala))
+            self._asettelu_versio += 1
+        self._ilmoita("topologia_vaihtui", None)
+        return self.verkko.number_of_nodes(), self.verkko.number_of_edges()
+
     # --- Topologian tallennus ja lataus ---
 
+    @_lukittu
     def export_topologia(self):
+        """Topologia JSON-muodossa; alhaalla olevat laitteet ja yhteydet merkitään alhaalla=true."""
         nodes = []
         for n, data in self.verkko.nodes(data=True):
-            nodes.append(
-                {
-                    "name": n,
-                    "tyyppi": data.get("tyyppi", "reititin"),
-                }
-            )
+            laite = {
+                "name": n,
+                "tyyppi": data.get("tyyppi", "reititin"),
+            }
+            if n in self._alhaalla_laitteet:
+                laite["alhaalla"] = True
+            nodes.append(laite)
+        # Alhaalla olevat yhteydet ovat poissa verkosta; yhteyden oma tila
+        # tallennetaan, päätelaitteen vika palautuu laitteen tilasta.
+        alhaalla = [
+            (t["laite1"], t["laite2"], t["data"], "yhteys" in t["syyt"]) for t in self._alhaalla_yhteydet.values()
+        ]
         edges = []
-        for u, v, data in self.verkko.edges(data=True):
-            edges.append(
-                {
-                    "laite1": u,
-                    "laite2": v,
-                    "viive_ms": data.get("weight", 0.0),
-                    "loss": data.get("loss", 0.0),
-                }
-            )
+        for u, v, data, yhteys_alhaalla in itertools.chain(
+            ((u, v, data, False) for u, v, data in self.verkko.edges(data=True)), alhaalla
+        ):
+            yhteys = {
+                "laite1": u,
+                "laite2": v,
+                "viive_ms": data.get("weight", 0.0),
+                "loss": data.get("loss", 0.0),
+            }
+            if "kaista" in data:
+                yhteys["kaista_mbps"] = data["kaista"]
+            if "puskuri" in data:
+                yhteys["puskuri"] = data["puskuri"]
+            if yhteys_alhaalla:
+                yhteys["alhaalla"] = True
+            edges.append(yhteys)
         topo = {
             "nodes": nodes,
             "edges": edges,
-            "settings": {
-                "jitter_min": self.jitter_min,
-                "jitter_max": self.jitter_max,
-                "nukkumisaika": self.nukkumisaika,
-            },
+            "settings": self._asetukset(),
         }
         return topo
 
-    def import_topologia_dict(self, topo):
-        self.verkko.clear()
-        self._pos_cache = None
+    def _asetukset(self):
+        return {
+            "jitter_min": self.jitter_min,
+            "jitter_max": self.jitter_max,
+            "nukkumisaika": self.nukkumisaika,
+            "reititys": self.reititystila,
+            "k_polkuja": self.k_polkuja,
+            "havion_paino": self.havion_paino,
+            "jonomalli": self.jonomalli,
+            "pakettikoko": self.pakettikoko,
+        }
 
-        for nd in topo.get("nodes", []):
-            self.lisaa_laite(nd.get("name"), nd.get("tyyppi", "reititin"))
+    def _tarkista_topologia(self, topo):
+        """Käy topologian läpi kerralla ja kerää kaikki virheet listaan."""
+        virheet = []
+        laitteet = {}
+        yhteydet = {}
+        if not isinstance(topo, dict):
+            return laitteet, yhteydet, ["Topologian on oltava JSON-olio."]
+        nodes = topo.get("nodes", [])
+        edges = topo.get("edges", [])
+        if not isinstance(nodes, list):
+            virheet.append("Kentän 'nodes' on oltava lista.")
+            nodes = []
+        if not isinstance(edges, list):
+            virheet.append("Kentän 'edges' on oltava lista.")
+            edges = []
+
+        for i, nd in enumerate(nodes):
+            if not isinstance(nd, dict):
+                virheet.append(f"nodes[{i}]: laitteen on oltava olio.")
+                continue
+            nimi = nd.get("name")
+            tyyppi = nd.get("tyyppi", "reititin")
+            if not nimi:
+                virheet.append(f"nodes[{i}]: Laitteen nimi ei voi olla tyhjä.")
+            elif nimi in laitteet:
+                virheet.append(f"nodes[{i}]: Laite '{nimi}' on jo olemassa.")
+            else:
+                vari = "lightgreen" if tyyppi == "tietokone" else "lightblue"
+                laitteet[nimi] = {"tyyppi": tyyppi, "color": vari}
 
-        for ed in topo.get("edges", []):
+        for i, ed in enumerate(edges):
+            if not isinstance(ed, dict):
+                virheet.append(f"edges[{i}]: yhteyden on oltava olio.")
+                continue
             l1 = ed.get("laite1")
             l2 = ed.get("laite2")
-            viive = ed.get("viive_ms", 0.0)
-            loss = ed.get("loss", 0.0)
             if l1 is None or l2 is None:
                 continue
-            if not self.verkko.has_edge(l1, l2):
-                self.lisaa_yhteys(l1, l2, viive_ms=viive, loss=loss)
+            if l1 == l2:
+                virheet.append(f"edges[{i}]: Laite ei voi olla yhteydessä itseensä.")
+                continue
+            if l1 not in laitteet or l2 not in laitteet:
+                virheet.append(f"edges[{i}]: Molempien laitteiden täytyy olla olemassa ({l1} <--> {l2}).")
+                continue
+            try:
+                viive = float(ed.get("viive_ms", 0.0))
+            except (TypeError, ValueError):
+                virheet.append(f"edges[{i}]: Viiveen tulee olla numero.")
+                continue
+            if not 0.0 <= viive < float("inf"):
+                virheet.append(f"edges[{i}]: Viiveen on oltava äärellinen ja ei-negatiivinen.")
+                continue
+            try:
+                loss = float(ed.get("loss", 0.0))
+            except (TypeError, ValueError):
+                virheet.append(f"edges[{i}]: Häviön tulee olla numero.")
+                continue
+            if loss < 0.0 or loss > 1.0:
+                virheet.append(f"edges[{i}]: Häviön on oltava välillä 0.0 - 1.0.")
+                continue
+            try:
+                kapasiteetti = self._tarkista_kapasiteetti(ed.get("kaista_mbps"), ed.get("puskuri"))
+            except ValueError as e:
+                virheet.append(f"edges[{i}]: {e}")
+                continue
+            avain = (l1, l2) if (l2, l1) not in yhteydet else (l2, l1)
+            if avain not in yhteydet:
+                yhteydet[avain] = {"weight": viive, "loss": loss, **kapasiteetti}
+
+        return laitteet, yhteydet, virheet
+
+    def _rakenna_massana(self, laitteet, yhteydet):
+        """Lisää laitteet ja yhteydet verkkoon kerralla ilman asettelua."""
+        self.verkko.add_nodes_from(laitteet.items())
+        self.verkko.add_edges_from((u, v, data) for (u, v), data in yhteydet.items())
+        self.mitatoi_reitit()
+        if self._pos_cache is not None:
+            self._asettelemattomat.update(laitteet)
+
+    @_lukittu
+    def import_topologia_dict(self, topo):
+        """Korvaa verkon topologialla.
+
+        Koko dokumentti tarkistetaan ennen muutoksia; virheistä nostetaan
+        yksi TopologiaVirhe, jossa ovat kaikki löydetyt virheet. Asettelu
+        lasketaan vasta, kun sijainteja tarvitaan.
+        """
+        laitteet, yhteydet, virheet = self._tarkista_topologia(topo)
+        if virheet:
+            raise TopologiaVirhe(virheet)
+
+        self._tyhjenna_verkko()
+        self._rakenna_massana(laitteet, yhteydet)
+        self._palauta_alhaalla(
+            [(ed.get("laite1"), ed.get("laite2")) for ed in topo.get("edges", []) if ed.get("alhaalla")],
+            [nd["name"] for nd in topo.get("nodes", []) if nd.get("alhaalla")],
+        )
+        self._aseta_asetukset(topo.get("settings", {}))
+        self._ilmoita("topologia_vaihtui", None)
+
+    def _palauta_alhaalla(self, yhteydet, laitteet):
+        """Palauttaa tallennetun vikatilan kirjaamatta tapahtumia (ks. export_topologia)."""
+        syyt = {}
+        for laite1, laite2 in yhteydet:
+            if self.verkko.has_edge(laite1, laite2):
+                syyt.setdefault((laite1, laite2), set()).add("yhteys")
+        for nimi in laitteet:
+            self._alhaalla_laitteet.add(nimi)
+            for naapuri in self.verkko.adj[nimi]:
+                avain = (nimi, naapuri) if (naapuri, nimi) not in syyt else (naapuri, nimi)
+                syyt.setdefault(avain, set()).add(("laite", nimi))
+        for (laite1, laite2), yhteyden_syyt in syyt.items():
+            data = dict(self.verkko[laite1][laite2])
+            self.verkko.remove_edge(laite1, laite2)
+            self._alhaalla_yhteydet[frozenset((laite1, laite2))] = {
+                "laite1": laite1, "laite2": laite2, "data": data, "syyt": yhteyden_syyt,
+            }
+        if syyt:
+            self.mitatoi_reitit()
+
+    def _tyhjenna_verkko(self):
+        self.verkko.clear()
+        self._alhaalla_yhteydet.clear()
+        self._alhaalla_laitteet.clear()
+        self.nollaa_kuorma()
+        self._pos_cache = None
+        self._asettelemattomat.clear()
 
-        settings = topo.get("settings", {})
+    def _aseta_asetukset(self, settings):
         if settings:
             try:
                 self.aseta_jitter(settings.get("jitter_min", self.jitter_min),
                                   settings.get("jitter_max", self.jitter_max))
                 self.aseta_nukkumisaika(settings.get("nukkumisaika", self.nukkumisaika))
+                self.aseta_reititys(settings.get("reititys", self.reititystila),
+                                    settings.get("k_polkuja"), settings.get("havion_paino"))
+                self.aseta_jonomalli(settings.get("jonomalli", self.jonomalli), settings.get("pakettikoko"))
             except ValueError:
                 # Jos tiedostossa on outoja arvoja, jätetään asetukset ennalleen
                 pass
 
-
-class VerkkoGUI(tk.Tk):
-    """Tkinter-pohjainen graafinen käyttöliittymä verkkosimulaattorille."""
-
-    def __init__(self):
-        super().__init__()
-        self.title("Verkkosimulaattori - GUI")
-        self.geometry("1200x700")
-        self.minsize(1000, 600)
-
-        self.simu = Verkkosimulaattori()
-        self.viimeisin_reitti = None
-        self.viimeisin_onnistui = None
-
-        self._luo_menu()
-        self._luo_rakenne()
-        self._luo_controlit()
-        self._luo_visualisointi()
-
-        self.paivita_verkko_tiedot()
-        self.piirra_verkko()
-        self.log("Tervetuloa Verkkosimulaattoriin! Lisää laitteita ja yhteyksiä vasemmalta.")
-
-    # --- Rakenne ja valikko ---
-
-    def _luo_menu(self):
-        menubar = tk.Menu(self)
-        self.config(menu=menubar)
-
-        tiedosto_menu = tk.Menu(menubar, tearoff=0)
-        menubar.add_cascade(label="Tiedosto", menu=tiedosto_menu)
-        tiedosto_menu.add_command(label="Tallenna topologia...", command=self.tallenna_topologia_clicked)
-        tiedosto_menu.add_command(label="Lataa topologia...", command=self.lataa_topologia_clicked)
-        tiedosto_menu.add_separator()
-        tiedosto_menu.add_command(label="Sulje", command=self.quit)
-
-    def _luo_rakenne(self):
-        self.columnconfigure(0, weight=1)
-        self.columnconfigure(1, weight=2)
-        self.rowconfigure(0, weight=1)
-
-        self.control_frame = ttk.Frame(self, padding=5)
-        self.control_frame.grid(row=0, column=0, sticky="nsew")
-
-        self.right_frame = ttk.Frame(self, padding=5)
-        self.right_frame.grid(row=0, column=1, sticky="nsew")
-
-        self.right_frame.rowconfigure(0, weight=1)
-        self.right_frame.rowconfigure(1, weight=2)
-        self.right_frame.columnconfigure(0, weight=1)
-
-    def _luo_controlit(self):
-        self.notebook = ttk.Notebook(self.control_frame)
-        self.notebook.pack(fill="both", expand=True)
-
-        # --- Laitteet-välilehti ---
-        self.tab_laitteet = ttk.Frame(self.notebook, padding=5)
-        self.notebook.add(self.tab_laitteet, text="Laitteet")
-
-        ttk.Label(self.tab_laitteet, text="Laitteen nimi:").grid(row=0, column=0, sticky="w")
-        self.entry_laite_nimi = ttk.Entry(self.tab_laitteet)
-        self.entry_laite_nimi.grid(row=0, column=1, sticky="ew", pady=2)
-
-        ttk.Label(self.tab_laitteet, text="Tyyppi:").grid(row=1, column=0, sticky="w")
-        self.cmb_laite_tyyppi = ttk.Combobox(
-            self.tab_laitteet,
-            values=["reititin", "tietokone"],
-            state="readonly",
+    @_lukittu
+    def vie_binaari(self, polku):
+        """Tallentaa topologian binäärimuotoon (topology_binary.py).
+
+        Binäärimuoto sisältää vain verkossa olevat yhteydet: vikatila
+        (alhaalla olevat laitteet ja yhteydet) säilyy vain JSON-muodossa.
+        """
+        taulukot = topology_binary.taulukoiksi(self.verkko.nodes(data=True), self.verkko.edges(data=True))
+        topology_binary.kirjoita(polku, settings=self._asetukset(), **taulukot)
+
+    @_lukittu
+    def tuo_binaari(self, polku, mmap=True):
+        """Korvaa verkon binääritopologialla.
+
+        Tiedoston CSR-taulukot otetaan sellaisenaan (muistikuvattuina)
+        reitityksen tilannekuvaksi, joten vain networkx-verkko rakennetaan.
+        """
+        topo = topology_binary.BinaariTopologia(polku, mmap=mmap)
+        nimet = topo.nimet
+        varit = {"tietokone": "lightgreen"}
+        tyypit = [topo.tyyppinimet[t] for t in topo.tyypit.tolist()]
+        self._tyhjenna_verkko()
+        self.verkko.add_nodes_from(
+            (nimi, {"tyyppi": tyyppi, "color": varit.get(tyyppi, "lightblue")})
+            for nimi, tyyppi in zip(nimet, tyypit)
         )
-        self.cmb_laite_tyyppi.set("reititin")
-        self.cmb_laite_tyyppi.grid(row=1, column=1, sticky="ew", pady=2)
-
-        btn_frame = ttk.Frame(self.tab_laitteet)
-        btn_frame.grid(row=2, column=0, columnspan=2, pady=5, sticky="ew")
-        ttk.Button(btn_frame, text="Lisää laite", command=self.lisaa_laite_clicked).pack(side="left", padx=2)
-        ttk.Button(btn_frame, text="Päivitä tyyppi", command=self.paivita_laite_clicked).pack(side="left", padx=2)
-        ttk.Button(btn_frame, text="Poista laite", command=self.poista_laite_clicked).pack(side="left", padx=2)
-
-        ttk.Label(self.tab_laitteet, text="Laitteet:").grid(row=3, column=0, columnspan=2, sticky="w", pady=(10, 0))
-        self.lb_laitteet = tk.Listbox(self.tab_laitteet, height=8)
-        self.lb_laitteet.grid(row=4, column=0, columnspan=2, sticky="nsew")
-        self.lb_laitteet.bind("<<ListboxSelect>>", self.laitelista_valittu)
-
-        scroll_laitteet = ttk.Scrollbar(self.tab_laitteet, orient="vertical", command=self.lb_laitteet.yview)
-        scroll_laitteet.grid(row=4, column=2, sticky="ns")
-        self.lb_laitteet.configure(yscrollcommand=scroll_laitteet.set)
-
-        self.tab_laitteet.columnconfigure(1, weight=1)
-        self.tab_laitteet.rowconfigure(4, weight=1)
-
-        # --- Yhteydet-välilehti ---
-        self.tab_yhteydet = ttk.Frame(self.notebook, padding=5)
-        self.notebook.add(self.tab_yhteydet, text="Yhteydet")
-
-        ttk.Label(self.tab_yhteydet, text="Laite 1:").grid(row=0, column=0, sticky="w")
-        self.cb_y_l1 = ttk.Combobox(self.tab_yhteydet, state="readonly")
-        self.cb_y_l1.grid(row=0, column=1, sticky="ew", pady=2)
-
-        ttk.Label(self.tab_yhteydet, text="Laite 2:").grid(row=1, column=0, sticky="w")
-        self.cb_y_l2 = ttk.Combobox(self.tab_yhteydet, state="readonly")
-        self.cb_y_l2.grid(row=1, column=1, sticky="ew", pady=2)
-
-        ttk.Label(self.tab_yhteydet, text="Viive (ms):").grid(row=2, column=0, sticky="w")
-        self.entry_y_viive = ttk.Entry(self.tab_yhteydet)
-        self.entry_y_viive.grid(row=2, column=1, sticky="ew", pady=2)
-        self.entry_y_viive.insert(0, "10")
-
-        ttk.Label(self.tab_yhteydet, text="Häviö (%):").grid(row=3, column=0, sticky="w")
-        self.entry_y_loss = ttk.Entry(self.tab_yhteydet)
-        self.entry_y_loss.grid(row=3, column=1, sticky="ew", pady=2)
-        self.entry_y_loss.insert(0, "0")
-
-        btn_frame_y = ttk.Frame(self.tab_yhteydet)
-        btn_frame_y.grid(row=4, column=0, columnspan=2, pady=5, sticky="ew")
-        ttk.Button(btn_frame_y, text="Lisää yhteys", command=self.lisaa_yhteys_clicked).pack(side="left", padx=2)
-        ttk.Button(btn_frame_y, text="Muuta viivettä/häviötä", command=self.muuta_yhteys_clicked).pack(side="left", padx=2)
-        ttk.Button(btn_frame_y, text="Poista yhteys", command=self.poista_yhteys_clicked).pack(side="left", padx=2)
-
-        ttk.Label(self.tab_yhteydet, text="Yhteydet:").grid(row=5, column=0, columnspan=2, sticky="w", pady=(10, 0))
-        self.lb_yhteydet = tk.Listbox(self.tab_yhteydet, height=8)
-        self.lb_yhteydet.grid(row=6, column=0, columnspan=2, sticky="nsew")
-        self.lb_yhteydet.bind("<<ListboxSelect>>", self.yhteyslista_valittu)
-
-        scroll_yhteydet = ttk.Scrollbar(self.tab_yhteydet, orient="vertical", command=self.lb_yhteydet.yview)
-        scroll_yhteydet.grid(row=6, column=2, sticky="ns")
-        self.lb_yhteydet.configure(yscrollcommand=scroll_yhteydet.set)
-
-        self.tab_yhteydet.columnconfigure(1, weight=1)
-        self.tab_yhteydet.rowconfigure(6, weight=1)
-
-        # --- Simulaatio-välilehti ---
-        self.tab_simulaatio = ttk.Frame(self.notebook, padding=5)
-        self.notebook.add(self.tab_simulaatio, text="Simulaatio")
-
-        ttk.Label(self.tab_simulaatio, text="Lähettävä laite:").grid(row=0, column=0, sticky="w")
-        self.cb_s_lahettaja = ttk.Combobox(self.tab_simulaatio, state="readonly")
-        self.cb_s_lahettaja.grid(row=0, column=1, sticky="ew", pady=2)
-
-        ttk.Label(self.tab_simulaatio, text="Vastaanottava laite:").grid(row=1, column=0, sticky="w")
-        self.cb_s_vastaanottaja = ttk.Combobox(self.tab_simulaatio, state="readonly")
-        self.cb_s_vastaanottaja.grid(row=1, column=1, sticky="ew", pady=2)
-
-        ttk.Label(self.tab_simulaatio, text="Viesti:").grid(row=2, column=0, sticky="w")
-        self.entry_s_viesti = ttk.Entry(self.tab_simulaatio)
-        self.entry_s_viesti.grid(row=2, column=1, sticky="ew", pady=2)
-
-        btn_frame_s = ttk.Frame(self.tab_simulaatio)
-        btn_frame_s.grid(row=3, column=0, columnspan=2, pady=5, sticky="ew")
-        ttk.Button(btn_frame_s, text="Lähetä viesti", command=self.laheta_viesti_clicked).pack(side="left", padx=2)
-        ttk.Button(btn_frame_s, text="Näytä pakettiloki", command=self.nayta_pakettiloki_clicked).pack(
-            side="left", padx=2
+        self.verkko.add_edges_from(topo.yhteystiedot())
+        self.mitatoi_reitit()
+        self._tilannekuva = Tilannekuva.taulukoista(
+            nimet, topo.indptr, topo.naapurit, topo.viiveet, topo.haviot, self._topologia_versio
         )
-        ttk.Button(btn_frame_s, text="Näytä tilastot", command=self.nayta_tilastot_clicked).pack(
-            side="left", padx=2
-        )
-
-        self.tab_simulaatio.columnconfigure(1, weight=1)
-
-        # --- Asetukset-välilehti ---
-        self.tab_asetukset = ttk.Frame(self.notebook, padding=5)
-        self.notebook.add(self.tab_asetukset, text="Asetukset")
-
-        ttk.Label(self.tab_asetukset, text="Jitter min:").grid(row=0, column=0, sticky="w")
-        self.entry_jitter_min = ttk.Entry(self.tab_asetukset)
-        self.entry_jitter_min.grid(row=0, column=1, sticky="ew", pady=2)
-
-        ttk.Label(self.tab_asetukset, text="Jitter max:").grid(row=1, column=0, sticky="w")
-        self.entry_jitter_max = ttk.Entry(self.tab_asetukset)
-        self.entry_jitter_max.grid(row=1, column=1, sticky="ew", pady=2)
-
-        ttk.Label(self.tab_asetukset, text="Nukkumisaika (s/linkki):").grid(row=2, column=0, sticky="w")
-        self.entry_nukkumisaika = ttk.Entry(self.tab_asetukset)
-        self.entry_nukkumisaika.grid(row=2, column=1, sticky="ew", pady=2)
-
-        btn_frame_a = ttk.Frame(self.tab_asetukset)
-        btn_frame_a.grid(row=3, column=0, columnspan=2, pady=5, sticky="ew")
-        ttk.Button(btn_frame_a, text="Tallenna asetukset", command=self.tallenna_asetukset_clicked).pack(
-            side="left", padx=2
-        )
-        ttk.Button(btn_frame_a, text="Luo esimerkkiverkko", command=self.luo_esimerkkiverkko_clicked).pack(
-            side="left", padx=2
-        )
-
-        # Aseta oletusarvot kenttiin
-        self.entry_jitter_min.insert(0, str(self.simu.jitter_min))
-        self.entry_jitter_max.insert(0, str(self.simu.jitter_max))
-        self.entry_nukkumisaika.insert(0, str(self.simu.nukkumisaika))
-
-        self.tab_asetukset.columnconfigure(1, weight=1)
-
-    def _luo_visualisointi(self):
-        # Lokiruutu
-        log_frame = ttk.LabelFrame(self.right_frame, text="Tapahtumaloki")
-        log_frame.grid(row=0, column=0, sticky="nsew", pady=(0, 5))
-        log_frame.columnconfigure(0, weight=1)
-        log_frame.rowconfigure(0, weight=1)
-
-        self.log_text = tk.Text(log_frame, wrap="word", height=10, state="normal")
-        self.log_text.grid(row=0, column=0, sticky="nsew")
-        scroll_log = ttk.Scrollbar(log_frame, orient="vertical", command=self.log_text.yview)
-        scroll_log.grid(row=0, column=1, sticky="ns")
-        self.log_text.configure(yscrollcommand=scroll_log.set)
-
-        btn_frame_log = ttk.Frame(log_frame)
-        btn_frame_log.grid(row=1, column=0, columnspan=2, sticky="e", pady=(2, 0))
-        ttk.Button(btn_frame_log, text="Tyhjennä näkymä", command=self.tyhjenna_loki_nakyma).pack(
-            side="left", padx=2
-        )
-        ttk.Button(btn_frame_log, text="Tyhjennä pakettiloki", command=self.tyhjenna_pakettiloki).pack(
-            side="left", padx=2
-        )
-
-        # Verkon visualisointi
-        graph_frame = ttk.LabelFrame(self.right_frame, text="Verkon topologia")
-        graph_frame.grid(row=1, column=0, sticky="nsew")
-        graph_frame.columnconfigure(0, weight=1)
-        graph_frame.rowconfigure(0, weight=1)
-
-        self.figure = plt.Figure(figsize=(6, 5), dpi=100)
-        self.ax = self.figure.add_subplot(111)
-        self.canvas = FigureCanvasTkAgg(self.figure, master=graph_frame)
-        self.canvas_widget = self.canvas.get_tk_widget()
-        self.canvas_widget.grid(row=0, column=0, sticky="nsew")
-
-    # --- Apufunktiot GUI:lle ---
-
-    def log(self, msg: str):
-        self.log_text.insert("end", msg + "\n")
-        self.log_text.see("end")
-        print(msg)
-
-    def tyhjenna_loki_nakyma(self):
-        self.log_text.delete("1.0", "end")
-
-    def tyhjenna_pakettiloki(self):
-        self.simu.pakettiloki.clear()
-        self.log("Pakettiloki tyhjennetty.")
-
-    def paivita_verkko_tiedot(self):
-        laitteet = self.simu.hae_laitteet()
-        self.lb_laitteet.delete(0, tk.END)
-        node_names = []
-        for nimi, data in laitteet:
-            tyyppi = data.get("tyyppi", "?")
-            self.lb_laitteet.insert(tk.END, f"{nimi} ({tyyppi})")
-            node_names.append(nimi)
-
-        for cb in [self.cb_y_l1, self.cb_y_l2, self.cb_s_lahettaja, self.cb_s_vastaanottaja]:
-            cb["values"] = node_names
-
-        yhteydet = self.simu.hae_yhteydet()
-        self.lb_yhteydet.delete(0, tk.END)
-        for laite1, laite2, data in yhteydet:
-            viive = data.get("weight", 0.0)
-            loss = data.get("loss", 0.0) * 100.0
-            self.lb_yhteydet.insert(
-                tk.END,
-                f"{laite1} <--> {laite2} (viive: {viive:.1f} ms, häviö: {loss:.1f} %)",
-            )
-
-    def piirra_verkko(self):
-        self.ax.clear()
-        if self.simu._pos_cache is None:
-            self.simu._paivita_pos_cache()
-        pos = self.simu._pos_cache
-
-        if self.simu.verkko.number_of_nodes() > 0:
-            nodes = list(self.simu.verkko.nodes)
-            base_colors = [self.simu.verkko.nodes[n].get("color", "lightblue") for n in nodes]
-
-            # korosta viimeisin reitti suuremmilla solmuilla
-            node_sizes = []
-            route_set = set(self.viimeisin_reitti) if self.viimeisin_reitti else set()
-            for n in nodes:
-                if n in route_set:
-                    node_sizes.append(1700)
-                else:
-                    node_sizes.append(1200)
-
-            edges = list(self.simu.verkko.edges())
-            edge_colors = []
-            edge_widths = []
-            reitti_edge_set = set()
-            if self.viimeisin_reitti and len(self.viimeisin_reitti) > 1:
-                for i in range(len(self.viimeisin_reitti) - 1):
-                    a = self.viimeisin_reitti[i]
-                    b = self.viimeisin_reitti[i + 1]
-                    reitti_edge_set.add((a, b))
-                    reitti_edge_set.add((b, a))
-
-            for (u, v) in edges:
-                if (u, v) in reitti_edge_set or (v, u) in reitti_edge_set:
-                    edge_colors.append("red")
-                    edge_widths.append(3.0)
-                else:
-                    edge_colors.append("gray")
-                    edge_widths.append(1.0)
-
-            nx.draw(
-                self.simu.verkko,
-                pos,
-                ax=self.ax,
-                with_labels=True,
-                node_color=base_colors,
-                node_size=node_sizes,
-                font_weight="bold",
-                edge_color=edge_colors,
-                width=edge_widths,
-            )
-            labels = nx.get_edge_attributes(self.simu.verkko, "weight")
-            if labels:
-                nx.draw_networkx_edge_labels(
-                    self.simu.verkko,
-                    pos,
-                    edge_labels=labels,
-                    ax=self.ax,
-                )
-
-        title = "Verkon topologia"
-        if self.viimeisin_reitti:
-            if self.viimeisin_onnistui:
-                title += " (viimeisin reitti korostettu)"
-            else:
-                title += " (viimeisin reitti epäonnistui)"
-        self.ax.set_title(title)
-        self.ax.axis("off")
-        self.figure.tight_layout()
-        self.canvas.draw()
-
-    # --- Tapahtumankäsittelijät ---
-
-    def laitelista_valittu(self, event):
-        sel = self.lb_laitteet.curselection()
-        if not sel:
-            return
-        teksti = self.lb_laitteet.get(sel[0])
-        if " (" in teksti:
-            nimi = teksti.split(" (", 1)[0]
-        else:
-            nimi = teksti
-        self.entry_laite_nimi.delete(0, tk.END)
-        self.entry_laite_nimi.insert(0, nimi)
-
-        data = self.simu.verkko.nodes.get(nimi, {})
-        tyyppi = data.get("tyyppi", "reititin")
-        if tyyppi in ["reititin", "tietokone"]:
-            self.cmb_laite_tyyppi.set(tyyppi)
-
-    def yhteyslista_valittu(self, event):
-        sel = self.lb_yhteydet.curselection()
-        if not sel:
-            return
-        line = self.lb_yhteydet.get(sel[0])
-        # odotettu muoto:
-        # "A <--> B (viive: X ms, häviö: Y %)"
-        try:
-            osat = line.split(" <--> ")
-            l1 = osat[0].strip()
-            loppu = osat[1]
-            l2 = loppu.split(" (", 1)[0].strip()
-        except Exception:
+        self._aseta_asetukset(topo.settings)
+        self._ilmoita("topologia_vaihtui", None)
+
+
+class _Paketti:
+    __slots__ = ("tunniste", "lahettaja", "vastaanottaja", "viesti", "reitti", "hop",
+                 "kokonaisviive", "lahtoaika", "kun_valmis")
+
+
+class Tapahtumamoottori:
+    """Diskreettien tapahtumien simulointi virtuaalikellolla.
+
+    Kello etenee millisekunteina linkkien jitteröityjen viiveiden mukaan, joten
+    useat yhtä aikaa matkalla olevat paketit lomittuvat oikein ilman
+    time.sleep-kutsuja. Reaaliaikakerroin > 0 tahdistaa ajon seinäkelloon
+    (sekuntia simuloitua millisekuntia kohden) pelkkää visualisointia varten.
+    """
+
+    def __init__(self, simu, reaaliaikakerroin=0.0, hop_kuuntelija=None):
+        self.simu = simu
+        self.kello = 0.0
+        self.reaaliaikakerroin = float(reaaliaikakerroin)
+        self.hop_kuuntelija = hop_kuuntelija
+        self._jono = []
+        self._laskuri = itertools.count()
+        self._paketti_id = itertools.count(1)
+        self.kasitellyt = 0
+        self.matkalla = 0
+        self.toimitetut = 0
+        self.havinneet = 0
+        # Tämän moottorin paketit linkeittäin (lisätään myös simulaattorin kertyneeseen kuormaan)
+        self.linkkikuorma = {}
+
+    # --- Ajastus ---
+
+    def ajasta(self, aika_ms, kasittelija, arg=None):
+        if aika_ms < self.kello:
+            raise ValueError("Tapahtumaa ei voi ajastaa menneisyyteen.")
+        heapq.heappush(self._jono, (aika_ms, next(self._laskuri), kasittelija, arg))
+
+    def ajasta_viiveella(self, viive_ms, kasittelija, arg=None):
+        self.ajasta(self.kello + viive_ms, kasittelija, arg)
+
+    def laheta(self, lahettaja, vastaanottaja, viesti="", aika_ms=None, kun_valmis=None):
+        """Ajastaa paketin lähtemään hetkellä aika_ms (oletus: nyt).
+
+        Reitti suunnitellaan lähetyshetkellä; kun_valmis(tulos) kutsutaan, kun
+        paketti saapuu tai häviää. Palauttaa paketin tunnisteen.
+        """
+        if lahettaja not in self.simu.verkko:
+            raise ValueError(f"Lähettäjää '{lahettaja}' ei löydy.")
+        if vastaanottaja not in self.simu.verkko:
+            raise ValueError(f"Vastaanottajaa '{vastaanottaja}' ei löydy.")
+        p = _Paketti()
+        p.tunniste = next(self._paketti_id)
+        p.lahettaja = lahettaja
+        p.vastaanottaja = vastaanottaja
+        p.viesti = viesti
+        p.reitti = self.simu._hae_reitti(lahettaja, vastaanottaja)
+        p.hop = 0
+        p.kokonaisviive = 0.0
+        p.lahtoaika = self.kello if aika_ms is None else float(aika_ms)
+        p.kun_valmis = kun_valmis
+        # ajasta hylkää menneisyyteen ajastetun lähdön ennen kuin paketti lasketaan matkalle
+        self.ajasta(p.lahtoaika, self._hyppy, p)
+        self.matkalla += 1
+        return p.tunniste
+
+    def ajasta_yhteys(self, aika_ms, laite1, laite2, ylhaalla):
+        """Ajastaa yhteyden alas- tai ylösoton; matkalla olevat paketit
+        havaitsevat puuttuvan linkin seuraavassa hypyssä."""
+        metodi = self.simu.yhteys_ylos if ylhaalla else self.simu.yhteys_alas
+        self.ajasta(aika_ms, lambda _: metodi(laite1, laite2, aika_ms=self.kello))
+
+    def ajasta_laite(self, aika_ms, nimi, ylhaalla):
+        metodi = self.simu.laite_ylos if ylhaalla else self.simu.laite_alas
+        self.ajasta(aika_ms, lambda _: metodi(nimi, aika_ms=self.kello))
+
+    def paivita_jonot(self):
+        """Arvioi jonot tämän moottorin kuormasta virtuaalikellon jaksolla (ks. Verkkosimulaattori).
+
+        Muut lähetykset ja liikennematriisiajot eivät ole mukana, koska niiden
+        kuorma ei ole syntynyt tämän kellon aikana.
+        """
+        return self.simu.paivita_jonot(self.kello / 1000.0, kuorma=self.linkkikuorma)
+
+    # --- Ajo ---
+
+    def askel(self):
+        if not self._jono:
+            return False
+        aika, _, kasittelija, arg = heapq.heappop(self._jono)
+        self.kello = aika
+        kasittelija(arg)
+        self.kasitellyt += 1
+        return True
+
+    def aja(self, asti_ms=None, max_tapahtumat=None):
+        """Käsittelee tapahtumia, kunnes jono tyhjenee tai raja tulee vastaan."""
+        jono = self._jono
+        heappop = heapq.heappop
+        kasitelty = 0
+        alku_seina = time.perf_counter()
+        alku_kello = self.kello
+        while jono:
+            if asti_ms is not None and jono[0][0] > asti_ms:
+                self.kello = max(self.kello, asti_ms)
+                break
+            if max_tapahtumat is not None and kasitelty >= max_tapahtumat:
+                break
+            aika, _, kasittelija, arg = heappop(jono)
+            if self.reaaliaikakerroin > 0:
+                odota = alku_seina + (aika - alku_kello) * self.reaaliaikakerroin - time.perf_counter()
+                if odota > 0:
+                    time.sleep(odota)
+            self.kello = aika
+            kasittelija(arg)
+            kasitelty += 1
+        self.kasitellyt += kasitelty
+        return kasitelty
+
+    # --- Pakettien käsittely ---
+
+    def _hyppy(self, p):
+        reitti = p.reitti
+        i = p.hop
+        if i == len(reitti) - 1:
+            self._valmis(p, TILA_OK)
             return
-        self.cb_y_l1.set(l1)
-        self.cb_y_l2.set(l2)
-
-        try:
-            if "viive:" in line:
-                viive_str = line.split("viive:")[1].split("ms")[0].strip()
-                self.entry_y_viive.delete(0, tk.END)
-                self.entry_y_viive.insert(0, viive_str)
-        except Exception:
-            pass
-
-        try:
-            if "häviö:" in line:
-                loss_str = line.split("häviö:")[1].split("%")[0].strip()
-                self.entry_y_loss.delete(0, tk.END)
-                self.entry_y_loss.insert(0, loss_str)
-        except Exception:
-            pass
-
-    def lisaa_laite_clicked(self):
-        nimi = self.entry_laite_nimi.get().strip()
-        tyyppi = self.cmb_laite_tyyppi.get().strip() or "reititin"
-        try:
-            self.simu.lisaa_laite(nimi, tyyppi)
-        except ValueError as e:
-            messagebox.showerror("Virhe", str(e), parent=self)
+        nykyinen = reitti[i]
+        seuraava = reitti[i + 1]
+        naapurit = self.simu.verkko.adj.get(nykyinen)
+        edge_data = naapurit.get(seuraava) if naapurit is not None else None
+        if edge_data is None:
+            self._valmis(p, TILA_LINKKI_POISSA)
             return
-        self.log(f"Laite lisätty: {nimi} ({tyyppi})")
-        self.paivita_verkko_tiedot()
-        self.piirra_verkko()
 
-    def paivita_laite_clicked(self):
-        nimi = self.entry_laite_nimi.get().strip()
-        tyyppi = self.cmb_laite_tyyppi.get().strip() or "reititin"
-        try:
-            self.simu.muokkaa_laitetta(nimi, tyyppi)
-        except ValueError as e:
-            messagebox.showerror("Virhe", str(e), parent=self)
-            return
-        self.log(f"Laitteen '{nimi}' tyyppi päivitetty: {tyyppi}")
-        self.paivita_verkko_tiedot()
-        self.piirra_verkko()
+        simu = self.simu
+        rng = simu._rng
+        avain = (nykyinen, seuraava)
+        with simu._lukko:
+            simu._linkkikuorma[avain] = simu._linkkikuorma.get(avain, 0) + 1
+        self.linkkikuorma[avain] = self.linkkikuorma.get(avain, 0) + 1
+        jonoviive, pudotus = simu._jonot.get(avain, _EI_JONOA) if simu._jonot else _EI_JONOA
+        viive = edge_data.get("weight", 0.0) * rng.uniform(simu.jitter_min, simu.jitter_max) + jonoviive
+        p.kokonaisviive += viive
+        lost = rng.random() < edge_data.get("loss", 0.0)
+        pudotettu = not lost and pudotus > 0.0 and rng.random() < pudotus
+        if self.hop_kuuntelija is not None:
+            self.hop_kuuntelija(p.tunniste, nykyinen, seuraava, self.kello, lost or pudotettu)
+        if lost:
+            self.ajasta(self.kello + viive, self._havio, p)
+        elif pudotettu:
+            self.ajasta(self.kello + viive, self._pudotus, p)
+        else:
+            p.hop = i + 1
+            self.ajasta(self.kello + viive, self._hyppy, p)
 
-    def poista_laite_clicked(self):
-        nimi = self.entry_laite_nimi.get().strip()
-        if not nimi:
-            sel = self.lb_laitteet.curselection()
-            if sel:
-                teksti = self.lb_laitteet.get(sel[0])
-                if " (" in teksti:
-                    nimi = teksti.split(" (", 1)[0]
-        if not nimi:
-            messagebox.showerror("Virhe", "Valitse tai kirjoita poistettava laite.", parent=self)
-            return
-        try:
-            self.simu.poista_laite(nimi)
-        except ValueError as e:
-            messagebox.showerror("Virhe", str(e), parent=self)
-            return
-        self.log(f"Laite poistettu: {nimi}")
-        self.entry_laite_nimi.delete(0, tk.END)
-        self.paivita_verkko_tiedot()
-        self.piirra_verkko()
-
-    def lisaa_yhteys_clicked(self):
-        l1 = self.cb_y_l1.get().strip()
-        l2 = self.cb_y_l2.get().strip()
-        viive_str = self.entry_y_viive.get().strip() or "10"
-        loss_str = self.entry_y_loss.get().strip() or "0"
-        try:
-            viive = float(viive_str)
-        except ValueError:
-            messagebox.showerror("Virhe", "Viiveen tulee olla numero.", parent=self)
-            return
-        try:
-            loss_percent = float(loss_str)
-        except ValueError:
-            messagebox.showerror("Virhe", "Häviön tulee olla numero.", parent=self)
-            return
-        loss_prob = max(0.0, min(1.0, loss_percent / 100.0))
-        try:
-            self.simu.lisaa_yhteys(l1, l2, viive_ms=viive, loss=loss_prob)
-        except ValueError as e:
-            messagebox.showerror("Virhe", str(e), parent=self)
-            return
-        self.log(f"Yhteys lisätty: {l1} <--> {l2} (viive {viive:.1f} ms, häviö {loss_prob*100:.1f} %)")
-        self.paivita_verkko_tiedot()
-        self.piirra_verkko()
-
-    def muuta_yhteys_clicked(self):
-        l1 = self.cb_y_l1.get().strip()
-        l2 = self.cb_y_l2.get().strip()
-        viive_str = self.entry_y_viive.get().strip()
-        loss_str = self.entry_y_loss.get().strip()
-        if not viive_str:
-            messagebox.showerror("Virhe", "Anna uusi viive.", parent=self)
-            return
-        try:
-            viive = float(viive_str)
-        except ValueError:
-            messagebox.showerror("Virhe", "Viiveen tulee olla numero.", parent=self)
-            return
-        try:
-            loss_percent = float(loss_str)
-        except ValueError:
-            messagebox.showerror("Virhe", "Häviön tulee olla numero.", parent=self)
-            return
-        loss_prob = max(0.0, min(1.0, loss_percent / 100.0))
-        try:
-            self.simu.muuta_yhteyden_viivetta(l1, l2, viive)
-            self.simu.muuta_yhteyden_havio(l1, l2, loss_prob)
-        except ValueError as e:
-            messagebox.showerror("Virhe", str(e), parent=self)
-            return
-        self.log(f"Yhteyden {l1} <--> {l2} viive/häviö päivitetty: {viive:.1f} ms, häviö {loss_prob*100:.1f} %")
-        self.paivita_verkko_tiedot()
-        self.piirra_verkko()
+    def _havio(self, p):
+        self._valmis(p, TILA_HAVISI)
 
-    def poista_yhteys_clicked(self):
-        l1 = self.cb_y_l1.get().strip()
-        l2 = self.cb_y_l2.get().strip()
-        try:
-            self.simu.poista_yhteys(l1, l2)
-        except ValueError as e:
-            messagebox.showerror("Virhe", str(e), parent=self)
-            return
-        self.log(f"Yhteys poistettu: {l1} <--> {l2}")
-        self.paivita_verkko_tiedot()
-        self.piirra_verkko()
-
-    def laheta_viesti_clicked(self):
-        lahettaja = self.cb_s_lahettaja.get().strip()
-        vastaanottaja = self.cb_s_vastaanottaja.get().strip()
-        viesti = self.entry_s_viesti.get().strip() or "(tyhjä viesti)"
-        try:
-            tulos = self.simu.laheta_viesti(lahettaja, vastaanottaja, viesti)
-        except (ValueError, RuntimeError) as e:
-            messagebox.showerror("Virhe", str(e), parent=self)
-            return
+    def _pudotus(self, p):
+        self._valmis(p, TILA_PUDOTETTU)
 
-        self.viimeisin_reitti = tulos["reitti_toteutunut"]
-        self.viimeisin_onnistui = tulos["onnistui"]
-        self.piirra_verkko()
-
-        self.log(f"--- Lähetys {lahettaja} -> {vastaanottaja} ---")
-        self.log("Suunniteltu reitti: " + " -> ".join(tulos["reitti_suunniteltu"]))
-        self.log("Toteutunut reitti: " + " -> ".join(tulos["reitti_toteutunut"]))
-        for hop in tulos["hopit"]:
-            rivi = (
-                f"  {hop['lahto']} -> {hop['kohde']} | nimellinen {hop['nimellinen_viive_ms']} ms, "
-                f"todellinen {hop['todellinen_viive_ms']:.1f} ms (jitter {hop['jitter_kerroin']:.2f}x)"
-            )
-            if hop.get("loss_prob", 0.0) > 0.0:
-                rivi += f" | häviö {hop['loss_prob']*100:.1f} %"
-            if hop.get("lost"):
-                rivi += "  <-- PAKETTI HÄVISI TÄHÄN"
-            self.log(rivi)
-        if tulos["onnistui"]:
-            self.log(f"Kokonaisviive: {tulos['kokonaisviive_ms']:.1f} ms")
-            self.log("Paketti saapui perille.")
+    def _valmis(self, p, tila):
+        self.matkalla -= 1
+        if tila == TILA_OK:
+            self.toimitetut += 1
         else:
-            self.log(f"Paketti EI saapunut perille: {tulos['syy']}")
-            self.log(f"Kokonaisviive ennen häviötä: {tulos['kokonaisviive_ms']:.1f} ms")
-        self.log(f"Viestin sisältö: {viesti}")
-        self.log("")
-
-    def nayta_pakettiloki_clicked(self):
-        loki = self.simu.hae_pakettiloki()
-        if not loki:
-            self.log("Pakettiloki on tyhjä.")
-            return
-        self.log("--- Pakettiloki ---")
-        for merkinta in loki:
-            status = "OK" if merkinta.get("onnistui", True) else "EPÄONNISTUI"
-            self.log(
-                f"[{merkinta['aika']}] {merkinta['lahettaja']} -> {merkinta['vastaanottaja']} | "
-                f"{status} | viive {merkinta['kokonaisviive_ms']:.1f} ms | "
-                f"reitti: {' -> '.join(merkinta['reitti_toteutunut'])}"
-            )
-        self.log("--- Pakettiloki loppu ---")
-        self.log("")
-
-    def nayta_tilastot_clicked(self):
-        til = self.simu.hae_tilastot()
-        if til["maara"] == 0:
-            self.log("Ei vielä lähetettyjä paketteja, ei tilastoja.")
-            return
-        self.log("--- Tilastot ---")
-        self.log(f"Lähetettyjä paketteja: {til['maara']}")
-        self.log(f"Onnistuneet: {til['onnistuneet']}")
-        self.log(f"Epäonnistuneet: {til['epaonnistuneet']}")
-        self.log(f"Keskimääräinen viive: {til['keskiviive']:.1f} ms")
-        self.log(f"Pienin viive: {til['min_viive']:.1f} ms")
-        self.log(f"Suurin viive: {til['max_viive']:.1f} ms")
-        self.log("--- Tilastot loppu ---")
-        self.log("")
-
-    def tallenna_asetukset_clicked(self):
-        jitter_min = self.entry_jitter_min.get().strip()
-        jitter_max = self.entry_jitter_max.get().strip()
-        nukkumisaika = self.entry_nukkumisaika.get().strip()
-        try:
-            self.simu.aseta_jitter(jitter_min, jitter_max)
-            self.simu.aseta_nukkumisaika(nukkumisaika)
-        except ValueError as e:
-            messagebox.showerror("Virhe", str(e), parent=self)
-            return
-        self.log(
-            f"Asetukset päivitetty: jitter {self.simu.jitter_min:.2f} - {self.simu.jitter_max:.2f}, "
-            f"nukkumisaika {self.simu.nukkumisaika:.2f} s/linkki"
+            self.havinneet += 1
+        seq = self.simu._kirjaa_paketti(
+            p.lahettaja, p.vastaanottaja, p.viesti, p.reitti, p.hop + 1, p.kokonaisviive, tila
         )
+        if p.kun_valmis is not None:
+            loki = self.simu.pakettiloki.merkinta(seq)
+            p.kun_valmis(
+                {
+                    "tunniste": p.tunniste,
+                    "lahtoaika_ms": p.lahtoaika,
+                    "saapumisaika_ms": self.kello,
+                    "onnistui": loki["onnistui"],
+                    "syy": loki["syy"],
+                    "kokonaisviive_ms": p.kokonaisviive,
+                    "loki": loki,
+                }
+            )
 
-    def luo_esimerkkiverkko_clicked(self):
-        self.simu.luo_esimerkkiverkko()
-        self.paivita_verkko_tiedot()
-        self.piirra_verkko()
-        self.log("Esimerkkiverkko lisätty (Helsinki -> Berlin).")
-
-    def tallenna_topologia_clicked(self):
-        path = filedialog.asksaveasfilename(
-            parent=self,
-            title="Tallenna topologia",
-            defaultextension=".json",
-            filetypes=[("JSON-tiedostot", "*.json"), ("Kaikki tiedostot", "*.*")],
-        )
-        if not path:
-            return
-        topo = self.simu.export_topologia()
-        try:
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(topo, f, ensure_ascii=False, indent=2)
-        except OSError as e:
-            messagebox.showerror("Virhe", f"Tallennus epäonnistui: {e}", parent=self)
-            return
-        self.log(f"Topologia tallennettu: {path}")
 
-    def lataa_topologia_clicked(self):
-        path = filedialog.askopenfilename(
-            parent=self,
-            title="Lataa topologia",
-            filetypes=[("JSON-tiedostot", "*.json"), ("Kaikki tiedostot", "*.*")],
-        )
-        if not path:
-            return
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                topo = json.load(f)
-            self.simu.import_topologia_dict(topo)
-        except (OSError, json.JSONDecodeError) as e:
-            messagebox.showerror("Virhe", f"Lataus epäonnistui: {e}", parent=self)
-            return
-        self.entry_jitter_min.delete(0, tk.END)
-        self.entry_jitter_min.insert(0, str(self.simu.jitter_min))
-        self.entry_jitter_max.delete(0, tk.END)
-        self.entry_jitter_max.insert(0, str(self.simu.jitter_max))
-        self.entry_nukkumisaika.delete(0, tk.END)
-        self.entry_nukkumisaika.insert(0, str(self.simu.nukkumisaika))
-        self.viimeisin_reitti = None
-        self.viimeisin_onnistui = None
-        self.paivita_verkko_tiedot()
-        self.piirra_verkko()
-        self.log(f"Topologia ladattu: {path}")
+def __getattr__(nimi):
+    # GUI ladataan vasta pyydettäessä, jotta simulaattorin ydin ei tuo
+    # Tkinteriä eikä matplotlibia (eräajot, työprosessit, komentorivi).
+    if nimi == "VerkkoGUI":
+        from network_gui import VerkkoGUI
+        return VerkkoGUI
+    raise AttributeError(f"module {__name__!r} has no attribute {nimi!r}")
 
 
 if __name__ == "__main__":
+    from network_gui import VerkkoGUI
+
     app = VerkkoGUI()
     app.mainloop()
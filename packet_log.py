@@ -0,0 +1,884 @@
+import atexit
+import bisect
+import csv
+import io
+import json
+import math
+import os
+import queue
+import threading
+import time
+from array import array
+from collections.abc import Sequence
+from datetime import datetime
+
+import numpy as np
+
+
+TILA_OK = 0
+TILA_HAVISI = 1
+TILA_LINKKI_POISSA = 2
+TILA_PUDOTETTU = 3
+
+# Pakettilokin toissijaiset indeksit (avain -> järjestysnumerot nousevasti)
+INDEKSIT = ("lahettaja", "vastaanottaja", "tila", "linkki", "aika")
+
+_NP_TYYPIT = {"d": np.float64, "i": np.intc, "b": np.int8, "q": np.int64}
+
+CSV_SARAKKEET = [
+    "aika", "lahettaja", "vastaanottaja", "viesti", "reitti_suunniteltu",
+    "reitti_toteutunut", "kokonaisviive_ms", "onnistui", "syy",
+]
+
+
+def _poimi(sarake, indeksit):
+    """Sarakkeen (array) arvot indekseistä NumPy-taulukkona.
+
+    Puskurinäkymä vapautetaan heti, jottei se estä saraketta kasvamasta.
+    """
+    tyyppi = _NP_TYYPIT[sarake.typecode]
+    if not len(indeksit):
+        return np.zeros(0, dtype=tyyppi)
+    nakyma = np.frombuffer(sarake, dtype=tyyppi)
+    try:
+        return nakyma[indeksit]
+    finally:
+        del nakyma
+
+
+def tietue_sanakirjaksi(aika, lahettaja, vastaanottaja, viesti, reitti, toteutuneita, viive, tila):
+    """Muodostaa pakettilokin merkinnän tutussa sanakirjamuodossa."""
+    if tila == TILA_OK:
+        syy = ""
+    elif tila == TILA_HAVISI:
+        syy = f"Paketti hävisi linkillä {reitti[toteutuneita - 1]} -> {reitti[toteutuneita]}"
+    elif tila == TILA_PUDOTETTU:
+        syy = (f"Paketti pudotettiin linkillä {reitti[toteutuneita - 1]} -> {reitti[toteutuneita]} "
+               "(puskuri täynnä tai linkki ylikuormitettu)")
+    else:
+        syy = f"Linkki {reitti[toteutuneita - 1]} -> {reitti[toteutuneita]} ei ole enää käytössä"
+    return {
+        "aika": datetime.fromtimestamp(aika).strftime("%Y-%m-%d %H:%M:%S"),
+        "lahettaja": lahettaja,
+        "vastaanottaja": vastaanottaja,
+        "viesti": viesti,
+        "reitti_suunniteltu": list(reitti),
+        "reitti_toteutunut": list(reitti[:toteutuneita]),
+        "kokonaisviive_ms": viive,
+        "onnistui": tila == TILA_OK,
+        "syy": syy,
+    }
+
+
+class Viivetilasto:
+    """Juoksevat viivetilastot ja logaritminen histogrammi prosenttipisteille.
+
+    Päivitys ja koosteet ovat vakioaikaisia lokin pituudesta riippumatta.
+    Histogrammin lokerot kasvavat suhteellisesti (suhteellinen virhe noin
+    tarkkuus), ja lokeroiden määrä on rajattu: liian pienet arvot yhdistetään
+    alimpaan lokeroon. Kaksi tilastoa voi yhdistää (yhdista).
+    """
+
+    def __init__(self, tarkkuus=0.01, max_lokerot=2048):
+        self.tarkkuus = float(tarkkuus)
+        self.max_lokerot = int(max_lokerot)
+        self._gamma = (1.0 + self.tarkkuus) / (1.0 - self.tarkkuus)
+        self._log_gamma = math.log(self._gamma)
+        self.nollaa()
+
+    def nollaa(self):
+        self.maara = 0
+        self.onnistuneet = 0
+        self.pudotetut = 0
+        self.summa = 0.0
+        self.min = None
+        self.max = None
+        self._nollat = 0
+        self._lokerot = {}
+
+    def _lokero(self, arvo):
+        return math.ceil(math.log(arvo) / self._log_gamma)
+
+    def lisaa(self, viive, onnistui=True, pudotettu=False):
+        self.maara += 1
+        if onnistui:
+            self.onnistuneet += 1
+        elif pudotettu:
+            self.pudotetut += 1
+        self.summa += viive
+        if self.min is None or viive < self.min:
+            self.min = viive
+        if self.max is None or viive > self.max:
+            self.max = viive
+        if viive <= 0.0:
+            self._nollat += 1
+        else:
+            k = self._lokero(viive)
+            self._lokerot[k] = self._lokerot.get(k, 0) + 1
+            if len(self._lokerot) > self.max_lokerot:
+                self._tiivista()
+
+    def lisaa_monta(self, viiveet, onnistuneita, pudotettuja=0):
+        viiveet = np.asarray(viiveet, dtype=np.float64)
+        if len(viiveet) == 0:
+            return
+        self.maara += len(viiveet)
+        self.onnistuneet += int(onnistuneita)
+        self.pudotetut += int(pudotettuja)
+        self.summa += float(viiveet.sum())
+        pienin = float(viiveet.min())
+        suurin = float(viiveet.max())
+        self.min = pienin if self.min is None else min(self.min, pienin)
+        self.max = suurin if self.max is None else max(self.max, suurin)
+        positiiviset = viiveet[viiveet > 0.0]
+        self._nollat += len(viiveet) - len(positiiviset)
+        lokerot, maarat = np.unique(np.ceil(np.log(positiiviset) / self._log_gamma), return_counts=True)
+        for k, c in zip(lokerot.astype(np.int64).tolist(), maarat.tolist()):
+            self._lokerot[k] = self._lokerot.get(k, 0) + c
+        if len(self._lokerot) > self.max_lokerot:
+            self._tiivista()
+
+    def lisaa_painotettu(self, viiveet, painot, onnistuneita):
+        """Kuten lisaa_monta, mutta jokainen viive edustaa painot[i] pakettia."""
+        viiveet = np.asarray(viiveet, dtype=np.float64)
+        painot = np.asarray(painot, dtype=np.int64)
+        if len(viiveet) == 0:
+            return
+        self.maara += int(painot.sum())
+        self.onnistuneet += int(onnistuneita)
+        self.summa += float(viiveet @ painot)
+        pienin = float(viiveet.min())
+        suurin = float(viiveet.max())
+        self.min = pienin if self.min is None else min(self.min, pienin)
+        self.max = suurin if self.max is None else max(self.max, suurin)
+        positiiviset = viiveet > 0.0
+        self._nollat += int(painot[~positiiviset].sum())
+        lokerot, kaanteinen = np.unique(
+            np.ceil(np.log(viiveet[positiiviset]) / self._log_gamma), return_inverse=True
+        )
+        maarat = np.bincount(kaanteinen.ravel(), weights=painot[positiiviset], minlength=len(lokerot))
+        for k, c in zip(lokerot.astype(np.int64).tolist(), maarat.astype(np.int64).tolist()):
+            self._lokerot[k] = self._lokerot.get(k, 0) + c
+        if len(self._lokerot) > self.max_lokerot:
+            self._tiivista()
+
+    def _tiivista(self):
+        avaimet = sorted(self._lokerot)
+        ylimaara = len(avaimet) - self.max_lokerot
+        kohde = avaimet[ylimaara]
+        for k in avaimet[:ylimaara]:
+            self._lokerot[kohde] += self._lokerot.pop(k)
+
+    def yhdista(self, toinen):
+        self.maara += toinen.maara
+        self.onnistuneet += toinen.onnistuneet
+        self.pudotetut += toinen.pudotetut
+        self.summa += toinen.summa
+        if toinen.min is not None:
+            self.min = toinen.min if self.min is None else min(self.min, toinen.min)
+            self.max = toinen.max if self.max is None else max(self.max, toinen.max)
+        self._nollat += toinen._nollat
+        for k, c in toinen._lokerot.items():
+            self._lokerot[k] = self._lokerot.get(k, 0) + c
+        if len(self._lokerot) > self.max_lokerot:
+            self._tiivista()
+        return self
+
+    def prosenttipiste(self, q):
+        """Arvioi q-kvantiilin (0 <= q <= 1); None, jos tilasto on tyhjä."""
+        if self.maara == 0:
+            return None
+        sija = q * (self.maara - 1)
+        kertyma = self._nollat
+        if sija < kertyma:
+            return max(0.0, self.min)
+        for k in sorted(self._lokerot):
+            kertyma += self._lokerot[k]
+            if sija < kertyma:
+                arvio = 2.0 * self._gamma ** k / (self._gamma + 1.0)
+                return min(max(arvio, self.min), self.max)
+        return self.max
+
+    @property
+    def keskiarvo(self):
+        return self.summa / self.maara if self.maara else None
+
+    def koosteet(self):
+        return {
+            "maara": self.maara,
+            "onnistuneet": self.onnistuneet,
+            "epaonnistuneet": self.maara - self.onnistuneet,
+            "pudotetut": self.pudotetut,
+            "keskiviive": self.keskiarvo,
+            "min_viive": self.min,
+            "max_viive": self.max,
+            "p50_viive": self.prosenttipiste(0.50),
+            "p90_viive": self.prosenttipiste(0.90),
+            "p99_viive": self.prosenttipiste(0.99),
+            "p999_viive": self.prosenttipiste(0.999),
+        }
+
+
+class Pakettiloki:
+    """Pakettiloki sarakemuodossa tyypitetyissä taulukoissa.
+
+    Laitteiden nimet internoidaan kokonaisluvuiksi ja reitit tallennetaan
+    kerran yhteiseen tunnistepuskuriin, josta merkinnät viittaavat niihin
+    siirtymällä. Toteutunut reitti on aina suunnitellun reitin alkuosa, joten
+    siitä tallennetaan vain pituus.
+
+    kapasiteetti rajaa säilytettävien merkintöjen määrän (rengaspuskuri).
+    Jos ylivuototiedosto on annettu, poistuvat merkinnät kirjoitetaan sinne
+    JSONL-muodossa hävittämisen sijaan. Kirjoittajana on TiedostoNielu, joka
+    pitää tiedoston auki; sulje() (tai ohjelman päättyminen) kirjoittaa
+    jonon loppuun.
+
+    Kirjauksen yhteydessä ylläpidetään indeksit lähettäjän, vastaanottajan,
+    tilan, häviölinkin ja aikalokeron mukaan (indeksoi=False ohittaa ne),
+    joten kysy()/laske()/hae() käyvät läpi vain ehtoja vastaavat merkinnät.
+    """
+
+    # Aikaindeksin lokeron leveys (s)
+    AIKALOKERO_S = 10.0
+
+    def __init__(self, kapasiteetti=None, ylivuototiedosto=None, indeksoi=True):
+        if kapasiteetti is not None and int(kapasiteetti) <= 0:
+            raise ValueError("Kapasiteetin on oltava positiivinen.")
+        self.kapasiteetti = int(kapasiteetti) if kapasiteetti is not None else None
+        self.ylivuototiedosto = ylivuototiedosto
+        self._ylivuoto = None
+        self.indeksoi = indeksoi
+
+        self._nimet = []
+        self._nimi_idt = {}
+        self._reitti_siirtymat = {}
+        self.tilasto = Viivetilasto()
+        self._nielut = []
+        self._lukko = threading.RLock()
+        self._tyhjenna_sarakkeet()
+
+    def _tyhjenna_sarakkeet(self):
+        self._ajat = array("d")
+        self._lahettajat = array("i")
+        self._vastaanottajat = array("i")
+        self._viiveet = array("d")
+        self._tilat = array("b")
+        self._reitti_alut = array("q")
+        self._reitti_pituudet = array("i")
+        self._toteutuneet = array("i")
+        self._viestit = []
+        self._reittipuskuri = array("i")
+        self._reitti_siirtymat.clear()
+        self._indeksit = {laji: {} for laji in INDEKSIT}
+        self._aikalokerot = []
+        # Taulukoiden alussa olevat jo poistetut merkinnät ja kaikkien
+        # tiivistyksessä pois siirrettyjen merkintöjen määrä
+        self._alku = 0
+        self._siirretyt = 0
+
+    # --- Internointi ---
+
+    def _nimi_id(self, nimi):
+        i = self._nimi_idt.get(nimi)
+        if i is None:
+            i = len(self._nimet)
+            self._nimi_idt[nimi] = i
+            self._nimet.append(nimi)
+        return i
+
+    def _reitti_siirtyma(self, reitti):
+        avain = tuple(reitti)
+        siirtyma = self._reitti_siirtymat.get(avain)
+        if siirtyma is None:
+            siirtyma = len(self._reittipuskuri)
+            self._reittipuskuri.extend(self._nimi_id(n) for n in avain)
+            self._reitti_siirtymat[avain] = siirtyma
+        return siirtyma
+
+    # --- Indeksit ---
+
+    def _indeksi_lista(self, laji, avain):
+        indeksi = self._indeksit[laji]
+        lista = indeksi.get(avain)
+        if lista is None:
+            lista = indeksi[avain] = array("q")
+            if laji == "aika":
+                bisect.insort(self._aikalokerot, avain)
+        return lista
+
+    def _linkki_avain(self, reitti, toteutuneita):
+        return (self._nimi_id(reitti[toteutuneita - 1]) << 32) | self._nimi_id(reitti[toteutuneita])
+
+    def _indeksoi(self, seq, lahettaja_id, vastaanottaja_id, tila, aika, reitti, toteutuneita):
+        self._indeksi_lista("lahettaja", lahettaja_id).append(seq)
+        self._indeksi_lista("vastaanottaja", vastaanottaja_id).append(seq)
+        self._indeksi_lista("tila", tila).append(seq)
+        self._indeksi_lista("aika", int(aika // self.AIKALOKERO_S)).append(seq)
+        if tila != TILA_OK and 0 < toteutuneita < len(reitti):
+            self._indeksi_lista("linkki", self._linkki_avain(reitti, toteutuneita)).append(seq)
+
+    def _indeksoi_ryhmittain(self, laji, avaimet, seqt):
+        """Lisää erän järjestysnumerot indeksiin avainten mukaan ryhmiteltyinä."""
+        if not len(avaimet):
+            return
+        if (avaimet == avaimet[0]).all():
+            self._indeksi_lista(laji, avaimet[0].item()).frombytes(seqt.tobytes())
+            return
+        jarjestys = np.argsort(avaimet, kind="stable")
+        avaimet = avaimet[jarjestys]
+        rajat = np.flatnonzero(avaimet[1:] != avaimet[:-1]) + 1
+        alut = np.concatenate(([0], rajat))
+        for avain, osa in zip(avaimet[alut].tolist(), np.split(seqt[jarjestys], rajat)):
+            self._indeksi_lista(laji, avain).frombytes(osa.tobytes())
+
+    def _indeksoi_monta(self, alku, aika, reitit, toteutuneita, tilat):
+        seqt = np.arange(self._siirretyt + alku, self._siirretyt + len(self._ajat), dtype=np.int64)
+        self._indeksoi_ryhmittain("lahettaja", np.frombuffer(self._lahettajat[alku:], dtype=np.intc), seqt)
+        self._indeksoi_ryhmittain("vastaanottaja", np.frombuffer(self._vastaanottajat[alku:], dtype=np.intc), seqt)
+        self._indeksoi_ryhmittain("tila", tilat, seqt)
+        self._indeksi_lista("aika", int(aika // self.AIKALOKERO_S)).frombytes(seqt.tobytes())
+        virheet = np.flatnonzero(tilat != TILA_OK)
+        if len(virheet):
+            toteutuneita = np.asarray(toteutuneita)
+            kelvolliset = [
+                (i, self._linkki_avain(reitit[i], t))
+                for i, t in zip(virheet.tolist(), toteutuneita[virheet].tolist())
+                if 0 < t < len(reitit[i])
+            ]
+            if kelvolliset:
+                indeksit, avaimet = zip(*kelvolliset)
+                self._indeksoi_ryhmittain("linkki", np.array(avaimet, dtype=np.int64), seqt[list(indeksit)])
+
+    def _karsi_indeksit(self):
+        """Poistaa indekseistä lokista jo poistuneet järjestysnumerot."""
+        raja = self.ensimmainen
+        for indeksi in self._indeksit.values():
+            for avain in list(indeksi):
+                lista = indeksi[avain]
+                k = bisect.bisect_left(lista, raja)
+                if k == len(lista):
+                    del indeksi[avain]
+                elif k:
+                    del lista[:k]
+        self._aikalokerot = sorted(self._indeksit["aika"])
+
+    # --- Kirjaus ---
+
+    def lisaa(self, lahettaja, vastaanottaja, viesti, suunniteltu, toteutuneita, kokonaisviive, tila, aika=None):
+        """Kirjaa yhden paketin ja palauttaa sen järjestysnumeron.
+
+        toteutuneita on toteutuneen reitin solmujen määrä.
+        """
+        with self._lukko:
+            aika = time.time() if aika is None else aika
+            lahettaja_id = self._nimi_id(lahettaja)
+            vastaanottaja_id = self._nimi_id(vastaanottaja)
+            self._ajat.append(aika)
+            self._lahettajat.append(lahettaja_id)
+            self._vastaanottajat.append(vastaanottaja_id)
+            self._viiveet.append(kokonaisviive)
+            self._tilat.append(tila)
+            self._reitti_alut.append(self._reitti_siirtyma(suunniteltu))
+            self._reitti_pituudet.append(len(suunniteltu))
+            self._toteutuneet.append(toteutuneita)
+            self._viestit.append(viesti)
+            self.tilasto.lisaa(kokonaisviive, tila == TILA_OK, tila == TILA_PUDOTETTU)
+            if self._nielut:
+                tietueet = ((aika, lahettaja, vastaanottaja, viesti, suunniteltu,
+                             toteutuneita, kokonaisviive, tila),)
+                for nielu in self._nielut:
+                    nielu.vastaanota(tietueet)
+            seq = self._siirretyt + len(self._ajat) - 1
+            if self.indeksoi:
+                self._indeksoi(seq, lahettaja_id, vastaanottaja_id, tila, aika, suunniteltu, toteutuneita)
+            self._rajaa()
+            return seq
+
+    def lisaa_monta(self, lahettajat, vastaanottajat, viesti, reitit, toteutuneita, viiveet, tilat, aika=None):
+        """Kirjaa erän paketteja; reitit on suunniteltu reitti merkintää kohden.
+
+        Numeeriset sarakkeet voivat olla NumPy-taulukoita.
+        """
+        with self._lukko:
+            aika = time.time() if aika is None else aika
+            reitti_muisti = {}
+            alut = []
+            for reitti in reitit:
+                siirtyma = reitti_muisti.get(id(reitti))
+                if siirtyma is None:
+                    siirtyma = reitti_muisti[id(reitti)] = self._reitti_siirtyma(reitti)
+                alut.append(siirtyma)
+            n = len(alut)
+            alku = len(self._ajat)
+            self._ajat.extend([aika] * n)
+            self._lahettajat.extend(self._nimi_id(x) for x in lahettajat)
+            self._vastaanottajat.extend(self._nimi_id(x) for x in vastaanottajat)
+            viiveet = np.asarray(viiveet, dtype=np.float64)
+            tilat = np.asarray(tilat, dtype=np.int8)
+            self._viiveet.frombytes(viiveet.tobytes())
+            self._tilat.frombytes(tilat.tobytes())
+            self._reitti_alut.extend(alut)
+            self._reitti_pituudet.extend(len(r) for r in reitit)
+            self._toteutuneet.frombytes(np.asarray(toteutuneita, dtype=np.int32).tobytes())
+            self._viestit.extend([viesti] * n)
+            self.tilasto.lisaa_monta(
+                viiveet, np.count_nonzero(tilat == TILA_OK), np.count_nonzero(tilat == TILA_PUDOTETTU)
+            )
+            if self._nielut:
+                sarakkeet = (
+                    [aika] * n, list(lahettajat), list(vastaanottajat), [viesti] * n, list(reitit),
+                    np.asarray(toteutuneita).tolist(), viiveet.tolist(), tilat.tolist(),
+                )
+                for nielu in self._nielut:
+                    # Nielu purkaa sarakkeet vasta omassa säikeessään
+                    nielu.vastaanota(zip(*sarakkeet))
+            if self.indeksoi:
+                self._indeksoi_monta(alku, aika, reitit, toteutuneita, tilat)
+            self._rajaa()
+
+    def _rajaa(self):
+        if self.kapasiteetti is None:
+            return
+        ylimaara = len(self._ajat) - self._alku - self.kapasiteetti
+        if ylimaara <= 0:
+            return
+        if self.ylivuototiedosto:
+            self._kirjoita_ylivuoto(self._alku, self._alku + ylimaara)
+        self._alku += ylimaara
+        # Tiivistetään vasta, kun poistettuja on kertynyt riittävästi, jotta
+        # siirtojen hinta jakautuu monelle lisäykselle.
+        if self._alku >= max(1024, self.kapasiteetti // 2):
+            self._tiivista()
+
+    def _tiivista(self):
+        k = self._alku
+        vanhat_alut = self._reitti_alut[k:]
+        vanhat_pituudet = self._reitti_pituudet[k:]
+        vanha_puskuri = self._reittipuskuri
+        for sarake in (self._ajat, self._lahettajat, self._vastaanottajat, self._viiveet,
+                       self._tilat, self._reitti_alut, self._reitti_pituudet, self._toteutuneet):
+            del sarake[:k]
+        del self._viestit[:k]
+        self._siirretyt += k
+        self._alku = 0
+
+        # Reittipuskuriin jätetään vain elossa olevien merkintöjen reitit
+        self._reittipuskuri = array("i")
+        self._reitti_siirtymat = {}
+        uudet = {}
+        for i, (alku, pituus) in enumerate(zip(vanhat_alut, vanhat_pituudet)):
+            uusi = uudet.get(alku)
+            if uusi is None:
+                uusi = uudet[alku] = len(self._reittipuskuri)
+                osa = vanha_puskuri[alku:alku + pituus]
+                self._reittipuskuri.extend(osa)
+                self._reitti_siirtymat[tuple(self._nimet[j] for j in osa)] = uusi
+            self._reitti_alut[i] = uusi
+        if self.indeksoi:
+            self._karsi_indeksit()
+
+    def _kirjoita_ylivuoto(self, alku, loppu):
+        if self._ylivuoto is None:
+            self._ylivuoto = TiedostoNielu(self.ylivuototiedosto, muoto="jsonl")
+            atexit.register(self.sulje)
+        nimet = self._nimet
+        puskuri = self._reittipuskuri
+        tietueet = []
+        for i in range(alku, loppu):
+            reitti_alku = self._reitti_alut[i]
+            tietueet.append((
+                self._ajat[i], nimet[self._lahettajat[i]], nimet[self._vastaanottajat[i]], self._viestit[i],
+                [nimet[j] for j in puskuri[reitti_alku:reitti_alku + self._reitti_pituudet[i]]],
+                self._toteutuneet[i], self._viiveet[i], self._tilat[i],
+            ))
+        self._ylivuoto.vastaanota(tietueet)
+
+    def sulje(self):
+        """Kirjoittaa ylivuototiedoston jonon loppuun ja sulkee sen (uusi ylivuoto avaa sen uudelleen)."""
+        with self._lukko:
+            nielu, self._ylivuoto = self._ylivuoto, None
+        if nielu is not None:
+            atexit.unregister(self.sulje)
+            nielu.sulje()
+
+    def lisaa_nielu(self, nielu):
+        """Liittää nielun, joka saa jokaisen tästä eteenpäin kirjatun merkinnän."""
+        with self._lukko:
+            # Lista vaihdetaan kokonaan, jottei sen läpikäynti näe puolivalmista muutosta
+            self._nielut = self._nielut + [nielu]
+
+    def poista_nielu(self, nielu):
+        """Irrottaa nielun; tuntematon nielu ohitetaan."""
+        with self._lukko:
+            self._nielut = [n for n in self._nielut if n is not nielu]
+
+    def clear(self):
+        with self._lukko:
+            # Järjestysnumerot jatkuvat, jotta vanhat näkymät eivät osoita uusiin merkintöihin
+            seuraava = self.seuraava
+            self._tyhjenna_sarakkeet()
+            self._siirretyt = seuraava
+            self.tilasto.nollaa()
+
+    # --- Luku ---
+
+    def __len__(self):
+        return len(self._ajat) - self._alku
+
+    @property
+    def ensimmainen(self):
+        """Vanhimman säilytetyn merkinnän järjestysnumero."""
+        return self._siirretyt + self._alku
+
+    @property
+    def seuraava(self):
+        """Seuraavaksi kirjattavan merkinnän järjestysnumero."""
+        return self._siirretyt + len(self._ajat)
+
+    def _muodosta(self, i):
+        alku = self._reitti_alut[i]
+        reitti = [self._nimet[j] for j in self._reittipuskuri[alku:alku + self._reitti_pituudet[i]]]
+        return tietue_sanakirjaksi(
+            self._ajat[i],
+            self._nimet[self._lahettajat[i]],
+            self._nimet[self._vastaanottajat[i]],
+            self._viestit[i],
+            reitti,
+            self._toteutuneet[i],
+            self._viiveet[i],
+            self._tilat[i],
+        )
+
+    def merkinta(self, seq):
+        """Muodostaa järjestysnumeroa vastaavan merkinnän sanakirjaksi."""
+        with self._lukko:
+            i = seq - self._siirretyt
+            if i < self._alku or i >= len(self._ajat):
+                raise IndexError(f"Pakettilokin merkintää {seq} ei ole (enää) tallessa.")
+            return self._muodosta(i)
+
+    def koosteet(self):
+        with self._lukko:
+            return self.tilasto.koosteet()
+
+    def sarake(self, nimi):
+        """Palauttaa kopion säilytettyjen merkintöjen sarakkeesta (viiveet, tilat, ajat)."""
+        sarakkeet = {"viiveet": self._viiveet, "tilat": self._tilat, "ajat": self._ajat}
+        return sarakkeet[nimi][self._alku:]
+
+    def nakyma(self):
+        return PakettilokiNakyma(self, self.ensimmainen, self.seuraava)
+
+    def __iter__(self):
+        return iter(self.nakyma())
+
+    def __getitem__(self, indeksi):
+        return self.nakyma()[indeksi]
+
+    # --- Kyselyt ---
+
+    @staticmethod
+    def _rajattu_koko(lista, ala, yla):
+        return bisect.bisect_left(lista, yla) - bisect.bisect_left(lista, ala)
+
+    def _ehdokkaat(self, ehdot, ala, yla):
+        """Pienin indeksin antama ehdokasjoukko järjestysnumeroina tai None."""
+        listat = []
+        for laji, avaimet in ehdot:
+            indeksi = self._indeksit[laji]
+            osat = [indeksi[a] for a in avaimet if a in indeksi]
+            listat.append((sum(self._rajattu_koko(l, ala, yla) for l in osat), osat))
+        if not listat:
+            return None
+        _, osat = min(listat, key=lambda x: x[0])
+        paloina = []
+        for lista in osat:
+            # Viipale on kopio, joten NumPy-näkymä ei lukitse indeksiä
+            osa = lista[bisect.bisect_left(lista, ala):bisect.bisect_left(lista, yla)]
+            if len(osa):
+                paloina.append(np.frombuffer(osa, dtype=np.int64))
+        if not paloina:
+            return np.zeros(0, dtype=np.int64)
+        return paloina[0] if len(paloina) == 1 else np.sort(np.concatenate(paloina))
+
+    def kysy(self, lahettaja=None, vastaanottaja=None, tilat=None, linkki=None, alkaen=None, asti=None,
+             jalkeen=None, ennen=None):
+        """Ehtoja vastaavien säilytettyjen merkintöjen järjestysnumerot nousevasti.
+
+        tilat on joukko TILA_*-arvoja ja linkki laitepari, jolla paketti hävisi
+        tai katkesi (kumpaan suuntaan tahansa). alkaen ja asti rajaavat
+        kirjausajan (time.time(), asti ei sisälly), jalkeen ja ennen
+        järjestysnumerot. Indeksien avulla käydään läpi vain pienin yksittäistä
+        ehtoa vastaava joukko.
+        """
+        with self._lukko:
+            ala = self.ensimmainen if jalkeen is None else max(self.ensimmainen, jalkeen + 1)
+            yla = self.seuraava if ennen is None else min(self.seuraava, ennen)
+            tyhja = np.zeros(0, dtype=np.int64)
+            if ala >= yla:
+                return tyhja
+            ehdot = []
+            tarkistukset = []
+            for laji, nimi, sarake in (("lahettaja", lahettaja, self._lahettajat),
+                                       ("vastaanottaja", vastaanottaja, self._vastaanottajat)):
+                if nimi is not None:
+                    if nimi not in self._nimi_idt:
+                        return tyhja
+                    ehdot.append((laji, (self._nimi_idt[nimi],)))
+                    tarkistukset.append((sarake, (self._nimi_idt[nimi],)))
+            if tilat is not None:
+                tilat = tuple(int(t) for t in tilat)
+                ehdot.append(("tila", tilat))
+                tarkistukset.append((self._tilat, tilat))
+            linkki_idt = None
+            if linkki is not None:
+                a, b = linkki
+                if a not in self._nimi_idt or b not in self._nimi_idt:
+                    return tyhja
+                linkki_idt = (self._nimi_idt[a], self._nimi_idt[b])
+                ehdot.append(("linkki", ((linkki_idt[0] << 32) | linkki_idt[1], (linkki_idt[1] << 32) | linkki_idt[0])))
+            if alkaen is not None or asti is not None:
+                lokerot = self._aikalokerot
+                i = 0 if alkaen is None else bisect.bisect_left(lokerot, int(alkaen // self.AIKALOKERO_S))
+                j = len(lokerot) if asti is None else bisect.bisect_right(lokerot, int(asti // self.AIKALOKERO_S))
+                ehdot.append(("aika", lokerot[i:j]))
+
+            seqt = self._ehdokkaat(ehdot, ala, yla) if self.indeksoi else None
+            if seqt is None:
+                seqt = np.arange(ala, yla, dtype=np.int64)
+            # Loput ehdot tarkistetaan ehdokkaille suoraan sarakkeista
+            rivit = seqt - self._siirretyt
+            for sarake, sallitut in tarkistukset:
+                arvot = _poimi(sarake, rivit)
+                maski = arvot == sallitut[0] if len(sallitut) == 1 else np.isin(arvot, sallitut)
+                seqt, rivit = seqt[maski], rivit[maski]
+            if alkaen is not None or asti is not None:
+                ajat = _poimi(self._ajat, rivit)
+                maski = np.ones(len(ajat), dtype=bool)
+                if alkaen is not None:
+                    maski &= ajat >= alkaen
+                if asti is not None:
+                    maski &= ajat < asti
+                seqt, rivit = seqt[maski], rivit[maski]
+            if linkki_idt is not None:
+                toteutuneet = _poimi(self._toteutuneet, rivit)
+                pituudet = _poimi(self._reitti_pituudet, rivit)
+                maski = (_poimi(self._tilat, rivit) != TILA_OK) & (toteutuneet > 0) & (toteutuneet < pituudet)
+                seqt, rivit, toteutuneet = seqt[maski], rivit[maski], toteutuneet[maski]
+                kohdat = _poimi(self._reitti_alut, rivit) + toteutuneet
+                u = _poimi(self._reittipuskuri, kohdat - 1)
+                v = _poimi(self._reittipuskuri, kohdat)
+                a, b = linkki_idt
+                seqt = seqt[((u == a) & (v == b)) | ((u == b) & (v == a))]
+            return seqt
+
+    def laske(self, **ehdot):
+        """Ehtoja vastaavien säilytettyjen merkintöjen määrä (ehdot kuten kysy)."""
+        with self._lukko:
+            if all(arvo is None for arvo in ehdot.values()):
+                return len(self)
+            return len(self.kysy(**ehdot))
+
+    def hae(self, maara=100, jatka=None, uusimmat_ensin=False, **ehdot):
+        """Sivullinen ehtoja vastaavia merkintöjä sanakirjoina (lisänä seq).
+
+        Seuraava sivu haetaan antamalla edellisen sivun viimeinen seq
+        jatka-parametrina.
+        """
+        with self._lukko:
+            rajat = {"ennen": jatka} if uusimmat_ensin else {"jalkeen": jatka}
+            if all(arvo is None for arvo in ehdot.values()):
+                ala = self.ensimmainen if uusimmat_ensin or jatka is None else max(self.ensimmainen, jatka + 1)
+                yla = self.seuraava if not uusimmat_ensin or jatka is None else min(self.seuraava, jatka)
+                if uusimmat_ensin:
+                    seqt = range(yla - 1, max(ala, yla - maara) - 1, -1)
+                else:
+                    seqt = range(ala, min(yla, ala + maara))
+            else:
+                seqt = self.kysy(**ehdot, **rajat)
+                seqt = seqt[::-1][:maara] if uusimmat_ensin else seqt[:maara]
+                seqt = seqt.tolist()
+            merkinnat = []
+            for seq in seqt:
+                merkinta = self._muodosta(seq - self._siirretyt)
+                merkinta["seq"] = seq
+                merkinnat.append(merkinta)
+            return merkinnat
+
+
+class PakettilokiNakyma(Sequence):
+    """Laiska näkymä pakettilokin merkintöihin; sanakirjat muodostetaan vasta luettaessa."""
+
+    def __init__(self, loki, alku, loppu):
+        self._loki = loki
+        self._alku = alku
+        self._loppu = loppu
+
+    def __len__(self):
+        return self._loppu - self._alku
+
+    def __getitem__(self, indeksi):
+        if isinstance(indeksi, slice):
+            alku, loppu, askel = indeksi.indices(len(self))
+            if askel == 1:
+                return PakettilokiNakyma(self._loki, self._alku + alku, self._alku + max(alku, loppu))
+            return [self._loki.merkinta(self._alku + i) for i in range(alku, loppu, askel)]
+        if indeksi < 0:
+            indeksi += len(self)
+        if indeksi < 0 or indeksi >= len(self):
+            raise IndexError("Indeksi on näkymän ulkopuolella.")
+        return self._loki.merkinta(self._alku + indeksi)
+
+    def __iter__(self):
+        for seq in range(self._alku, self._loppu):
+            yield self._loki.merkinta(seq)
+
+
+class TiedostoNielu:
+    """Kirjoittaa pakettilokin merkinnät JSONL- tai CSV-tiedostoon taustasäikeessä.
+
+    vastaanota() vain asettaa merkinnät jonoon, joten lähetyspolku ei odota
+    levyä. Kirjoittaja puskuroi rivit ja huuhtelee ne tiedostoon
+    huuhteluvali-sekunnin välein. Jos max_koko (tavua) on annettu, tiedosto
+    kierrätetään: polku -> polku.1 -> ... -> polku.<max_tiedostot>.
+
+    Jonossa on enintään max_jono lähetyserää; täydellä jonolla vastaanota()
+    odottaa kirjoittajaa, jotta hidas levy ei kasvata muistinkäyttöä
+    rajatta. Sulkemisen jälkeen saapuvat merkinnät vain lasketaan
+    (kirjoittamatta). Jos loki on annettu, nielu liitetään siihen, ja
+    sulje() irrottaa sen ennen jonon tyhjentämistä.
+
+    Kirjoitusvirheet (esim. täysi levy) eivät pysäytä kirjoittajaa:
+    epäonnistuneet merkinnät lasketaan (kirjoittamatta), ensimmäinen virhe
+    jää talteen (virhe) ja sulje() nostaa sen RuntimeErrorina.
+    """
+
+    _LOPPU = object()
+    # Täyden jonon odotusjakso, jonka välein sulkeminen tarkistetaan (s)
+    _ODOTUSJAKSO = 0.1
+
+    def __init__(self, polku, muoto=None, max_koko=None, max_tiedostot=5, huuhteluvali=1.0, max_jono=1024,
+                 loki=None):
+        if muoto is None:
+            muoto = "csv" if str(polku).lower().endswith(".csv") else "jsonl"
+        if muoto not in ("jsonl", "csv"):
+            raise ValueError("Tuetut muodot ovat 'jsonl' ja 'csv'.")
+        self.polku = str(polku)
+        self.muoto = muoto
+        self.max_koko = int(max_koko) if max_koko else None
+        self.max_tiedostot = int(max_tiedostot)
+        self.huuhteluvali = float(huuhteluvali)
+        self.kirjoitetut = 0
+        self.kirjoittamatta = 0
+        self.virhe = None
+        self._suljettu = False
+        self._jono = queue.Queue(maxsize=int(max_jono))
+        self._tiedosto = None
+        self._koko = 0
+        self._avaa()
+        self._saie = threading.Thread(target=self._kirjoittaja, name="TiedostoNielu", daemon=True)
+        self._saie.start()
+        self._loki = loki
+        if loki is not None:
+            loki.lisaa_nielu(self)
+
+    def vastaanota(self, tietueet):
+        while not self._suljettu and self._saie.is_alive():
+            try:
+                self._jono.put(tietueet, timeout=self._ODOTUSJAKSO)
+                return
+            except queue.Full:
+                pass
+        self.kirjoittamatta += len(tietueet)
+
+    def sulje(self):
+        """Kirjoittaa jonon loppuun ja sulkee tiedoston; nostaa kirjoituksen aikaisen virheen."""
+        if self._loki is not None:
+            self._loki.poista_nielu(self)
+            self._loki = None
+        self._suljettu = True
+        if self._saie.is_alive():
+            self._jono.put(self._LOPPU)
+            self._saie.join()
+        if self.virhe is not None:
+            raise RuntimeError(
+                f"Pakettilokin kirjoitus tiedostoon {self.polku} epäonnistui "
+                f"({self.kirjoittamatta} merkintää jäi kirjoittamatta): {self.virhe}"
+            ) from self.virhe
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.sulje()
+
+    # --- Taustasäie ---
+
+    def _avaa(self):
+        self._tiedosto = open(self.polku, "a", encoding="utf-8", newline="")
+        self._koko = self._tiedosto.tell()
+        if self.muoto == "csv" and self._koko == 0:
+            self._kirjoita_rivi(self._csv_rivi(CSV_SARAKKEET))
+
+    def _kierraa(self):
+        self._tiedosto.close()
+        for i in range(self.max_tiedostot - 1, 0, -1):
+            vanha = f"{self.polku}.{i}"
+            if os.path.exists(vanha):
+                os.replace(vanha, f"{self.polku}.{i + 1}")
+        os.replace(self.polku, f"{self.polku}.1")
+        self._avaa()
+
+    @staticmethod
+    def _csv_rivi(arvot):
+        puskuri = io.StringIO()
+        csv.writer(puskuri).writerow(arvot)
+        return puskuri.getvalue()
+
+    def _muotoile(self, tietue):
+        m = tietue_sanakirjaksi(*tietue)
+        if self.muoto == "jsonl":
+            return json.dumps(m, ensure_ascii=False) + "\n"
+        m["reitti_suunniteltu"] = " -> ".join(m["reitti_suunniteltu"])
+        m["reitti_toteutunut"] = " -> ".join(m["reitti_toteutunut"])
+        return self._csv_rivi([m[k] for k in CSV_SARAKKEET])
+
+    def _kirjoita_rivi(self, rivi):
+        self._tiedosto.write(rivi)
+        self._koko += len(rivi.encode("utf-8"))
+
+    def _kirjaa_virhe(self, virhe, maara=1):
+        if self.virhe is None:
+            self.virhe = virhe
+        self.kirjoittamatta += maara
+
+    def _kirjoittaja(self):
+        seuraava_huuhtelu = time.monotonic() + self.huuhteluvali
+        try:
+            while True:
+                try:
+                    tietueet = self._jono.get(timeout=max(0.0, seuraava_huuhtelu - time.monotonic()))
+                except queue.Empty:
+                    tietueet = None
+                if tietueet is self._LOPPU:
+                    break
+                if tietueet is not None:
+                    for tietue in tietueet:
+                        try:
+                            self._kirjoita_rivi(self._muotoile(tietue))
+                            self.kirjoitetut += 1
+                            if self.max_koko and self._koko >= self.max_koko:
+                                self._kierraa()
+                        except Exception as e:
+                            self._kirjaa_virhe(e)
+                if time.monotonic() >= seuraava_huuhtelu:
+                    try:
+                        self._tiedosto.flush()
+                    except OSError as e:
+                        self._kirjaa_virhe(e, 0)
+                    seuraava_huuhtelu = time.monotonic() + self.huuhteluvali
+        finally:
+            try:
+                self._tiedosto.close()
+            except OSError as e:
+                self._kirjaa_virhe(e, 0)
@@ -0,0 +1,75 @@
+"""Linkkien jonojen analyyttinen arvio.
+
+Linkki on yhden palvelijan jono, jonka palveluaika on paketin lähetysaika
+kaistalla. Tarjottu kuorma (rho = saapumisnopeus / palvelunopeus) antaa
+vakiotilan keskimääräisen jonotusajan ja täyden puskurin aiheuttaman
+pudotustodennäköisyyden (tail drop):
+
+    jonotus, pudotus = arvioi_jonot(rho, puskuri, "mm1")
+    jonoviive_ms = jonotus * palveluaika_ms
+
+Äärellinen puskuri (K pakettia jonossa, lisäksi yksi lähetettävänä)
+mallinnetaan M/M/1/K-jonona. M/D/1-malli (vakiomittaiset paketit) saadaan
+Pollaczek–Khinchinen kertoimella (1 + Cs²) / 2 = 1/2: jonotusaika puolittuu ja
+puskuri riittää kaksinkertaiselle jonolle. Äärellisellä puskurilla tämä on
+likiarvo.
+"""
+
+import numpy as np
+
+JONOMALLIT = ("mm1", "md1")
+
+
+def palveluaika_ms(kaista_mbps, pakettikoko_tavua):
+    """Paketin lähetysaika (ms) kaistalla."""
+    return pakettikoko_tavua * 8.0 / (np.asarray(kaista_mbps, dtype=np.float64) * 1e3)
+
+
+def _mm1k(rho, kapasiteetti):
+    """M/M/1/K: keskimääräinen pakettimäärä järjestelmässä ja estotodennäköisyys.
+
+    kapasiteetti on paikkojen määrä palvelu mukaan lukien (voi olla inf).
+    """
+    rho = np.asarray(rho, dtype=np.float64)
+    k = np.broadcast_to(np.asarray(kapasiteetti, dtype=np.float64), rho.shape)
+    maara = np.empty(rho.shape)
+    esto = np.empty(rho.shape)
+    with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+        ali = rho < 1.0 - 1e-9
+        yli = rho > 1.0 + 1e-9
+        tasa = ~(ali | yli)
+        # rho < 1: jakauma p_n ~ rho^n
+        r, kk = rho[ali], k[ali]
+        rk1 = np.where(np.isinf(kk), 0.0, r ** (kk + 1))
+        maara[ali] = r / (1.0 - r) - np.where(np.isinf(kk), 0.0, (kk + 1) * rk1 / (1.0 - rk1))
+        esto[ali] = np.where(np.isinf(kk), 0.0, (1.0 - r) * r ** kk / (1.0 - rk1))
+        # rho > 1: tyhjät paikat ovat jono kuormalla 1/rho (vältetään rho^K:n ylivuoto)
+        s, kk = 1.0 / rho[yli], k[yli]
+        sk1 = np.where(np.isinf(kk), 0.0, s ** (kk + 1))
+        tyhjat = s / (1.0 - s) - np.where(np.isinf(kk), 0.0, (kk + 1) * sk1 / (1.0 - sk1))
+        maara[yli] = kk - tyhjat
+        esto[yli] = np.where(np.isinf(kk), 0.0, (1.0 - s) / (1.0 - sk1))
+        kk = k[tasa]
+        maara[tasa] = kk / 2.0
+        esto[tasa] = 1.0 / (kk + 1.0)
+    return maara, esto
+
+
+def arvioi_jonot(rho, puskuri=None, malli="mm1"):
+    """Vakiotilan jonotusaika palveluaikoina ja pudotustodennäköisyys.
+
+    rho on kuormitusaste, puskuri jonopaikkojen määrä (None tai inf =
+    rajaton). Rajaton puskuri ei pudota, mutta ylikuormitetun (rho >= 1)
+    linkin jonotusaika on ääretön.
+    """
+    if malli not in JONOMALLIT:
+        raise ValueError(f"Tuntematon jonomalli '{malli}' (vaihtoehdot: {', '.join(JONOMALLIT)}).")
+    rho = np.asarray(rho, dtype=np.float64)
+    puskuri = np.inf if puskuri is None else np.asarray(puskuri, dtype=np.float64)
+    kerroin = 0.5 if malli == "md1" else 1.0
+    maara, pudotus = _mm1k(rho, puskuri / kerroin + 1.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Littlen laki läpi päässeille: W = L / (lambda * (1 - P)), jonotus = W - palveluaika
+        jonotus = np.where(rho > 0, maara / (rho * (1.0 - pudotus)) - 1.0, 0.0) * kerroin
+    jonotus = np.where(np.isfinite(maara), np.maximum(jonotus, 0.0), np.inf)
+    return jonotus, pudotus
@@ -0,0 +1,105 @@
+"""Laitenimien haku Tkinterin pudotusvalikoihin.
+
+Nimihakemisto pitää nimet aakkosjärjestyksessä (kirjainkoosta riippumatta),
+joten yksittäinen lisäys tai poisto on binäärihaku eikä koko listan
+uudelleenrakennus. HakuCombobox ei pidä kaikkia nimiä arvoinaan, vaan
+hakee kirjoitettaessa (lyhyen tauon jälkeen) ja valikon avautuessa enintään
+MAX_VAIHTOEHDOT nimeä, jotka vastaavat kenttään kirjoitettua tekstiä: ensin
+alkuosaltaan täsmäävät, sitten ne, joiden keskellä teksti esiintyy.
+"""
+
+import bisect
+from tkinter import ttk
+
+
+class Nimihakemisto:
+    """Järjestetty nimijoukko, josta haetaan alku- ja osamerkkijonolla."""
+
+    def __init__(self, nimet=()):
+        self.aseta(nimet)
+
+    def aseta(self, nimet):
+        self._avaimet = sorted((nimi.casefold(), nimi) for nimi in nimet)
+
+    def _kohta(self, nimi):
+        return bisect.bisect_left(self._avaimet, (nimi.casefold(), nimi))
+
+    def __contains__(self, nimi):
+        i = self._kohta(nimi)
+        return i < len(self._avaimet) and self._avaimet[i][1] == nimi
+
+    def __len__(self):
+        return len(self._avaimet)
+
+    def lisaa(self, nimi):
+        if nimi not in self:
+            self._avaimet.insert(self._kohta(nimi), (nimi.casefold(), nimi))
+
+    def poista(self, nimi):
+        if nimi in self:
+            del self._avaimet[self._kohta(nimi)]
+
+    def hae(self, teksti="", maara=200):
+        """Enintään maara nimeä, joissa teksti esiintyy; alkuosan osumat ensin."""
+        haku = teksti.strip().casefold()
+        avaimet = self._avaimet
+        if not haku:
+            return [nimi for _, nimi in avaimet[:maara]]
+        tulos = []
+        i = bisect.bisect_left(avaimet, (haku,))
+        while i < len(avaimet) and len(tulos) < maara and avaimet[i][0].startswith(haku):
+            tulos.append(avaimet[i][1])
+            i += 1
+        if len(tulos) < maara:
+            for avain, nimi in avaimet:
+                if haku in avain and not avain.startswith(haku):
+                    tulos.append(nimi)
+                    if len(tulos) >= maara:
+                        break
+        return tulos
+
+
+class HakuCombobox(ttk.Combobox):
+    """Pudotusvalikko, jonka vaihtoehdot suodatetaan kirjoitetulla tekstillä.
+
+    kiinteat näytetään aina ensimmäisinä (esim. "(kaikki)"); jos kentässä on
+    jokin niistä, suodatinta ei käytetä.
+    """
+
+    MAX_VAIHTOEHDOT = 200
+    # Näppäilytauko (ms), jonka jälkeen vaihtoehdot suodatetaan uudelleen
+    HAKUVIIVE_MS = 150
+
+    # Näppäimet, jotka eivät muuta kentän tekstiä
+    _OHITETUT = {"Up", "Down", "Return", "Escape", "Tab", "Left", "Right", "Home", "End"}
+
+    def __init__(self, master, hakemisto, kiinteat=(), **kwargs):
+        super().__init__(master, postcommand=self._paivita_vaihtoehdot, **kwargs)
+        self.hakemisto = hakemisto
+        self.kiinteat = list(kiinteat)
+        self["values"] = self.kiinteat
+        self._ajastus = None
+        self.bind("<KeyRelease>", self._kirjoitettu, add="+")
+
+    def _kirjoitettu(self, event):
+        if event.keysym in self._OHITETUT:
+            return
+        if self._ajastus is not None:
+            self.after_cancel(self._ajastus)
+        self._ajastus = self.after(self.HAKUVIIVE_MS, self._suodata)
+
+    def _suodata(self):
+        self._ajastus = None
+        self._paivita_vaihtoehdot()
+
+    def destroy(self):
+        if self._ajastus is not None:
+            self.after_cancel(self._ajastus)
+            self._ajastus = None
+        super().destroy()
+
+    def _paivita_vaihtoehdot(self):
+        teksti = self.get()
+        if teksti in self.kiinteat:
+            teksti = ""
+        self["values"] = self.kiinteat + self.hakemisto.hae(teksti, self.MAX_VAIHTOEHDOT)
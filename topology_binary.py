@@ -0,0 +1,314 @@
+"""Binäärinen topologiatiedosto suurille verkoille (.ntopo).
+
+JSON-muodon laite- ja yhteysoliot vievät miljoonan yhteyden verkossa
+moninkertaisesti tiedoston koon verran muistia. Binääritiedostossa on
+nimitaulukko ja verkko valmiiksi CSR-muodossa (ks. graph_snapshot.py), joten
+taulukot voi muistikuvata (mmap) ja antaa reititykselle kopioimatta:
+
+    simu.vie_binaari("verkko.ntopo")
+    simu.tuo_binaari("verkko.ntopo")
+
+    json_binaariksi("verkko.json", "verkko.ntopo")
+    binaari_jsoniksi("verkko.ntopo", "verkko.json")
+
+Rakenne: tunniste (8 tavua), otsakkeen pituus (uint64), JSON-otsake
+(versio, taulukoiden tyypit, muodot ja sijainnit, laitetyyppien nimet ja
+settings-lohko) ja 64 tavuun tasatut little-endian-taulukot:
+
+    nimet_tavut, nimet_alut   laitteiden nimet UTF-8:na ja alkukohdat (n + 1)
+    tyypit                    laitetyypin indeksi otsakkeen tyyppilistaan
+    indptr, naapurit          CSR-vierekkäisyys, jokainen yhteys molempiin suuntiin
+    viiveet, haviot           linkkikohtaiset arvot samoissa indekseissä
+    kaistat, puskurit         valinnaiset (nan / -1 = rajaton)
+"""
+
+import json
+import struct
+
+import numpy as np
+
+TUNNISTE = b"NSTOPO\x00\x01"
+VERSIO = 1
+TASAUS = 64
+PAATE = ".ntopo"
+
+_TAULUKOT = {
+    "nimet_tavut": "u1",
+    "nimet_alut": "<i8",
+    "tyypit": "u1",
+    "indptr": "<i8",
+    "naapurit": "<i4",
+    "viiveet": "<f8",
+    "haviot": "<f8",
+    "kaistat": "<f8",
+    "puskurit": "<i8",
+}
+
+
+def on_binaari(polku):
+    """Tunnistaa binääritopologian tiedoston alusta."""
+    try:
+        with open(polku, "rb") as f:
+            return f.read(len(TUNNISTE)) == TUNNISTE
+    except OSError:
+        return False
+
+
+def taulukoiksi(laitteet, yhteydet):
+    """Muuntaa laitteet [(nimi, data)] ja yhteydet [(u, v, data)] CSR-taulukoiksi.
+
+    Muoto on sama kuin networkx:n nodes(data=True) ja edges(data=True).
+    Palauttaa sanakirjan, jonka voi antaa kirjoita()-funktiolle.
+    """
+    laitteet = list(laitteet)
+    yhteydet = list(yhteydet)
+    nimet = [nimi for nimi, _ in laitteet]
+    tunnisteet = {nimi: i for i, nimi in enumerate(nimet)}
+    tyyppinimet = []
+    tyyppi_idt = {}
+    tyypit = np.empty(len(nimet), dtype=np.uint8)
+    for i, (_, data) in enumerate(laitteet):
+        tyyppi = data.get("tyyppi", "reititin")
+        if tyyppi not in tyyppi_idt:
+            if len(tyyppinimet) == 255:
+                raise ValueError("Binääritopologiassa voi olla enintään 255 laitetyyppiä.")
+            tyyppi_idt[tyyppi] = len(tyyppinimet)
+            tyyppinimet.append(tyyppi)
+        tyypit[i] = tyyppi_idt[tyyppi]
+
+    lahto_nimet, kohde_nimet, datat = zip(*yhteydet) if yhteydet else ((), (), ())
+    m = len(datat)
+    u = np.fromiter(map(tunnisteet.__getitem__, lahto_nimet), dtype=np.int64, count=m)
+    v = np.fromiter(map(tunnisteet.__getitem__, kohde_nimet), dtype=np.int64, count=m)
+    viiveet = np.array([d.get("weight", 0.0) for d in datat], dtype=np.float64)
+    haviot = np.array([d.get("loss", 0.0) for d in datat], dtype=np.float64)
+    kaistat = np.array([d.get("kaista", np.nan) for d in datat], dtype=np.float64)
+    puskurit = np.array([d.get("puskuri", -1) for d in datat], dtype=np.int64)
+
+    lahdot = np.concatenate([u, v])
+    kohteet = np.concatenate([v, u])
+    jarjestys = np.lexsort((kohteet, lahdot))
+    indptr = np.zeros(len(nimet) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(lahdot, minlength=len(nimet)), out=indptr[1:])
+    taulukot = {
+        "nimet": nimet,
+        "tyypit": tyypit,
+        "tyyppinimet": tyyppinimet,
+        "indptr": indptr,
+        "naapurit": kohteet[jarjestys],
+        "viiveet": np.concatenate([viiveet, viiveet])[jarjestys],
+        "haviot": np.concatenate([haviot, haviot])[jarjestys],
+        "kaistat": None,
+        "puskurit": None,
+    }
+    if not np.isnan(kaistat).all():
+        taulukot["kaistat"] = np.concatenate([kaistat, kaistat])[jarjestys]
+    if (puskurit >= 0).any():
+        taulukot["puskurit"] = np.concatenate([puskurit, puskurit])[jarjestys]
+    return taulukot
+
+
+def kirjoita(polku, nimet, tyypit, tyyppinimet, indptr, naapurit, viiveet, haviot,
+             kaistat=None, puskurit=None, settings=None):
+    """Kirjoittaa CSR-taulukot binääritopologiaksi (rivit järjestyksessä lähtö, kohde)."""
+    nimitavut = [nimi.encode("utf-8") for nimi in nimet]
+    alut = np.zeros(len(nimitavut) + 1, dtype=np.int64)
+    np.cumsum([len(t) for t in nimitavut], out=alut[1:])
+    arvot = {
+        "nimet_tavut": np.frombuffer(b"".join(nimitavut), dtype=np.uint8),
+        "nimet_alut": alut,
+        "tyypit": tyypit,
+        "indptr": indptr,
+        "naapurit": naapurit,
+        "viiveet": viiveet,
+        "haviot": haviot,
+        "kaistat": kaistat,
+        "puskurit": puskurit,
+    }
+    taulukot = {}
+    sijainti = 0
+    for nimi, arvo in arvot.items():
+        if arvo is None:
+            continue
+        arvo = np.ascontiguousarray(arvo, dtype=_TAULUKOT[nimi])
+        arvot[nimi] = arvo
+        taulukot[nimi] = {"dtype": _TAULUKOT[nimi], "pituus": len(arvo), "sijainti": sijainti}
+        sijainti += -(-arvo.nbytes // TASAUS) * TASAUS
+    otsake = json.dumps(
+        {
+            "versio": VERSIO,
+            "solmuja": len(nimet),
+            "tyyppinimet": list(tyyppinimet),
+            "taulukot": taulukot,
+            "settings": settings or {},
+        },
+        ensure_ascii=False,
+    ).encode("utf-8")
+    alku = len(TUNNISTE) + 8 + len(otsake)
+    alku = -(-alku // TASAUS) * TASAUS
+    with open(polku, "wb") as f:
+        f.write(TUNNISTE)
+        f.write(struct.pack("<Q", len(otsake)))
+        f.write(otsake)
+        f.write(b"\0" * (alku - f.tell()))
+        for nimi, tieto in taulukot.items():
+            f.write(b"\0" * (alku + tieto["sijainti"] - f.tell()))
+            f.write(arvot[nimi].tobytes())
+
+
+class BinaariTopologia:
+    """Luettu binääritopologia; taulukot ovat muistikuvattuja, jos mmap=True.
+
+    Taulukot ovat vain luku -näkymiä tiedostoon. nimet puretaan vasta
+    ensimmäisellä käytöllä.
+    """
+
+    def __init__(self, polku, mmap=True):
+        self.polku = polku
+        with open(polku, "rb") as f:
+            if f.read(len(TUNNISTE)) != TUNNISTE:
+                raise ValueError(f"{polku}: ei ole binääritopologia.")
+            (pituus,) = struct.unpack("<Q", f.read(8))
+            try:
+                otsake = json.loads(f.read(pituus).decode("utf-8"))
+            except (UnicodeDecodeError, ValueError):
+                raise ValueError(f"{polku}: otsake on virheellinen.")
+            alku = -(-(len(TUNNISTE) + 8 + pituus) // TASAUS) * TASAUS
+            if otsake.get("versio") != VERSIO:
+                raise ValueError(f"{polku}: tuntematon versio {otsake.get('versio')}.")
+            if mmap:
+                data = np.memmap(f, dtype=np.uint8, mode="r")
+            else:
+                f.seek(0)
+                data = np.frombuffer(f.read(), dtype=np.uint8)
+
+        self.solmuja = n = int(otsake["solmuja"])
+        self.tyyppinimet = otsake["tyyppinimet"]
+        self.settings = otsake.get("settings", {})
+        for nimi, dtype in _TAULUKOT.items():
+            tieto = otsake["taulukot"].get(nimi)
+            if tieto is None:
+                setattr(self, nimi, None)
+                continue
+            if tieto["dtype"] != dtype:
+                raise ValueError(f"{polku}: taulukon {nimi} tyyppi on {tieto['dtype']}, odotettiin {dtype}.")
+            a = alku + tieto["sijainti"]
+            b = a + tieto["pituus"] * np.dtype(dtype).itemsize
+            if b > len(data):
+                raise ValueError(f"{polku}: tiedosto on katkennut.")
+            setattr(self, nimi, data[a:b].view(dtype))
+        for nimi in ("nimet_tavut", "nimet_alut", "tyypit", "indptr", "naapurit", "viiveet", "haviot"):
+            if getattr(self, nimi) is None:
+                raise ValueError(f"{polku}: taulukko {nimi} puuttuu.")
+        self._nimet = None
+        self._tarkista(n)
+
+    def _tarkista(self, n):
+        m2 = len(self.naapurit)
+        if len(self.nimet_alut) != n + 1 or len(self.tyypit) != n or len(self.indptr) != n + 1:
+            raise ValueError(f"{self.polku}: laitetaulukoiden pituudet eivät täsmää.")
+        if self.indptr[0] != 0 or self.indptr[-1] != m2 or (np.diff(self.indptr) < 0).any():
+            raise ValueError(f"{self.polku}: indptr on virheellinen.")
+        for nimi in ("viiveet", "haviot", "kaistat", "puskurit"):
+            taulukko = getattr(self, nimi)
+            if taulukko is not None and len(taulukko) != m2:
+                raise ValueError(f"{self.polku}: taulukon {nimi} pituus ei täsmää.")
+        if m2 and (self.naapurit.min() < 0 or self.naapurit.max() >= n):
+            raise ValueError(f"{self.polku}: naapuritunniste on rajojen ulkopuolella.")
+        if len(self.tyypit) and self.tyypit.max() >= len(self.tyyppinimet):
+            raise ValueError(f"{self.polku}: tuntematon laitetyyppi.")
+        # Samat arvorajat kuin JSON-topologialla (Verkkosimulaattori._tarkista_topologia)
+        if not (np.isfinite(self.viiveet) & (self.viiveet >= 0)).all():
+            raise ValueError(f"{self.polku}: viiveiden on oltava äärellisiä ja ei-negatiivisia.")
+        if not ((self.haviot >= 0) & (self.haviot <= 1)).all():
+            raise ValueError(f"{self.polku}: häviöiden on oltava välillä 0.0 - 1.0.")
+        if self.kaistat is not None:
+            # NaN = rajaton kaista
+            asetetut = self.kaistat[~np.isnan(self.kaistat)]
+            if not (np.isfinite(asetetut) & (asetetut > 0)).all():
+                raise ValueError(f"{self.polku}: kaistan on oltava positiivinen luku.")
+        # Rivien on oltava järjestyksessä ja jokaisen yhteyden molempiin suuntiin
+        lahdot = self.lahdot()
+        if (lahdot == self.naapurit).any():
+            raise ValueError(f"{self.polku}: laite ei voi olla yhteydessä itseensä.")
+        avaimet = lahdot * n + self.naapurit
+        if (np.diff(avaimet) <= 0).any():
+            raise ValueError(f"{self.polku}: linkit eivät ole CSR-järjestyksessä.")
+        kaanteiset = self.naapurit.astype(np.int64) * n + lahdot
+        if not np.array_equal(np.sort(kaanteiset), avaimet):
+            raise ValueError(f"{self.polku}: jokin yhteys puuttuu toiseen suuntaan.")
+
+    @property
+    def nimet(self):
+        if self._nimet is None:
+            tavut = self.nimet_tavut.tobytes()
+            alut = self.nimet_alut.tolist()
+            self._nimet = [tavut[a:b].decode("utf-8") for a, b in zip(alut, alut[1:])]
+            if len(set(self._nimet)) != len(self._nimet):
+                raise ValueError(f"{self.polku}: sama laite useaan kertaan.")
+        return self._nimet
+
+    def lahdot(self):
+        """Jokaisen CSR-linkin lähtötunniste."""
+        return np.repeat(np.arange(self.solmuja, dtype=np.int64), np.diff(self.indptr))
+
+    def yhteydet(self):
+        """Suuntaamattomat yhteydet: (u, v, CSR-indeksit), u < v."""
+        lahdot = self.lahdot()
+        indeksit = np.flatnonzero(lahdot < self.naapurit)
+        return lahdot[indeksit], self.naapurit[indeksit].astype(np.int64), indeksit
+
+    def yhteystiedot(self):
+        """Yhteyksien (nimi1, nimi2, data) networkx-muodossa."""
+        u, v, indeksit = self.yhteydet()
+        nimet = self.nimet
+        viiveet = self.viiveet[indeksit].tolist()
+        haviot = self.haviot[indeksit].tolist()
+        kaistat = self.kaistat[indeksit].tolist() if self.kaistat is not None else None
+        puskurit = self.puskurit[indeksit].tolist() if self.puskurit is not None else None
+        for i, (a, b) in enumerate(zip(u.tolist(), v.tolist())):
+            data = {"weight": viiveet[i], "loss": haviot[i]}
+            if kaistat is not None and kaistat[i] == kaistat[i]:
+                data["kaista"] = kaistat[i]
+            if puskurit is not None and puskurit[i] >= 0:
+                data["puskuri"] = puskurit[i]
+            yield nimet[a], nimet[b], data
+
+    def vie_json(self):
+        """Topologia export_topologia()-muodossa."""
+        tyyppinimet = self.tyyppinimet
+        edges = []
+        for a, b, data in self.yhteystiedot():
+            yhteys = {"laite1": a, "laite2": b, "viive_ms": data["weight"], "loss": data["loss"]}
+            if "kaista" in data:
+                yhteys["kaista_mbps"] = data["kaista"]
+            if "puskuri" in data:
+                yhteys["puskuri"] = data["puskuri"]
+            edges.append(yhteys)
+        return {
+            "nodes": [
+                {"name": nimi, "tyyppi": tyyppinimet[t]}
+                for nimi, t in zip(self.nimet, self.tyypit.tolist())
+            ],
+            "edges": edges,
+            "settings": dict(self.settings),
+        }
+
+
+def json_binaariksi(json_polku, binaari_polku):
+    """Muuntaa JSON-topologian binääriksi rakentamatta networkx-verkkoa."""
+    from network_sim import TopologiaVirhe, Verkkosimulaattori
+
+    with open(json_polku, "r", encoding="utf-8") as f:
+        topo = json.load(f)
+    laitteet, yhteydet, virheet = Verkkosimulaattori()._tarkista_topologia(topo)
+    if virheet:
+        raise TopologiaVirhe(virheet)
+    taulukot = taulukoiksi(laitteet.items(), ((u, v, data) for (u, v), data in yhteydet.items()))
+    kirjoita(binaari_polku, settings=topo.get("settings", {}), **taulukot)
+
+
+def binaari_jsoniksi(binaari_polku, json_polku):
+    topo = BinaariTopologia(binaari_polku).vie_json()
+    with open(json_polku, "w", encoding="utf-8") as f:
+        json.dump(topo, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,339 @@
+"""Synteettiset topologiat skaalaustestaukseen.
+
+Generaattorit palauttavat rakenteen taulukkoina: (nimet, tyypit, reunat,
+sijainnit), missä reunat on (m, 2)-kokoinen indeksitaulukko ja sijainnit
+(n, 2)-taulukko tai None. Viiveet ja häviöt arvotaan erikseen
+arvo_arvot-funktiolla, ja Verkkosimulaattori.luo_synteettinen_verkko
+rakentaa verkon niistä massana.
+"""
+
+import math
+
+import networkx as nx
+import numpy as np
+
+
+# Waxman-yhteyksiä ei arvota etäisyydeltä, jolla todennäköisyys on pudonnut
+# alle tämän osuuden maksimistaan
+WAXMAN_RAJA = 1e-3
+# Waxman-ehdokasparit käsitellään näin monen solmun paloissa
+WAXMAN_PALA = 16384
+
+
+def _reunat(lista):
+    return np.array(lista, dtype=np.int64).reshape(-1, 2)
+
+
+def _kerros(maara, y):
+    """Sijoittaa maara solmua tasavälein vaakariville y."""
+    x = (np.arange(maara) + 0.5) / max(maara, 1)
+    return np.column_stack([x, np.full(maara, float(y))])
+
+
+# --- Generaattorit ---
+
+def waxman(rng, n, keskiaste=4.0, beta=0.4, alfa=None, yhtenainen=True):
+    """Waxman-verkko yksikköneliössä: P(u, v) = beta * exp(-d / (alfa * L)).
+
+    Jos alfaa ei anneta, se valitaan niin, että keskimääräinen aste on noin
+    keskiaste. Ehdokasparit haetaan ruudukosta, joten työ on verrannollinen
+    solmujen määrään eikä sen neliöön. yhtenainen liittää erilliset
+    komponentit lähimpään pääkomponentin solmuun.
+    """
+    n = int(n)
+    if n < 2:
+        raise ValueError("Waxman-verkossa on oltava vähintään 2 laitetta.")
+    if not 0.0 < beta <= 1.0:
+        raise ValueError("beta on oltava välillä (0, 1].")
+    pituus = math.sqrt(2.0)
+    if alfa is None:
+        alfa = math.sqrt(keskiaste / (2.0 * math.pi * beta * n)) / pituus
+    if alfa <= 0.0:
+        raise ValueError("alfa on oltava positiivinen.")
+
+    sijainnit = rng.random((n, 2))
+    x = sijainnit[:, 0].copy()
+    y = sijainnit[:, 1].copy()
+    sade = min(pituus, alfa * pituus * math.log(1.0 / WAXMAN_RAJA))
+    solut = max(1, int(1.0 / sade))
+    ruutu = np.minimum((sijainnit * solut).astype(np.int64), solut - 1)
+    solu = ruutu[:, 0] * solut + ruutu[:, 1]
+    jarjestys = np.argsort(solu, kind="stable")
+    solu_j = solu[jarjestys]
+    alut = np.searchsorted(solu_j, np.arange(solut * solut), side="left")
+    loput = np.searchsorted(solu_j, np.arange(solut * solut), side="right")
+
+    # Puolikas naapurusto, jotta jokainen pari käsitellään vain kerran
+    siirrot = [(0, 0), (0, 1), (1, -1), (1, 0), (1, 1)]
+    reunat = []
+    for pala_alku in range(0, n, WAXMAN_PALA):
+        p = np.arange(pala_alku, min(pala_alku + WAXMAN_PALA, n))
+        rx = solu_j[p] // solut
+        ry = solu_j[p] % solut
+        for dx, dy in siirrot:
+            tx = rx + dx
+            ty = ry + dy
+            kelpo = (tx >= 0) & (tx < solut) & (ty >= 0) & (ty < solut)
+            kohde = np.where(kelpo, tx * solut + ty, 0)
+            if (dx, dy) == (0, 0):
+                alku = p + 1
+            else:
+                alku = alut[kohde]
+            maarat = np.where(kelpo, np.maximum(loput[kohde] - alku, 0), 0)
+            yhteensa = int(maarat.sum())
+            if yhteensa == 0:
+                continue
+            i = np.repeat(p, maarat)
+            siirtymat = np.arange(yhteensa) - np.repeat(np.cumsum(maarat) - maarat, maarat)
+            j = np.repeat(alku, maarat) + siirtymat
+            u = jarjestys[i]
+            v = jarjestys[j]
+            d2 = (x[u] - x[v]) ** 2 + (y[u] - y[v]) ** 2
+            lahella = np.flatnonzero(d2 <= sade * sade)
+            u = u[lahella]
+            v = v[lahella]
+            todennakoisyys = beta * np.exp(-np.sqrt(d2[lahella]) / (alfa * pituus))
+            valitut = rng.random(len(lahella)) < todennakoisyys
+            reunat.append(np.column_stack([u[valitut], v[valitut]]))
+    reunat = np.concatenate(reunat) if reunat else np.empty((0, 2), dtype=np.int64)
+
+    if yhtenainen:
+        reunat = _yhdista_komponentit(n, reunat, sijainnit)
+    nimet = [f"W{i}" for i in range(n)]
+    return nimet, ["reititin"] * n, reunat, sijainnit
+
+
+def _yhdista_komponentit(n, reunat, sijainnit, ikkuna=256):
+    """Liittää jokaisen sivukomponentin pääkomponentin läheiseen solmuun.
+
+    Ehdokkaat haetaan x-koordinaatin mukaan järjestetyn pääkomponentin
+    ikkunasta, joten liitos on likimain lähin eikä vaadi kaikkia etäisyyksiä.
+    """
+    g = nx.Graph()
+    g.add_nodes_from(range(n))
+    g.add_edges_from(reunat.tolist())
+    komponentit = sorted(nx.connected_components(g), key=len, reverse=True)
+    if len(komponentit) <= 1:
+        return reunat
+    paa = np.fromiter(komponentit[0], dtype=np.int64)
+    paa = paa[np.argsort(sijainnit[paa, 0])]
+    edustajat = np.array([next(iter(k)) for k in komponentit[1:]], dtype=np.int64)
+    paikat = np.searchsorted(sijainnit[paa, 0], sijainnit[edustajat, 0])
+    alut = np.clip(paikat - ikkuna, 0, max(len(paa) - 2 * ikkuna, 0))
+    ehdokkaat = paa[np.minimum(alut[:, None] + np.arange(2 * ikkuna), len(paa) - 1)]
+    d = np.sum((sijainnit[ehdokkaat] - sijainnit[edustajat][:, None, :]) ** 2, axis=2)
+    lahimmat = ehdokkaat[np.arange(len(edustajat)), np.argmin(d, axis=1)]
+    return np.concatenate([reunat, np.column_stack([edustajat, lahimmat])])
+
+
+def barabasi_albert(rng, n, m=2):
+    """Barabási–Albert-verkko: jokainen uusi laite liittyy m laitteeseen asteen mukaan."""
+    n = int(n)
+    m = int(m)
+    if m < 1 or m >= n:
+        raise ValueError("Barabási–Albert-verkossa on oltava 1 <= m < n.")
+    reunat = []
+    toistot = []
+    kohteet = list(range(m))
+    arvonnat = iter(())
+    for uusi in range(m, n):
+        reunat.extend((uusi, k) for k in kohteet)
+        toistot.extend(kohteet)
+        toistot.extend([uusi] * m)
+        valitut = set()
+        while len(valitut) < m:
+            u = next(arvonnat, None)
+            if u is None:
+                arvonnat = iter(rng.random(4096).tolist())
+                continue
+            valitut.add(toistot[int(u * len(toistot))])
+        kohteet = list(valitut)
+    nimet = [f"BA{i}" for i in range(n)]
+    return nimet, ["reititin"] * n, _reunat(reunat), None
+
+
+def fat_tree(rng, k=4, palvelimia=None):
+    """k-porttisten kytkinten fat-tree: (k/2)^2 ydintä, k podia, oletuksena k^3/4 palvelinta."""
+    k = int(k)
+    if k < 2 or k % 2:
+        raise ValueError("Fat-treen k:n on oltava parillinen ja vähintään 2.")
+    puolet = k // 2
+    palvelimia = puolet if palvelimia is None else int(palvelimia)
+    nimet = [f"ydin{i}" for i in range(puolet * puolet)]
+    reunat = []
+    kokoomat = []
+    reunakytkimet = []
+    palvelimet = []
+    for pod in range(k):
+        kokooma_idt = []
+        for a in range(puolet):
+            kokooma_idt.append(len(nimet))
+            nimet.append(f"p{pod}_kokooma{a}")
+            for c in range(puolet):
+                reunat.append((kokooma_idt[-1], a * puolet + c))
+        for e in range(puolet):
+            e_id = len(nimet)
+            nimet.append(f"p{pod}_reuna{e}")
+            reunakytkimet.append(e_id)
+            reunat.extend((e_id, a_id) for a_id in kokooma_idt)
+            for h in range(palvelimia):
+                palvelimet.append(len(nimet))
+                reunat.append((len(nimet), e_id))
+                nimet.append(f"p{pod}_r{e}_palvelin{h}")
+        kokoomat.extend(kokooma_idt)
+    tyypit = ["reititin"] * len(nimet)
+    for i in palvelimet:
+        tyypit[i] = "tietokone"
+
+    sijainnit = np.empty((len(nimet), 2))
+    sijainnit[: puolet * puolet] = _kerros(puolet * puolet, 3)
+    sijainnit[kokoomat] = _kerros(len(kokoomat), 2)
+    sijainnit[reunakytkimet] = _kerros(len(reunakytkimet), 1)
+    sijainnit[palvelimet] = _kerros(len(palvelimet), 0)
+    return nimet, tyypit, _reunat(reunat), sijainnit
+
+
+def leaf_spine(rng, spinet=4, leafit=16, palvelimia_per_leaf=24):
+    """Kaksitasoinen leaf-spine: jokainen leaf on kytketty jokaiseen spineen."""
+    spinet, leafit, palvelimia_per_leaf = int(spinet), int(leafit), int(palvelimia_per_leaf)
+    if spinet < 1 or leafit < 1 or palvelimia_per_leaf < 0:
+        raise ValueError("Leaf-spine tarvitsee vähintään yhden spinen ja leafin.")
+    nimet = [f"spine{i}" for i in range(spinet)] + [f"leaf{j}" for j in range(leafit)]
+    reunat = [(spinet + j, s) for j in range(leafit) for s in range(spinet)]
+    for j in range(leafit):
+        for h in range(palvelimia_per_leaf):
+            reunat.append((len(nimet), spinet + j))
+            nimet.append(f"leaf{j}_palvelin{h}")
+    palvelimia = leafit * palvelimia_per_leaf
+    tyypit = ["reititin"] * (spinet + leafit) + ["tietokone"] * palvelimia
+    sijainnit = np.concatenate([_kerros(spinet, 2), _kerros(leafit, 1), _kerros(palvelimia, 0)])
+    return nimet, tyypit, _reunat(reunat), sijainnit
+
+
+def rengasverkko(rng, renkaita=16, solmuja_renkaassa=16):
+    """Renkaiden rengas: runkorengas, johon jokainen alirengas liittyy kahdesta kohdasta."""
+    renkaita, solmuja_renkaassa = int(renkaita), int(solmuja_renkaassa)
+    if renkaita < 1 or solmuja_renkaassa < 1:
+        raise ValueError("Renkaita ja solmuja on oltava vähintään yksi.")
+    nimet = [f"R{i}" for i in range(renkaita)]
+    reunat = [(i, (i + 1) % renkaita) for i in range(renkaita)] if renkaita > 2 else [(0, 1)] * (renkaita - 1)
+    kulmat = 2.0 * math.pi * np.arange(renkaita) / renkaita
+    sijainnit = [np.column_stack([np.cos(kulmat), np.sin(kulmat)])]
+    alisade = min(0.4, 2.0 * math.pi / renkaita / 2.5) if renkaita > 1 else 0.4
+    ali_kulmat = 2.0 * math.pi * np.arange(solmuja_renkaassa) / solmuja_renkaassa
+    for i in range(renkaita):
+        alku = len(nimet)
+        nimet.extend(f"R{i}_{j}" for j in range(solmuja_renkaassa))
+        if solmuja_renkaassa > 2:
+            reunat.extend((alku + j, alku + (j + 1) % solmuja_renkaassa) for j in range(solmuja_renkaassa))
+        elif solmuja_renkaassa == 2:
+            reunat.append((alku, alku + 1))
+        reunat.append((alku, i))
+        if renkaita > 1:
+            reunat.append((alku + solmuja_renkaassa // 2, (i + 1) % renkaita))
+        keskus = 1.6 * np.array([math.cos(kulmat[i]), math.sin(kulmat[i])])
+        sijainnit.append(keskus + alisade * np.column_stack([np.cos(ali_kulmat), np.sin(ali_kulmat)]))
+    return nimet, ["reititin"] * len(nimet), _reunat(reunat), np.concatenate(sijainnit)
+
+
+def isp_ruudukko(rng, rivit=8, sarakkeet=8, reitittimia_per_pop=4, asiakkaita_per_reititin=8):
+    """ISP-tyyppinen verkko: PoP-runkoreitittimet ruudukossa, jokaisessa PoP:ssa
+    rengas pääsyreitittimiä ja niiden takana asiakaslaitteet."""
+    rivit, sarakkeet = int(rivit), int(sarakkeet)
+    reitittimia_per_pop, asiakkaita_per_reititin = int(reitittimia_per_pop), int(asiakkaita_per_reititin)
+    if rivit < 1 or sarakkeet < 1 or reitittimia_per_pop < 0 or asiakkaita_per_reititin < 0:
+        raise ValueError("Ruudukon koon on oltava positiivinen.")
+    nimet = [f"pop{r}_{c}" for r in range(rivit) for c in range(sarakkeet)]
+    tyypit = ["reititin"] * len(nimet)
+    reunat = []
+    for r in range(rivit):
+        for c in range(sarakkeet):
+            i = r * sarakkeet + c
+            if c + 1 < sarakkeet:
+                reunat.append((i, i + 1))
+            if r + 1 < rivit:
+                reunat.append((i, i + sarakkeet))
+    rr, cc = np.divmod(np.arange(rivit * sarakkeet), sarakkeet)
+    sijainnit = [np.column_stack([cc, rr]).astype(float)]
+
+    kulmat = 2.0 * math.pi * np.arange(max(reitittimia_per_pop, 1)) / max(reitittimia_per_pop, 1)
+    a_kulmat = 2.0 * math.pi * np.arange(max(asiakkaita_per_reititin, 1)) / max(asiakkaita_per_reititin, 1)
+    for pop in range(rivit * sarakkeet):
+        keskus = sijainnit[0][pop]
+        alku = len(nimet)
+        for a in range(reitittimia_per_pop):
+            a_id = alku + a * (asiakkaita_per_reititin + 1)
+            nimet.append(f"{nimet[pop]}_a{a}")
+            tyypit.append("reititin")
+            reunat.append((a_id, pop))
+            a_pos = keskus + 0.3 * np.array([math.cos(kulmat[a]), math.sin(kulmat[a])])
+            sijainnit.append(a_pos[None, :])
+            for h in range(asiakkaita_per_reititin):
+                reunat.append((len(nimet), a_id))
+                nimet.append(f"{nimet[pop]}_a{a}_asiakas{h}")
+                tyypit.append("tietokone")
+            sijainnit.append(a_pos + 0.08 * np.column_stack([np.cos(a_kulmat), np.sin(a_kulmat)])[:asiakkaita_per_reititin])
+        # Pääsyreitittimet renkaaksi, jotta PoP:n sisällä on varareitti
+        if reitittimia_per_pop > 2:
+            for a in range(reitittimia_per_pop):
+                b = (a + 1) % reitittimia_per_pop
+                reunat.append((alku + a * (asiakkaita_per_reititin + 1), alku + b * (asiakkaita_per_reititin + 1)))
+    return nimet, tyypit, _reunat(reunat), np.concatenate(sijainnit)
+
+
+GENERAATTORIT = {
+    "waxman": waxman,
+    "barabasi_albert": barabasi_albert,
+    "fat_tree": fat_tree,
+    "leaf_spine": leaf_spine,
+    "rengas": rengasverkko,
+    "isp": isp_ruudukko,
+}
+
+
+def generoi(malli, rng, **parametrit):
+    try:
+        generaattori = GENERAATTORIT[malli]
+    except KeyError:
+        raise ValueError(
+            f"Tuntematon topologiamalli '{malli}'. Vaihtoehdot: {', '.join(GENERAATTORIT)}."
+        )
+    return generaattori(rng, **parametrit)
+
+
+# --- Viive- ja häviöjakaumat ---
+
+def arvo_arvot(jakauma, rng, maara, etaisyydet=None):
+    """Arpoo maara arvoa jakaumamäärittelystä.
+
+    jakauma voi olla luku (vakio), funktio f(rng, maara) tai monikko:
+    ("vakio", x), ("tasainen", a, b), ("normaali", mu, sigma),
+    ("lognormaali", mu, sigma), ("eksponentti", keskiarvo) tai
+    ("etaisyys", kerroin[, lisa]), joka skaalaa yhteyden pituutta
+    (vain malleille, joilla on sijainnit). Negatiiviset arvot leikataan nollaan.
+    """
+    if callable(jakauma):
+        arvot = np.asarray(jakauma(rng, maara), dtype=np.float64)
+    elif isinstance(jakauma, (int, float)):
+        arvot = np.full(maara, float(jakauma))
+    else:
+        laji, *p = jakauma
+        if laji == "vakio":
+            arvot = np.full(maara, float(p[0]))
+        elif laji == "tasainen":
+            arvot = rng.uniform(p[0], p[1], maara)
+        elif laji == "normaali":
+            arvot = rng.normal(p[0], p[1], maara)
+        elif laji == "lognormaali":
+            arvot = rng.lognormal(p[0], p[1], maara)
+        elif laji == "eksponentti":
+            arvot = rng.exponential(p[0], maara)
+        elif laji == "etaisyys":
+            if etaisyydet is None:
+                raise ValueError("Etäisyyteen perustuva jakauma vaatii mallin, jolla on sijainnit.")
+            arvot = float(p[0]) * etaisyydet + (float(p[1]) if len(p) > 1 else 0.0)
+        else:
+            raise ValueError(f"Tuntematon jakauma '{laji}'.")
+    if arvot.shape != (maara,):
+        raise ValueError("Jakauman on tuotettava yksi arvo yhteyttä kohden.")
+    return np.maximum(arvot, 0.0)
@@ -0,0 +1,180 @@
+"""Liikennematriisit ja niiden koostettu ajo.
+
+Matriisi kertoo lähetysmäärän jokaiselle laiteparille (rivi = lähettäjä,
+sarake = vastaanottaja). Sen voi lukea tiedostosta tai generoida:
+
+    m = Liikennematriisi.gravitaatio(nimet, yhteensa=1_000_000, siemen=1)
+    tulos = simu.laheta_liikennematriisi(m)
+    print(tulos.hae_tilastot())
+    for linkki in tulos.hae_linkit(10):
+        print(linkki)
+
+Tiedostomuodot: JSON {"nimet": [...], "maarat": [[...], ...]} tai CSV,
+jonka riveillä on lähettäjä, vastaanottaja ja määrä.
+"""
+
+import csv
+import json
+
+import numpy as np
+
+
+class Liikennematriisi:
+    """N x N -matriisi lähetysmääriä tai -nopeuksia (pakettia/s) laitepareittain.
+
+    Lävistäjä (laite itselleen) jätetään ajossa huomiotta.
+    """
+
+    def __init__(self, nimet, maarat):
+        self.nimet = list(nimet)
+        maarat = np.array(maarat, dtype=np.float64)
+        n = len(self.nimet)
+        if maarat.shape != (n, n):
+            raise ValueError(f"Matriisin koon on oltava {n} x {n}, nyt {maarat.shape}.")
+        if len(set(self.nimet)) != n:
+            raise ValueError("Matriisissa on sama laite useaan kertaan.")
+        if not np.isfinite(maarat).all() or (maarat < 0).any():
+            raise ValueError("Matriisin arvojen on oltava äärellisiä ja ei-negatiivisia.")
+        self.maarat = maarat
+
+    def __len__(self):
+        return len(self.nimet)
+
+    @property
+    def yhteensa(self):
+        return float(self.maarat.sum() - np.trace(self.maarat))
+
+    # --- Generointi ---
+
+    @classmethod
+    def tasainen(cls, nimet, per_pari=1.0):
+        """Sama määrä jokaiselle parille."""
+        n = len(nimet)
+        maarat = np.full((n, n), float(per_pari))
+        np.fill_diagonal(maarat, 0.0)
+        return cls(nimet, maarat)
+
+    @classmethod
+    def gravitaatio(cls, nimet, yhteensa, massat=None, siemen=None):
+        """Gravitaatiomalli: parin i, j määrä on verrannollinen tuloon m_i * m_j.
+
+        massat on lista tai sanakirja nimi -> massa; oletuksena massat
+        arvotaan lognormaalijakaumasta (siemen).
+        """
+        if isinstance(massat, dict):
+            massat = [massat[n] for n in nimet]
+        if massat is None:
+            massat = np.random.default_rng(siemen).lognormal(0.0, 1.0, len(nimet))
+        massat = np.asarray(massat, dtype=np.float64)
+        if len(massat) != len(nimet) or (massat < 0).any():
+            raise ValueError("Massoja on oltava yksi jokaista laitetta kohden, eivätkä ne voi olla negatiivisia.")
+        maarat = np.outer(massat, massat)
+        np.fill_diagonal(maarat, 0.0)
+        summa = maarat.sum()
+        if summa > 0:
+            maarat *= float(yhteensa) / summa
+        return cls(nimet, maarat)
+
+    # --- Tiedostot ---
+
+    @classmethod
+    def lue(cls, polku):
+        """Lukee matriisin JSON- tai CSV-tiedostosta (pääte ratkaisee)."""
+        if str(polku).lower().endswith(".json"):
+            with open(polku, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if not isinstance(data, dict) or "nimet" not in data or "maarat" not in data:
+                raise ValueError(f"{polku}: odotettiin kenttiä 'nimet' ja 'maarat'.")
+            return cls(data["nimet"], data["maarat"])
+
+        indeksit = {}
+        rivit = []
+        with open(polku, "r", encoding="utf-8", newline="") as f:
+            for rivinumero, rivi in enumerate(csv.reader(f), start=1):
+                rivi = [kentta.strip() for kentta in rivi]
+                if not rivi or not any(rivi) or rivi[0].startswith("#"):
+                    continue
+                if rivinumero == 1 and rivi[0].lower() in ("lahettaja", "lähettäjä", "sender"):
+                    continue
+                if len(rivi) < 3:
+                    raise ValueError(f"{polku}:{rivinumero}: rivillä on oltava lähettäjä, vastaanottaja ja määrä.")
+                try:
+                    maara = float(rivi[2])
+                except ValueError:
+                    raise ValueError(f"{polku}:{rivinumero}: määrän tulee olla numero.")
+                for nimi in rivi[:2]:
+                    indeksit.setdefault(nimi, len(indeksit))
+                rivit.append((indeksit[rivi[0]], indeksit[rivi[1]], maara))
+        maarat = np.zeros((len(indeksit), len(indeksit)))
+        for i, j, maara in rivit:
+            maarat[i, j] += maara
+        return cls(list(indeksit), maarat)
+
+    def tallenna(self, polku):
+        with open(polku, "w", encoding="utf-8") as f:
+            json.dump({"nimet": self.nimet, "maarat": self.maarat.tolist()}, f, ensure_ascii=False)
+
+
+class Kuormatulos:
+    """Liikennematriisiajon tulokset: linkkikohtaiset laskurit ja päästä päähän -tilastot.
+
+    Linkit ovat suunnattuja (lahto -> kohde); mukana vain linkit, joille
+    tarjottiin liikennettä. tarjottu = linkille saapuneet paketit, haviot =
+    linkillä hävinneet (täyden puskurin pudotukset mukaan lukien). Jos ajolla
+    oli kesto_s, nopeudet ovat pakettia/s. jonot sisältää kapasiteetillisten
+    linkkien jonoarvion (kayttoaste, jonoviive_ms, pudotus ...).
+    """
+
+    def __init__(self, lahdot, kohteet, tarjottu, haviot, tilasto, reitittomat, kesto_s, jonot=None):
+        self.lahdot = lahdot
+        self.kohteet = kohteet
+        self.tarjottu = tarjottu
+        self.haviot = haviot
+        self.tilasto = tilasto
+        self.reitittomat = reitittomat
+        self.kesto_s = kesto_s
+        self.jonot = jonot or {}
+
+    def __len__(self):
+        return len(self.lahdot)
+
+    @property
+    def kuorma_suhteellinen(self):
+        """Linkkien kuorma suhteessa kuormitetuimpaan linkkiin (0..1)."""
+        suurin = self.tarjottu.max() if len(self.tarjottu) else 0
+        return self.tarjottu / suurin if suurin else np.zeros(len(self.tarjottu))
+
+    def hae_tilastot(self):
+        tilastot = self.tilasto.koosteet()
+        tilastot["reitittomat"] = self.reitittomat
+        return tilastot
+
+    def hae_linkit(self, maara=None):
+        """Linkit kuormitetuimmasta alkaen sanakirjoina (enintään maara kpl)."""
+        jarjestys = np.argsort(-self.tarjottu, kind="stable")[:maara]
+        suhteellinen = self.kuorma_suhteellinen
+        linkit = []
+        for i in jarjestys.tolist():
+            tarjottu = int(self.tarjottu[i])
+            haviot = int(self.haviot[i])
+            linkki = {
+                "lahto": self.lahdot[i],
+                "kohde": self.kohteet[i],
+                "tarjottu": tarjottu,
+                "lapi": tarjottu - haviot,
+                "haviot": haviot,
+                "havioaste": haviot / tarjottu if tarjottu else 0.0,
+                "kuorma_suhteellinen": float(suhteellinen[i]),
+            }
+            if self.kesto_s:
+                linkki["tarjottu_pps"] = tarjottu / self.kesto_s
+            jono = self.jonot.get((linkki["lahto"], linkki["kohde"]))
+            if jono is not None:
+                linkki.update(
+                    kaista_mbps=jono["kaista_mbps"],
+                    kayttoaste=jono["kayttoaste"],
+                    jonoviive_ms=jono["jonoviive_ms"],
+                    pudotus=jono["pudotus"],
+                )
+            linkit.append(linkki)
+        return linkit